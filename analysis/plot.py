@@ -1,78 +1,110 @@
+import csv
 import math
-import operator
+import os
 from collections import defaultdict
 
 import numpy
-import matplotlib.pyplot as plt
 from matplotlib import gridspec
-
-from sklearn.linear_model import LinearRegression
-# from sklearn.preprocessing import PolynomialFeatures
+from matplotlib.figure import Figure
 
 min_threshold_on_max_stage_time = 1000 # ms
 number_of_data_for_learn = 4
 min_scale_for_use = 5
 
-def plot_all_stages(dict_of_apps_for_different_scales, name_prefix=""):
+
+def stage_time_matrix(dict_of_apps_for_different_scales):
+    """
+    Returns (stage_ids, scales, times): the stages of the applications (scale -> ApplicationSummary) that take at
+    least min_threshold_on_max_stage_time at some scale, and two (stages, scales) arrays where row i holds the scales
+    and completion times of stage_ids[i], by increasing scale, padded with NaN.
+    """
     app_dict = dict_of_apps_for_different_scales
     stages_times = defaultdict(dict)
-
     for scale in app_dict:
         if scale >= min_scale_for_use:
-            for job in app_dict[scale].jobs.values():
-                for stage in job.stages:
-                    stages_times[stage.stage_id][scale] = stage.get_completion_time()
-
-    for stage_id in list(stages_times.keys()):
-        if max(stages_times[stage_id].values()) < min_threshold_on_max_stage_time:
-            stages_times.pop(stage_id)
+            for stage_id, completion_time in app_dict[scale].stages_times.items():
+                stages_times[stage_id][scale] = completion_time
+
+    stage_ids = [stage_id for stage_id, times in stages_times.items()
+                 if max(times.values()) >= min_threshold_on_max_stage_time]
+    width = max((len(stages_times[stage_id]) for stage_id in stage_ids), default=0)
+    scales = numpy.full((len(stage_ids), width), numpy.nan)
+    times = numpy.full((len(stage_ids), width), numpy.nan)
+    for i, stage_id in enumerate(stage_ids):
+        pairs = sorted(stages_times[stage_id].items())
+        scales[i, :len(pairs)] = [p[0] for p in pairs]
+        times[i, :len(pairs)] = [p[1] for p in pairs]
+    return stage_ids, scales, times
+
+
+def fit_linear(scales, times, number_of_points):
+    """
+    Least squares fit of time = slope * scale + intercept for every row of (scales, times), on the first
+    number_of_points scales of the row, all rows solved at once. Returns (slopes, intercepts).
+    A row with a single learnt scale gets a slope of 0, as sklearn's LinearRegression gives.
+    """
+    used = ~numpy.isnan(scales)
+    used[:, number_of_points:] = False
+    x = numpy.where(used, scales, 0)
+    y = numpy.where(used, times, 0)
+
+    # Normal equations, one 2x2 system per row: [[n, sum x], [sum x, sum x^2]] (intercept, slope) = [sum y, sum xy]
+    n = used.sum(axis=1).astype(float)
+    sum_x, sum_xx = x.sum(axis=1), (x * x).sum(axis=1)
+    a = numpy.stack([numpy.stack([n, sum_x], axis=-1), numpy.stack([sum_x, sum_xx], axis=-1)], axis=-2)
+    b = numpy.stack([y.sum(axis=1), (x * y).sum(axis=1)], axis=-1)
+    degenerate = n * sum_xx - sum_x * sum_x <= 1e-9 * numpy.maximum(sum_xx, 1)
+    # Constant model for the rows where the slope is undetermined: intercept = mean time, slope = 0
+    a[degenerate] = [[1, 0], [0, 1]]
+    a[degenerate, 0, 0] = numpy.maximum(n[degenerate], 1)
+    b[degenerate, 1] = 0
+    solution = numpy.linalg.solve(a, b[..., numpy.newaxis])[..., 0]
+    return solution[:, 1], solution[:, 0]
+
+
+def plot_all_stages(dict_of_apps_for_different_scales, name_prefix="", output_dir="parser_output/analysis"):
+    """
+    Fits the completion time of each stage against the scale on the smaller scales and plots it with the actual
+    times. The figure is saved to {output_dir}/{name_prefix}_stages.png and the error of the prediction at the
+    largest scale of each stage to {output_dir}/{name_prefix}_errors.csv, without a display. Returns the paths.
+    """
+    stage_ids, scales, times = stage_time_matrix(dict_of_apps_for_different_scales)
+    slopes, intercepts = fit_linear(scales, times, number_of_data_for_learn)
+    predicted = slopes[:, numpy.newaxis] * scales + intercepts[:, numpy.newaxis]
+
+    last = (~numpy.isnan(scales)).sum(axis=1) - 1
+    rows_index = numpy.arange(len(stage_ids))
+    last_scales, last_times, last_predicted = (scales[rows_index, last], times[rows_index, last],
+                                               predicted[rows_index, last])
+    stage_errors = last_predicted - last_times
+    errors, abs_errors, sum_actual = stage_errors.sum(), numpy.abs(stage_errors).sum(), last_times.sum()
+
+    os.makedirs(output_dir, exist_ok=True)
+    prefix = os.path.join(output_dir, (name_prefix + "_" if name_prefix else ""))
+    csv_path = prefix + "errors.csv"
+    with open(csv_path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["stage_id", "scale", "actual_time", "predicted_time", "error"])
+        for i, stage_id in enumerate(stage_ids):
+            writer.writerow([stage_id, last_scales[i], last_times[i], round(last_predicted[i], 2),
+                             round(stage_errors[i], 2)])
 
     cols = 3
-    rows = int(math.ceil(len(stages_times) / cols))
+    rows = max(int(math.ceil(len(stage_ids) / cols)), 1)
     gs = gridspec.GridSpec(rows, cols)
-    fig = plt.figure()
-
-    errors, abs_errors, sum_actual = 0, 0, 0
-
-    for index, stage_id in enumerate(stages_times):
-        pairs = sorted(stages_times[stage_id].items(), key=operator.itemgetter(0))
-        scales = numpy.array(
-            [p[0] for p in pairs]
-        ).reshape((-1, 1))
-        times = numpy.array(
-            [p[1] for p in pairs]
-        )
-        scales_for_learn = scales[:number_of_data_for_learn]
-        times_for_learn = times[:number_of_data_for_learn]
-
+    fig = Figure(figsize=(4 * cols, 3 * rows))
+    for index, stage_id in enumerate(stage_ids):
+        count = last[index] + 1
         ax = fig.add_subplot(gs[index])
-        ax.plot(scales[number_of_data_for_learn-1:], times[number_of_data_for_learn-1:], ".-", color="blue")
-        ax.plot(scales[:number_of_data_for_learn], times[:number_of_data_for_learn], ".-", color="green")
-
-        linear_regressor = LinearRegression()
-        linear_regressor.fit(scales_for_learn, times_for_learn)
-        times_linear_predicted = linear_regressor.predict(scales)
-
-        ax.plot(scales, times_linear_predicted, color="red")
-
-        # polynomial_transform_of_scales = \
-        #     PolynomialFeatures(degree=3, include_bias=False).fit_transform(scales) # , include_bias=True
-        # polynomial_transform_of_scales_for_learn = \
-        #     PolynomialFeatures(degree=3, include_bias=False).fit_transform(scales_for_learn)
-        # polynomial_regressor = LinearRegression() # fit_intercept=False
-        # polynomial_regressor.fit(polynomial_transform_of_scales_for_learn, times_for_learn)
-        # times_polynomial_predicted = polynomial_regressor.predict(polynomial_transform_of_scales)
-        #
-        # ax.plot(scales, times_polynomial_predicted, "--", color="purple")
-
-        error = times_linear_predicted[-1] - times[-1]
-        errors += error
-        abs_errors += abs(error)
-        sum_actual += times[-1]
-
+        ax.plot(scales[index, number_of_data_for_learn-1:count], times[index, number_of_data_for_learn-1:count],
+                ".-", color="blue")
+        ax.plot(scales[index, :number_of_data_for_learn], times[index, :number_of_data_for_learn], ".-",
+                color="green")
+        ax.plot(scales[index, :count], predicted[index, :count], color="red")
         ax.set_title(f"stage_{stage_id}")
 
     fig.suptitle(name_prefix + f" (errors={errors:.2f}, abs_errors={abs_errors:.2f}, sum_actual={sum_actual})")
     fig.tight_layout()
-    plt.show()
-
+    figure_path = prefix + "stages.png"
+    fig.savefig(figure_path)
+    return figure_path, csv_path
@@ -0,0 +1,61 @@
+"""
+Throughput of LogParser.process() on logs heavy in "SparkListenerBlockUpdated" events, which no listener subscribes
+to, when they are skipped before decoding and when every line is decoded first, as before the listener registry.
+
+Usage: python3 -m benchmarks.event_routing [block_updates_per_task ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_log import write_event_log
+from log_parser.decoder import get_decoder
+from log_parser.event_log import open_event_log
+from log_parser.parser import LogParser
+
+
+class DecodingLogParser(LogParser):
+    """ LogParser as it was before the listener registry: every line is decoded, then dispatched. """
+
+    def process(self, profile=None):
+        decoder = get_decoder(self.decoder)
+        with decoder.lines(open_event_log(self.filename)) as log_file:
+            for line in log_file:
+                self.process_event(decoder.loads(line))
+        self.warn_unsupported_event_types()
+        self.finalize()
+
+
+def throughput(parser_class, filename, decoder, repeat=3):
+    """ Best MB/s of repeat runs. """
+    best = None
+    for _ in range(repeat):
+        log_parser = parser_class(filename, decoder=decoder)
+        start = time.perf_counter()
+        log_parser.process()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return os.path.getsize(filename) / 1e6 / best
+
+
+def main(block_updates=(0, 2, 8)):
+    print("{:>14} {:>8} {:>8} {:>14} {:>14}".format("block updates", "log MB", "decoder", "decode all", "skip"))
+    with tempfile.TemporaryDirectory() as directory:
+        for block_updates_per_task in block_updates:
+            filename = os.path.join(directory, "events_{}".format(block_updates_per_task))
+            write_event_log(filename, num_jobs=20, stages_per_job=3, tasks_per_stage=200, num_executors=8,
+                            block_updates_per_task=block_updates_per_task)
+            for decoder in ("json", "orjson"):
+                try:
+                    get_decoder(decoder)
+                except ValueError:
+                    continue  # not installed
+                before = throughput(DecodingLogParser, filename, decoder)
+                after = throughput(LogParser, filename, decoder)
+                print("{:>14} {:>8.1f} {:>8} {:>9.1f} MB/s {:>9.1f} MB/s".format(
+                    block_updates_per_task, os.path.getsize(filename) / 1e6, decoder, before, after))
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or (0, 2, 8))
@@ -0,0 +1,56 @@
+"""
+Throughput (MB/s) of the JSON decoders on an event log, and of the former text-mode line decoding.
+
+Usage: python3 -m benchmarks.json_decode [event_log]
+Without an event log, a synthetic one is generated.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_log import write_event_log
+from log_parser.decoder import DECODERS
+
+
+def decode_text_lines(filename):
+    """ The decoding of LogParser.process before the decoder layer. """
+    with open(filename, "r") as log_file:
+        for line in log_file:
+            yield json.loads(line.strip("\n").replace("\n", "\\n"))
+
+
+def decode_lines(filename, decoder):
+    with decoder.lines(open(filename, "rb")) as log_file:
+        for line in log_file:
+            yield decoder.loads(line)
+
+
+def throughput(filename, decode, repeat=3):
+    size = os.path.getsize(filename) / 1e6
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in decode(filename):
+            pass
+        best = min(best, time.perf_counter() - start)
+    return size / best
+
+
+def main(filename=None):
+    with tempfile.TemporaryDirectory() as directory:
+        if filename is None:
+            filename = os.path.join(directory, "events")
+            write_event_log(filename, num_jobs=50, stages_per_job=3, tasks_per_stage=200)
+        print(f"{filename}: {os.path.getsize(filename) / 1e6:.1f} MB")
+
+        print(f"{'text + json (before)':>22}: {throughput(filename, decode_text_lines):8.1f} MB/s")
+        for name, decoder in DECODERS.items():
+            identical = all(a == b for a, b in zip(decode_text_lines(filename), decode_lines(filename, decoder)))
+            print(f"{name:>22}: {throughput(filename, lambda f: decode_lines(f, decoder)):8.1f} MB/s"
+                  f"{'' if identical else '  DIFFERENT RESULTS'}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,121 @@
+"""
+Times LogParser.process(), generate_report() and the DAG plots, and measures peak memory, on synthetic event logs of
+several sizes. Results are written as JSON; with --compare, they are checked against the results of an earlier run.
+
+Usage: python3 -m benchmarks.run [--sizes small,medium] [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import graphviz
+
+from benchmarks.synthetic_log import write_event_log
+from log_parser.decoder import get_decoder
+from log_parser.parser import LogParser
+
+COMMON_PARAMETERS = dict(rdds_per_stage=3, failure_rate=0.01, reused_stages=1)
+SIZES = {
+    "small": dict(num_jobs=10, stages_per_job=3, tasks_per_stage=100, num_executors=4),
+    "medium": dict(num_jobs=50, stages_per_job=4, tasks_per_stage=500, num_executors=16),
+    "large": dict(num_jobs=200, stages_per_job=5, tasks_per_stage=1000, num_executors=64),
+    "xlarge": dict(num_jobs=500, stages_per_job=5, tasks_per_stage=2000, num_executors=128),
+}
+# Metrics where lower is better, compared by --compare
+METRICS = ("process_s", "report_s", "stages_dag_s", "rdds_dag_s", "process_peak_traced_mb", "max_rss_mb")
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def measure(filename, output_prefix, repeat):
+    """ Runs in a fresh process, so that max_rss_mb belongs to this measure only. Times are the best of repeat runs. """
+    result = {}
+    for _ in range(repeat):
+        log_parser = LogParser(filename)
+        times = {"process_s": timed(log_parser.process), "report_s": timed(log_parser.generate_report)}
+        for key, save_plot in (("stages_dag_s", log_parser.save_plot_of_stages_dag),
+                               ("rdds_dag_s", log_parser.save_plot_of_rdds_dag)):
+            try:
+                times[key] = timed(save_plot, f"{output_prefix}_{key}")
+            except graphviz.ExecutableNotFound:
+                times[key] = None  # Graphviz is not installed
+        for key, value in times.items():
+            result[key] = value if result.get(key) is None else min(value, result[key])
+    result["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    tracemalloc.start()
+    LogParser(filename).process()
+    result["process_peak_traced_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return result
+
+
+def run(sizes, repeat=3):
+    results = []
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            parameters = dict(COMMON_PARAMETERS, **SIZES[size])
+            filename = os.path.join(directory, size)
+            write_event_log(filename, **parameters)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(measure, filename, os.path.join(directory, size), repeat).result()
+            result = dict(size=size, parameters=parameters, log_mb=os.path.getsize(filename) / 1e6, **result)
+            print(f"{size:>8}: " + ", ".join(f"{k}={result[k]:.3f}" if result[k] is not None else f"{k}=n/a"
+                                             for k in ("log_mb",) + METRICS))
+            results.append(result)
+    return {
+        "meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "platform": platform.platform(), "decoder": get_decoder().name},
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """ Prints current/baseline per size and metric. Returns the number of regressions beyond threshold. """
+    baseline_results = {r["size"]: r for r in baseline["results"]}
+    regressions = 0
+    for result in current["results"]:
+        before = baseline_results.get(result["size"])
+        if before is None or before["parameters"] != result["parameters"]:
+            print(f"{result['size']:>8}: not in the baseline")
+            continue
+        for metric in METRICS:
+            if not before.get(metric) or result.get(metric) is None:
+                continue
+            ratio = result[metric] / before[metric]
+            regression = ratio > 1 + threshold
+            regressions += regression
+            print(f"{result['size']:>8} {metric:>24}: {before[metric]:10.3f} -> {result[metric]:10.3f} "
+                  f"({ratio:5.2f}x){'  REGRESSION' if regression else ''}")
+    return regressions
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the log parser on synthetic event logs.")
+    arg_parser.add_argument("--sizes", default="small,medium", help=f"comma separated, among {', '.join(SIZES)}")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs per size, the best time is kept (default: 3)")
+    arg_parser.add_argument("--output", default="benchmark_results.json")
+    arg_parser.add_argument("--compare", metavar="BASELINE_JSON", help="results of an earlier run to compare with")
+    arg_parser.add_argument("--threshold", type=float, default=0.1,
+                            help="relative increase reported as a regression (default: 0.1)")
+    args = arg_parser.parse_args()
+
+    current = run(args.sizes.split(","), args.repeat)
+    with open(args.output, "w") as output_file:
+        json.dump(current, output_file, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            sys.exit(1 if compare(json.load(baseline_file), current, args.threshold) else 0)
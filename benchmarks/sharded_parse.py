@@ -0,0 +1,44 @@
+"""
+Time of LogParser.process() against process_sharded() with 2, 4, ... processes (up to the number of CPUs) on one
+synthetic event log, and whether both give the same report.
+
+Usage: python3 -m benchmarks.sharded_parse [tasks_per_stage]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import log_parser.shard
+from benchmarks.synthetic_log import write_event_log
+from log_parser.parser import LogParser
+
+
+def timed_parse(filename, jobs):
+    log_parser = LogParser(filename)
+    start = time.perf_counter()
+    if jobs == 1:
+        log_parser.process()
+    else:
+        log_parser.process_sharded(jobs)
+    return time.perf_counter() - start, log_parser.generate_report()
+
+
+def main(tasks_per_stage=2000):
+    log_parser.shard.MIN_SHARD_SIZE = 1 << 20  # shard the benchmark log whatever its size
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "events")
+        write_event_log(filename, num_jobs=50, stages_per_job=4, tasks_per_stage=tasks_per_stage, num_executors=64)
+        size_mb = os.path.getsize(filename) / 1e6
+        sequential_s, report = timed_parse(filename, 1)
+        print(f"{size_mb:.0f} MB log, process(): {sequential_s:.2f}s")
+        jobs = 2
+        while jobs <= max(os.cpu_count(), 2):
+            sharded_s, sharded_report = timed_parse(filename, jobs)
+            print(f"process_sharded({jobs}): {sharded_s:.2f}s, speedup {sequential_s / sharded_s:.2f}, "
+                  f"{'same' if sharded_report == report else 'DIFFERENT'} report")
+            jobs *= 2
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
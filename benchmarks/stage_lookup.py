@@ -0,0 +1,55 @@
+"""
+Scaling of stage completion and task linking, with the stage registry and with the former scan over all stages.
+
+Usage: python3 -m benchmarks.stage_lookup [max_jobs]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_log import write_event_log
+from log_parser.parser import LogParser
+
+
+class ScanningLogParser(LogParser):
+    """ LogParser as it was before the stage registry: every lookup scans all stages of all jobs. """
+
+    def do_SparkListenerStageCompleted(self, data):
+        stage_id = data["Stage Info"]["Stage ID"]
+        for j in self.jobs.values():
+            for s in j.stages:
+                if s.stage_id == stage_id:
+                    s.complete(data)
+
+    def link_tasks(self, stage_groups, stages_of_group):
+        for t in self.tasks.values():
+            self.executors[t.executor_id].tasks.append(t)
+            for j in self.jobs.values():
+                for s in j.stages:
+                    if s.stage_id == t.stage_id:
+                        s.tasks.append(t)
+
+
+def time_process(parser_class, filename):
+    log_parser = parser_class(filename)
+    start = time.perf_counter()
+    log_parser.process()
+    return time.perf_counter() - start
+
+
+def main(max_jobs=320):
+    print("{:>8} {:>10} {:>12} {:>12}".format("stages", "tasks", "scan (s)", "registry (s)"))
+    with tempfile.TemporaryDirectory() as directory:
+        num_jobs = 10
+        while num_jobs <= max_jobs:
+            filename = os.path.join(directory, "events_{}".format(num_jobs))
+            write_event_log(filename, num_jobs=num_jobs, stages_per_job=3, tasks_per_stage=20)
+            before = time_process(ScanningLogParser, filename)
+            after = time_process(LogParser, filename)
+            print("{:>8} {:>10} {:>12.3f} {:>12.3f}".format(num_jobs * 3, num_jobs * 3 * 20, before, after))
+            num_jobs *= 2
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,275 @@
+"""
+Writes synthetic Spark event logs, e.g. for the benchmarks.
+
+Usage: python3 -m benchmarks.synthetic_log <output> [--jobs N] [--stages-per-job N] [--tasks-per-stage N] ...
+"""
+import argparse
+import json
+import random
+
+
+def _rdd_info(rdd_id, parent_ids, num_partitions, cached=False):
+    return {
+        "RDD ID": rdd_id,
+        "Name": "MapPartitionsRDD",
+        "Scope": "{\"id\":\"" + str(rdd_id) + "\",\"name\":\"map\"}",
+        "Callsite": "map at Synthetic.scala:{}".format(rdd_id),
+        "Parent IDs": parent_ids,
+        "Storage Level": {"Use Disk": False, "Use Memory": cached, "Deserialized": cached, "Replication": 1},
+        "Number of Partitions": num_partitions,
+        "Number of Cached Partitions": num_partitions if cached else 0,
+        "Memory Size": 1 << 20 if cached else 0,
+        "Disk Size": 0,
+    }
+
+
+def _stage_info(stage_id, parent_ids, num_tasks, rdds):
+    return {
+        "Stage ID": stage_id,
+        "Stage Attempt ID": 0,
+        "Stage Name": "map at Synthetic.scala:{}".format(stage_id),
+        "Number of Tasks": num_tasks,
+        "RDD Info": rdds,
+        "Parent IDs": parent_ids,
+        "Details": "org.apache.spark.rdd.RDD.map(RDD.scala:370)",
+        "Accumulables": [],
+    }
+
+
+def _task_info(task_id, index, attempt, executor_id, launch_time, finish_time=0, failed=False):
+    return {
+        "Task ID": task_id,
+        "Index": index,
+        "Attempt": attempt,
+        "Launch Time": launch_time,
+        "Executor ID": executor_id,
+        "Host": "10.0.0.{}".format(executor_id),
+        "Locality": "PROCESS_LOCAL",
+        "Speculative": False,
+        "Getting Result Time": 0,
+        "Finish Time": finish_time,
+        "Failed": failed,
+        "Accumulables": [],
+    }
+
+
+def _task_metrics(rnd, run_time):
+    return {
+        "Executor Deserialize Time": rnd.randint(1, 20),
+        "Executor Deserialize CPU Time": rnd.randint(1000000, 20000000),
+        "Executor Run Time": run_time,
+        "Executor CPU Time": run_time * 900000,
+        "Result Size": 1024,
+        "JVM GC Time": rnd.randint(0, 10),
+        "Result Serialization Time": 0,
+        "Memory Bytes Spilled": 0,
+        "Disk Bytes Spilled": 0,
+        "Shuffle Read Metrics": {"Remote Blocks Fetched": 4, "Local Blocks Fetched": 4, "Fetch Wait Time": 1,
+                                 "Remote Bytes Read": rnd.randint(0, 1 << 20), "Local Bytes Read": 1 << 16,
+                                 "Total Records Read": 1000},
+        "Shuffle Write Metrics": {"Shuffle Bytes Written": rnd.randint(0, 1 << 20), "Shuffle Write Time": 100000,
+                                  "Shuffle Records Written": 1000},
+        "Input Metrics": {"Bytes Read": 0, "Records Read": 0},
+        "Output Metrics": {"Bytes Written": 0, "Records Written": 0},
+        "Updated Blocks": [],
+    }
+
+
+def _sql_plan_info(stages_per_job, first_accumulator_id):
+    """ A plan of one operator per stage, each with a row count and a timing metric, under a WholeStageCodegen. """
+    accumulator_id = first_accumulator_id
+    node = None
+    for s in range(stages_per_job):
+        metrics = [{"name": "number of output rows", "accumulatorId": accumulator_id, "metricType": "sum"},
+                   {"name": "time in aggregation build" if s % 2 else "scan time", "accumulatorId": accumulator_id + 1,
+                    "metricType": "timing" if s % 2 else "nsTiming"}]
+        accumulator_id += 2
+        node = {"nodeName": "HashAggregate" if s % 2 else "Scan parquet", "simpleString": "synthetic operator",
+                "children": [node] if node else [], "metadata": {}, "metrics": metrics}
+    return {"nodeName": "WholeStageCodegen (1)", "simpleString": "WholeStageCodegen (1)", "children": [node],
+            "metadata": {}, "metrics": [{"name": "duration", "accumulatorId": accumulator_id, "metricType": "timing"}]}
+
+
+# Task metrics that Spark sums over each stage in the accumulables of "SparkListenerStageCompleted"
+_STAGE_ACCUMULABLES = {
+    "internal.metrics.executorRunTime": lambda metrics: metrics["Executor Run Time"],
+    "internal.metrics.jvmGCTime": lambda metrics: metrics["JVM GC Time"],
+    "internal.metrics.memoryBytesSpilled": lambda metrics: metrics["Memory Bytes Spilled"],
+    "internal.metrics.diskBytesSpilled": lambda metrics: metrics["Disk Bytes Spilled"],
+    "internal.metrics.shuffle.read.remoteBytesRead":
+        lambda metrics: metrics["Shuffle Read Metrics"]["Remote Bytes Read"],
+    "internal.metrics.shuffle.read.localBytesRead":
+        lambda metrics: metrics["Shuffle Read Metrics"]["Local Bytes Read"],
+    "internal.metrics.shuffle.write.bytesWritten":
+        lambda metrics: metrics["Shuffle Write Metrics"]["Shuffle Bytes Written"],
+}
+
+
+def write_event_log(path, num_jobs=10, stages_per_job=3, tasks_per_stage=100, num_executors=4, rdds_per_stage=2,
+                    failure_rate=0.0, reused_stages=0, block_updates_per_task=0, sql=False, seed=0):
+    """
+    Writes a synthetic Spark event log to `path`.
+
+    Every job is a chain of `stages_per_job` stages. Each stage has `rdds_per_stage` RDDs and runs `tasks_per_stage`
+    tasks, spread round-robin over `num_executors` executors. A task attempt fails with probability `failure_rate`
+    and is then retried. From the second job on, a job also lists the last `reused_stages` stages of the previous
+    job as parents; they are skipped, as Spark does for shuffle outputs that are already computed.
+    `block_updates_per_task` "SparkListenerBlockUpdated" events, which the parser ignores, are written per task.
+    With `sql`, every job runs for an SQL execution of its own, whose plan has one operator per stage of the job.
+    """
+    rnd = random.Random(seed)
+    now = 1500000000000
+    lines = []
+
+    def emit(event):
+        lines.append(json.dumps(event, separators=(",", ":")))
+        if len(lines) >= 10000:
+            log_file.write("\n".join(lines) + "\n")
+            del lines[:]
+
+    with open(path, "w") as log_file:
+        emit({"Event": "SparkListenerLogStart", "Spark Version": "2.4.0"})
+        emit({"Event": "SparkListenerBlockManagerAdded",
+              "Block Manager ID": {"Executor ID": "driver", "Host": "10.0.0.254", "Port": 40000},
+              "Maximum Memory": 384093388, "Timestamp": now})
+        emit({"Event": "SparkListenerEnvironmentUpdate",
+              "JVM Information": {"Java Version": "1.8.0_131 (Oracle Corporation)"},
+              "Spark Properties": {"spark.app.name": "synthetic", "spark.app.id": "app-synthetic-0000"},
+              "System Properties": {"sun.java.command": "org.apache.spark.deploy.SparkSubmit synthetic.jar"}})
+        emit({"Event": "SparkListenerApplicationStart", "App Name": "synthetic", "App ID": "app-synthetic-0000",
+              "Timestamp": now, "User": "spark"})
+
+        for e in range(num_executors):
+            executor_id = str(e)
+            emit({"Event": "SparkListenerExecutorAdded", "Timestamp": now + 1, "Executor ID": executor_id,
+                  "Executor Info": {"Host": "10.0.0.{}".format(e), "Total Cores": 4, "Log Urls": {}}})
+            emit({"Event": "SparkListenerBlockManagerAdded",
+                  "Block Manager ID": {"Executor ID": executor_id, "Host": "10.0.0.{}".format(e), "Port": 40001},
+                  "Maximum Memory": 1508062003, "Timestamp": now + 2})
+
+        stage_id = 0
+        rdd_id = 0
+        task_id = 0
+        previous_stage_infos = []
+        now += 10
+        for job_id in range(num_jobs):
+            skipped_stage_infos = previous_stage_infos[len(previous_stage_infos) - reused_stages:] \
+                if reused_stages else []
+            stage_infos = []
+            parent_ids = [s["Stage ID"] for s in skipped_stage_infos[-1:]]
+            for _ in range(stages_per_job):
+                rdds = []
+                for _ in range(rdds_per_stage):
+                    rdds.append(_rdd_info(rdd_id, [rdd_id - 1] if rdd_id > 0 else [], tasks_per_stage,
+                                          cached=rdd_id % 10 == 0))
+                    rdd_id += 1
+                stage_infos.append(_stage_info(stage_id, parent_ids, tasks_per_stage, rdds))
+                parent_ids = [stage_id]
+                stage_id += 1
+            previous_stage_infos = stage_infos
+
+            properties = {}
+            first_accumulator_id = 1000 + job_id * (2 * stages_per_job + 1)
+            if sql:
+                properties["spark.sql.execution.id"] = str(job_id)
+                emit({"Event": "org.apache.spark.sql.execution.ui.SparkListenerSQLExecutionStart",
+                      "executionId": job_id, "description": "select {} from synthetic".format(job_id),
+                      "details": "", "physicalPlanDescription": "== Physical Plan ==",
+                      "sparkPlanInfo": _sql_plan_info(stages_per_job, first_accumulator_id), "time": now})
+            emit({"Event": "SparkListenerJobStart", "Job ID": job_id, "Submission Time": now,
+                  "Stage Infos": skipped_stage_infos + stage_infos,
+                  "Stage IDs": [s["Stage ID"] for s in skipped_stage_infos + stage_infos],
+                  "Properties": properties})
+
+            for s, stage_info in enumerate(stage_infos):
+                submission_time = now
+                totals = dict.fromkeys(_STAGE_ACCUMULABLES, 0)
+                emit({"Event": "SparkListenerStageSubmitted", "Stage Info": stage_info, "Properties": {}})
+                for index in range(tasks_per_stage):
+                    executor_id = str(index % num_executors)
+                    launch_time = now + index
+                    attempt = 0
+                    while True:
+                        finish_time = launch_time + rnd.randint(50, 500)
+                        failed = rnd.random() < failure_rate
+                        emit({"Event": "SparkListenerTaskStart", "Stage ID": stage_info["Stage ID"],
+                              "Stage Attempt ID": 0,
+                              "Task Info": _task_info(task_id, index, attempt, executor_id, launch_time)})
+                        for b in range(block_updates_per_task):
+                            emit({"Event": "SparkListenerBlockUpdated", "Block Updated Info": {
+                                "Block Manager ID": {"Executor ID": executor_id, "Host": "10.0.0.1", "Port": 40001},
+                                "Block ID": "rdd_{}_{}".format(stage_info["RDD Info"][-1]["RDD ID"], index),
+                                "Storage Level": {"Use Disk": False, "Use Memory": True, "Deserialized": True,
+                                                  "Replication": 1},
+                                "Memory Size": rnd.randint(0, 1 << 20), "Disk Size": 0}})
+                        end = {"Event": "SparkListenerTaskEnd", "Stage ID": stage_info["Stage ID"],
+                               "Stage Attempt ID": 0, "Task Type": "ResultTask",
+                               "Task End Reason": {"Reason": "Success"},
+                               "Task Info": _task_info(task_id, index, attempt, executor_id, launch_time, finish_time,
+                                                       failed),
+                               "Task Metrics": _task_metrics(rnd, finish_time - launch_time - 5)}
+                        if failed:
+                            end["Task End Reason"] = {"Reason": "ExceptionFailure", "Class Name": "java.io.IOException",
+                                                      "Description": "synthetic failure", "Stack Trace": [],
+                                                      "Full Stack Trace": "", "Accumulator Updates": []}
+                        emit(end)
+                        for name, path in _STAGE_ACCUMULABLES.items():
+                            totals[name] += path(end["Task Metrics"])
+                        task_id += 1
+                        if not failed:
+                            break
+                        attempt += 1
+                        launch_time = finish_time + 1
+                now += tasks_per_stage + 500
+                completed_info = dict(stage_info, **{"Submission Time": submission_time, "Completion Time": now})
+                completed_info["Accumulables"] = [
+                    {"ID": i, "Name": name, "Value": value, "Internal": True, "Count Failed Values": True}
+                    for i, (name, value) in enumerate(totals.items())]
+                if sql:
+                    accumulator_id = first_accumulator_id + 2 * s
+                    completed_info["Accumulables"] += [
+                        {"ID": accumulator_id, "Name": "number of output rows", "Value": str(1000 * tasks_per_stage),
+                         "Internal": True, "Count Failed Values": True, "Metadata": "sql"},
+                        {"ID": accumulator_id + 1, "Name": "time", "Value": str(rnd.randint(1, 100) * (
+                            1 if s % 2 else 1000000) * tasks_per_stage), "Internal": True,
+                         "Count Failed Values": True, "Metadata": "sql"}]
+                emit({"Event": "SparkListenerStageCompleted", "Stage Info": completed_info})
+
+            emit({"Event": "SparkListenerJobEnd", "Job ID": job_id, "Completion Time": now,
+                  "Job Result": {"Result": "JobSucceeded"}})
+            if sql:
+                emit({"Event": "org.apache.spark.sql.execution.ui.SparkListenerDriverAccumUpdates",
+                      "executionId": job_id, "accumUpdates": [[first_accumulator_id + 2 * stages_per_job,
+                                                               now - submission_time]]})
+                emit({"Event": "org.apache.spark.sql.execution.ui.SparkListenerSQLExecutionEnd",
+                      "executionId": job_id, "time": now + 5})
+            now += 10
+
+        for e in range(num_executors):
+            emit({"Event": "SparkListenerExecutorRemoved", "Timestamp": now, "Executor ID": str(e),
+                  "Removed Reason": "Application finished"})
+        emit({"Event": "SparkListenerApplicationEnd", "Timestamp": now + 1})
+
+        if lines:
+            log_file.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Write a synthetic Spark event log.")
+    arg_parser.add_argument("output")
+    arg_parser.add_argument("--jobs", type=int, default=10)
+    arg_parser.add_argument("--stages-per-job", type=int, default=3)
+    arg_parser.add_argument("--tasks-per-stage", type=int, default=100)
+    arg_parser.add_argument("--executors", type=int, default=4)
+    arg_parser.add_argument("--rdds-per-stage", type=int, default=2)
+    arg_parser.add_argument("--failure-rate", type=float, default=0.0)
+    arg_parser.add_argument("--reused-stages", type=int, default=0)
+    arg_parser.add_argument("--block-updates-per-task", type=int, default=0)
+    arg_parser.add_argument("--sql", action="store_true")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+    write_event_log(args.output, num_jobs=args.jobs, stages_per_job=args.stages_per_job,
+                    tasks_per_stage=args.tasks_per_stage, num_executors=args.executors,
+                    rdds_per_stage=args.rdds_per_stage, failure_rate=args.failure_rate,
+                    reused_stages=args.reused_stages, block_updates_per_task=args.block_updates_per_task,
+                    sql=args.sql, seed=args.seed)
@@ -0,0 +1,250 @@
+import math
+from array import array
+
+import numpy
+
+from log_parser.stats import PERCENTILES
+from log_parser.stats import RuntimeStats
+
+
+class RunningStats:
+    """ Count, sum, mean, variance (Welford's online algorithm), min and max of a stream of numbers. Mergeable. """
+
+    __slots__ = ("count", "total", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, x):
+        self.count += 1
+        self.total += x
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.min = x if self.min is None or x < self.min else self.min
+        self.max = x if self.max is None or x > self.max else self.max
+
+    def add_many(self, values):
+        """ Adds the numbers of the numpy array values at once. """
+        if len(values) == 0:
+            return
+        mean = values.mean()
+        self._merge(len(values), int(values.sum()), float(mean), float(((values - mean) ** 2).sum()),
+                    int(values.min()), int(values.max()))
+
+    def merge(self, other):
+        """ Adds the numbers of other. """
+        if other.count > 0:
+            self._merge(other.count, other.total, other.mean, other.m2, other.min, other.max)
+
+    def _merge(self, count, total, mean, m2, minimum, maximum):
+        # Chan et al. pairwise update of the mean and variance
+        new_count = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.count * count / new_count
+        self.mean += delta * count / new_count
+        self.count = new_count
+        self.total += total
+        self.min = minimum if self.min is None or minimum < self.min else self.min
+        self.max = maximum if self.max is None or maximum > self.max else self.max
+
+    @property
+    def std(self):
+        """ Population standard deviation, as numpy.std. """
+        return math.sqrt(self.m2 / self.count) if self.count > 0 else 0.0
+
+
+class QuantileSketch:
+    """
+    Approximate quantiles of a stream of non-negative numbers in constant memory: numbers are counted in buckets
+    that grow geometrically, [gamma^(i-1), gamma^i), so that any quantile is returned within relative_accuracy of the
+    exact one (as in DDSketch). Numbers below 1 (and negative ones) count as 0. Sketches with the same accuracy merge
+    exactly by adding their buckets.
+    """
+
+    __slots__ = ("gamma", "buckets", "zero_count", "count")
+
+    def __init__(self, relative_accuracy=0.01):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.buckets = {}  # i -> count of the numbers in [gamma^(i-1), gamma^i)
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, x):
+        self.count += 1
+        if x < 1:
+            self.zero_count += 1
+            return
+        i = math.ceil(math.log(x, self.gamma))
+        self.buckets[i] = self.buckets.get(i, 0) + 1
+
+    def add_many(self, values):
+        """ Adds the numbers of the numpy array values at once. """
+        self.count += len(values)
+        positive = values[values >= 1]
+        self.zero_count += len(values) - len(positive)
+        indices, counts = numpy.unique(numpy.ceil(numpy.log(positive) / math.log(self.gamma)), return_counts=True)
+        for i, count in zip(indices.astype(int).tolist(), counts.tolist()):
+            self.buckets[i] = self.buckets.get(i, 0) + count
+
+    def merge(self, other):
+        assert other.gamma == self.gamma
+        for i, count in other.buckets.items():
+            self.buckets[i] = self.buckets.get(i, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q):
+        """ The number of rank q * (count - 1) (0 <= q <= 1), or None if the sketch is empty. """
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if rank < seen:
+                return 2 * self.gamma ** i / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class TaskAggregate:
+    """
+    Runtimes of a group of finished tasks (e.g. of a stage or an executor), folded in as they end instead of kept:
+    stands for the tasks of the group in streaming mode, see StreamingTasks.
+    """
+
+    __slots__ = ("all", "successful", "sketch")
+
+    def __init__(self):
+        self.all = RunningStats()  # all finished tasks
+        self.successful = RunningStats()
+        self.sketch = QuantileSketch()  # successful tasks
+
+    def add(self, runtime, successful):
+        self.all.add(runtime)
+        if successful:
+            self.successful.add(runtime)
+            self.sketch.add(runtime)
+
+    def add_many(self, runtimes, successful):
+        """ add() of numpy arrays of runtimes and of successful flags. """
+        self.all.add_many(runtimes)
+        self.successful.add_many(runtimes[successful])
+        self.sketch.add_many(runtimes[successful])
+
+    def merge(self, other):
+        self.all.merge(other.all)
+        self.successful.merge(other.successful)
+        self.sketch.merge(other.sketch)
+
+    def __len__(self):
+        return self.all.count
+
+    def __iter__(self):
+        return iter(())  # the tasks themselves are not kept
+
+    def mean_runtime(self):
+        return float(self.all.total) / self.all.count
+
+    def total_runtime(self):
+        return self.all.total
+
+    def runtime_moments(self):
+        """ (mean, std, min, max) of the runtimes of all tasks. """
+        return self.mean_runtime(), self.all.std, self.all.min, self.all.max
+
+    def runtime_stats(self):
+        """ RuntimeStats of the successful tasks, with approximate percentiles and no list of stragglers. """
+        if self.successful.count == 0:
+            return None
+        p50, p90, p99 = (min(max(self.sketch.quantile(q / 100), self.successful.min), self.successful.max)
+                         for q in PERCENTILES)
+        return RuntimeStats(count=self.successful.count, mean=self.successful.mean, p50=p50, p90=p90, p99=p99,
+                            max=float(self.successful.max), skew=self.successful.max / p50 if p50 > 0 else None,
+                            stragglers=None)
+
+
+class StreamingTasks:
+    """
+    Takes the place of the TaskTable of a LogParser in streaming mode: each "SparkListenerTaskEnd" is folded into
+    TaskAggregates of its stage attempt, of its executor and of the whole application, then dropped, so that memory
+    does not depend on the number of tasks.
+
+    Ended tasks are first buffered, BATCH_SIZE at most, and folded in together with numpy: call flush() before
+    reading the aggregates.
+    """
+
+    BATCH_SIZE = 1 << 16
+
+    def __init__(self):
+        self.by_stage = {}  # (stage id, stage attempt id) -> TaskAggregate
+        self.by_executor = {}  # executor id -> TaskAggregate
+        self.overall = TaskAggregate()
+        self.num_successful = 0
+
+        self.stage_keys = []  # code -> (stage id, stage attempt id), for the buffer
+        self.stage_codes = {}
+        self.executor_ids = []  # code -> executor id
+        self.executor_codes = {}
+        self._clear_buffer()
+
+    def _clear_buffer(self):
+        self.buffered_stages = array("i")
+        self.buffered_executors = array("i")
+        self.buffered_runtimes = array("q")
+        self.buffered_successful = array("b")
+
+    @staticmethod
+    def _code(codes, keys, key):
+        code = codes.get(key)
+        if code is None:
+            code = codes[key] = len(keys)
+            keys.append(key)
+        return code
+
+    def start(self, data):
+        pass  # "SparkListenerTaskEnd" repeats the "Task Info" of the start
+
+    def finish(self, data):
+        info = data["Task Info"]
+        self.buffered_stages.append(self._code(self.stage_codes, self.stage_keys,
+                                               (data["Stage ID"], data["Stage Attempt ID"])))
+        self.buffered_executors.append(self._code(self.executor_codes, self.executor_ids, info["Executor ID"]))
+        self.buffered_runtimes.append(info["Finish Time"] - info["Launch Time"])
+        self.buffered_successful.append(data["Task End Reason"]["Reason"] == "Success")
+        if len(self.buffered_runtimes) >= self.BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """ Folds the buffered tasks into the aggregates. """
+        if len(self.buffered_runtimes) == 0:
+            return
+        runtimes = numpy.frombuffer(self.buffered_runtimes, dtype=numpy.int64)
+        successful = numpy.frombuffer(self.buffered_successful, dtype=numpy.int8).astype(bool)
+        self.num_successful += int(successful.sum())
+        self.overall.add_many(runtimes, successful)
+        for buffered_codes, keys, aggregates in ((self.buffered_stages, self.stage_keys, self.by_stage),
+                                                 (self.buffered_executors, self.executor_ids, self.by_executor)):
+            codes = numpy.frombuffer(buffered_codes, dtype=numpy.int32)
+            order = numpy.argsort(codes, kind="stable")
+            boundaries = numpy.flatnonzero(numpy.diff(codes[order])) + 1
+            for rows in numpy.split(order, boundaries):
+                key = keys[codes[rows[0]]]
+                aggregate = aggregates.get(key)
+                if aggregate is None:
+                    aggregate = aggregates[key] = TaskAggregate()
+                aggregate.add_many(runtimes[rows], successful[rows])
+        self._clear_buffer()
+
+    def __len__(self):
+        return len(self.overall) + len(self.buffered_runtimes)
+
+    def values(self):
+        return iter(())
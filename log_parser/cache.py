@@ -0,0 +1,75 @@
+import hashlib
+import os
+
+from log_parser.event_log import rolling_log_parts
+from log_parser.state import STATE_VERSION
+from log_parser.state import dump_state
+from log_parser.state import load_state
+
+STATE_FILE_SUFFIX = ".state"
+
+
+class ParseCache:
+    """
+    Parsed applications (LogParser objects after process()) saved under a directory, so that a log that did not
+    change is loaded instead of parsed again.
+
+    An entry is keyed by the path, size and modification time of the log (of each part for a rolling log), and
+    optionally by a hash of its content. Entries of another STATE_VERSION are never used. When the entries take more
+    than max_size bytes, the least recently used ones are removed.
+    """
+
+    def __init__(self, directory, max_size=1 << 30, hash_content=False):
+        self.directory = directory
+        self.max_size = max_size
+        self.hash_content = hash_content
+
+    def fingerprint(self, path):
+        files = rolling_log_parts(path) if os.path.isdir(path) else [path]
+        digest = hashlib.sha1(f"{STATE_VERSION}\0{os.path.abspath(path)}".encode())
+        for f in files:
+            stat = os.stat(f)
+            digest.update(f"\0{f}\0{stat.st_size}\0{stat.st_mtime_ns}".encode())
+            if self.hash_content:
+                with open(f, "rb") as log_file:
+                    for chunk in iter(lambda: log_file.read(1 << 20), b""):
+                        digest.update(chunk)
+        return digest.hexdigest()
+
+    def entry_path(self, path):
+        return os.path.join(self.directory, self.fingerprint(path) + STATE_FILE_SUFFIX)
+
+    def get(self, path):
+        """ Returns the LogParser cached for the log at path, or None. """
+        entry_path = self.entry_path(path)
+        log_parser = load_state(entry_path)
+        if log_parser is not None:
+            try:
+                os.utime(entry_path)  # the modification time of an entry is its last use
+            except FileNotFoundError:
+                pass
+        return log_parser
+
+    def put(self, path, log_parser):
+        dump_state(log_parser, self.entry_path(path))
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(STATE_FILE_SUFFIX):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue  # removed by another process
+                entries.append((stat.st_mtime_ns, stat.st_size, name))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total_size -= size
@@ -0,0 +1,211 @@
+import os
+from collections import deque
+
+# A change is a regression when the candidate is more than REGRESSION_THRESHOLD (relative) above the baseline, and by
+# more than MIN_DELTAS of the metric (absolute), so that tiny stages do not raise alerts for noise.
+REGRESSION_THRESHOLD = 0.2
+MIN_DELTAS = {
+    "duration_ms": 1000,
+    "jvm_gc_time_ms": 1000,
+    "spilled_bytes": 64 << 20,
+    "shuffle_read_bytes": 64 << 20,
+    "shuffle_write_bytes": 64 << 20,
+}
+# Metrics compared per stage; "tasks" is reported but never a regression by itself
+STAGE_METRICS = ("duration_ms", "tasks", "jvm_gc_time_ms", "spilled_bytes", "shuffle_read_bytes",
+                 "shuffle_write_bytes")
+
+
+def _sum_metrics(stage, names):
+    if any(name not in stage.metrics for name in names):
+        return None
+    return sum(stage.metrics[name] for name in names)
+
+
+def _task_column_sum(stage, names):
+    """ Sum of TaskTable columns over the tasks of stage, None in streaming mode where tasks are not kept. """
+    if not hasattr(stage.tasks, "column"):
+        return None
+    return int(sum(stage.tasks.column(name).sum() for name in names))
+
+
+def stage_metrics(stage):
+    """
+    The metrics of a stage that ran, compared by compare_profiles. Sums of task metrics are read from the
+    accumulables of the stage completion, or from its tasks for logs without them; None when not known.
+    """
+    spilled = ("memory_spilled_bytes", "disk_spilled_bytes")
+    gc = _sum_metrics(stage, ("jvm_gc_time",))
+    spilled_bytes = _sum_metrics(stage, spilled)
+    return {
+        "duration_ms": stage.get_completion_time(),
+        "tasks": len(stage.tasks),
+        "jvm_gc_time_ms": gc if gc is not None else _task_column_sum(stage, ("jvm_gc_time",)),
+        "spilled_bytes": spilled_bytes if spilled_bytes is not None else _task_column_sum(stage, spilled),
+        "shuffle_read_bytes": _sum_metrics(stage, ("shuffle_remote_bytes_read", "shuffle_local_bytes_read")),
+        "shuffle_write_bytes": _sum_metrics(stage, ("shuffle_bytes_written",)),
+    }
+
+
+def _stage_depths(job):
+    """ stage id -> number of dependencies between the stage and the last stage of job (0 for the last stage). """
+    stages = {s.stage_id: s for s in job.stages}
+    children = {stage_id: 0 for stage_id in stages}
+    for s in job.stages:
+        for parent_id in s.parent_ids:
+            if parent_id in children:
+                children[parent_id] += 1
+    depths = {stage_id: 0 for stage_id, num_children in children.items() if num_children == 0}
+    queue = deque(depths)
+    while queue:
+        stage_id = queue.popleft()
+        for parent_id in stages[stage_id].parent_ids:
+            if parent_id in stages and parent_id not in depths:
+                depths[parent_id] = depths[stage_id] + 1
+                queue.append(parent_id)
+    return depths
+
+
+def stage_keys(log_parser):
+    """
+    Yields (key, stage) for the stages that ran, keyed by what stays the same from run to run rather than by ids:
+    the job by the name of its last stage and its number of stages, and the stage by its name, the callsite of its
+    last RDD and its depth in the DAG of the job; both with their occurrence number among the same keys, in order.
+    """
+    job_occurrences = {}
+    for job in sorted(log_parser.jobs.values(), key=lambda j: (j.submission_time, j.job_id)):
+        if not job.stages:
+            continue
+        last_stage = max(job.stages, key=lambda s: s.stage_id)
+        job_key = (last_stage.name, len(job.stages))
+        job_occurrence = job_occurrences[job_key] = job_occurrences.get(job_key, -1) + 1
+        depths = _stage_depths(job)
+        stage_occurrences = {}
+        for stage in sorted(job.stages, key=lambda s: s.stage_id):
+            if stage.submission_time is None:
+                continue  # skipped: its output was reused from an earlier job
+            callsite = stage.RDDs[-1].callsite if stage.RDDs else None
+            stage_key = (stage.name, callsite, depths.get(stage.stage_id))
+            stage_occurrence = stage_occurrences[stage_key] = stage_occurrences.get(stage_key, -1) + 1
+            yield "job '{}' ({} stages) #{} / stage '{}' at {} (depth {}) #{}".format(
+                *job_key, job_occurrence, stage.name, callsite, stage_key[2], stage_occurrence), stage
+
+
+class ApplicationProfile:
+    """
+    What compare_profiles needs of a parsed application: small and cheap to pickle, like ApplicationSummary, so that
+    it can be sent back from a worker process.
+    """
+
+    def __init__(self, path, app_name, app_id, duration_ms, stages):
+        self.path = path
+        self.app_name = app_name
+        self.app_id = app_id
+        self.duration_ms = duration_ms
+        self.stages = stages  # stage key (see stage_keys) -> stage_metrics
+
+    @classmethod
+    def from_log_parser(cls, log_parser):
+        start = log_parser.parsed_data.get("app_start_timestamp")
+        end = log_parser.parsed_data.get("app_end_timestamp")
+        duration_ms = end - start if start is not None and end is not None else None
+        stages = {key: stage_metrics(stage) for key, stage in stage_keys(log_parser)}
+        return cls(log_parser.filename, log_parser.get_app_name(), log_parser.get_app_id(), duration_ms, stages)
+
+
+def _change(metric, baseline, candidate, threshold):
+    change = {"metric": metric, "baseline": baseline, "candidate": candidate, "delta": None, "ratio": None,
+              "regression": False}
+    if baseline is None or candidate is None:
+        return change
+    change["delta"] = candidate - baseline
+    change["ratio"] = candidate / baseline if baseline else None
+    min_delta = MIN_DELTAS.get(metric)
+    change["regression"] = (min_delta is not None and change["delta"] > min_delta
+                            and (not baseline or change["delta"] > threshold * baseline))
+    return change
+
+
+def compare_profiles(baseline, candidate, threshold=REGRESSION_THRESHOLD):
+    """
+    Compares two ApplicationProfile of the same application. Returns a JSON-serializable dict: the application
+    duration change, the changes of the stages found in both runs, the keys of the stages found in only one, and
+    the regressions among the changes.
+    """
+    stages = []
+    for key, baseline_metrics in baseline.stages.items():
+        candidate_metrics = candidate.stages.get(key)
+        if candidate_metrics is None:
+            continue
+        changes = [_change(metric, baseline_metrics[metric], candidate_metrics[metric], threshold)
+                   for metric in STAGE_METRICS]
+        stages.append({"stage": key, "changes": changes})
+    duration = _change("duration_ms", baseline.duration_ms, candidate.duration_ms, threshold)
+    regressions = [dict(change, stage=None) for change in (duration,) if change["regression"]]
+    regressions += [dict(change, stage=stage["stage"]) for stage in stages for change in stage["changes"]
+                    if change["regression"]]
+    return {
+        "app_name": candidate.app_name,
+        "baseline": {"path": baseline.path, "app_id": baseline.app_id},
+        "candidate": {"path": candidate.path, "app_id": candidate.app_id},
+        "threshold": threshold,
+        "duration": duration,
+        "stages": stages,
+        "only_in_baseline": [key for key in baseline.stages if key not in candidate.stages],
+        "only_in_candidate": [key for key in candidate.stages if key not in baseline.stages],
+        "regressions": regressions,
+    }
+
+
+def pair_profiles(baseline_profiles, candidate_profiles):
+    """
+    Pairs the profiles of two directories by application name; of several runs with the same name, the one with the
+    greatest path is taken (the latest, with Spark's time-ordered application ids). Returns (pairs, unpaired paths).
+    """
+    def by_name(profiles):
+        latest = {}
+        for profile in sorted(profiles, key=lambda p: p.path):
+            latest[profile.app_name] = profile
+        return latest
+
+    baseline_by_name = by_name(baseline_profiles)
+    candidate_by_name = by_name(candidate_profiles)
+    pairs = [(baseline_by_name[name], candidate) for name, candidate in sorted(candidate_by_name.items(),
+                                                                              key=lambda item: str(item[0]))
+             if name in baseline_by_name]
+    unpaired = sorted(p.path for name, p in list(baseline_by_name.items()) + list(candidate_by_name.items())
+                      if name not in baseline_by_name or name not in candidate_by_name)
+    return pairs, unpaired
+
+
+def _format_value(metric, value):
+    if value is None:
+        return "?"
+    if metric.endswith("_bytes"):
+        return "{:.1f}MiB".format(value / (1 << 20))
+    return str(value)
+
+
+def write_comparison_report(out, comparisons, max_regressions=20):
+    """ The regressions of each comparison of compare_profiles, as text, the largest max_regressions at most. """
+    for comparison in comparisons:
+        out.write("Application '{}': {} -> {}\n".format(comparison["app_name"],
+                                                        os.path.basename(comparison["baseline"]["path"]),
+                                                        os.path.basename(comparison["candidate"]["path"])))
+        duration = comparison["duration"]
+        out.write("\tDuration: {} -> {}\n".format(_format_value("duration_ms", duration["baseline"]),
+                                                   _format_value("duration_ms", duration["candidate"])))
+        out.write("\t{} stages compared, {} only in the baseline, {} only in the candidate\n".format(
+            len(comparison["stages"]), len(comparison["only_in_baseline"]), len(comparison["only_in_candidate"])))
+        if not comparison["regressions"]:
+            out.write("\tNo regressions\n")
+        regressions = sorted(comparison["regressions"], key=lambda r: -(r["ratio"] or 0))
+        for regression in regressions[:max_regressions]:
+            ratio = regression["ratio"]
+            out.write("\tREGRESSION {}{}: {} -> {}{}\n".format(
+                regression["metric"], " of " + regression["stage"] if regression["stage"] else "",
+                _format_value(regression["metric"], regression["baseline"]),
+                _format_value(regression["metric"], regression["candidate"]),
+                " (x{:.2f})".format(ratio) if ratio is not None else ""))
+        if len(regressions) > max_regressions:
+            out.write("\t... {} more regressions\n".format(len(regressions) - max_regressions))
@@ -0,0 +1,92 @@
+from collections import deque
+from collections import namedtuple
+
+CriticalPath = namedtuple("CriticalPath", ["job_id", "length", "stage_ids", "slack"])
+CriticalPath.__doc__ = """
+The chain of stages of a job that sets its run time, as in the critical path method with stage completion times
+as durations: length is the sum of their durations (ms) and stage_ids the chain, from first to last stage.
+slack maps every stage id of the job to how much longer (ms) it could have run without making the job longer;
+it is 0 on the critical path.
+"""
+
+
+def topological_order(nodes, parents):
+    """
+    Kahn's algorithm: returns nodes ordered so that every node comes after its parents, in O(nodes + edges).
+    parents maps a node to its parent nodes; parents that are not in nodes are ignored. Raises ValueError on a cycle.
+    """
+    children = {node: [] for node in nodes}
+    num_parents = dict.fromkeys(nodes, 0)
+    for node in nodes:
+        for parent in parents[node]:
+            if parent in children:
+                children[parent].append(node)
+                num_parents[node] += 1
+
+    ready = deque(node for node in nodes if num_parents[node] == 0)
+    order = []
+    while ready:
+        node = ready.popleft()
+        order.append(node)
+        for child in children[node]:
+            num_parents[child] -= 1
+            if num_parents[child] == 0:
+                ready.append(child)
+    if len(order) != len(nodes):
+        raise ValueError("the DAG has a cycle")
+    return order, children
+
+
+def job_critical_path(job):
+    """ Returns the CriticalPath of job. Stages that did not run (skipped stages) last 0ms. """
+    stages = {s.stage_id: s for s in job.stages}
+    parents = {stage_id: s.parent_ids for stage_id, s in stages.items()}
+    durations = {stage_id: max(s.get_completion_time(), 0) for stage_id, s in stages.items()}
+    try:
+        order, children = topological_order(list(stages), parents)
+    except ValueError:
+        raise ValueError("the stage DAG of job {} has a cycle".format(job.job_id))
+    if not order:
+        return CriticalPath(job.job_id, 0, [], {})
+
+    # Earliest finish of each stage, and the parent that finishes last (the one it waits for)
+    earliest_finish = {}
+    last_parent = {}
+    for stage_id in order:
+        start = 0
+        for parent in parents[stage_id]:
+            if parent in earliest_finish and earliest_finish[parent] > start:
+                start = earliest_finish[parent]
+                last_parent[stage_id] = parent
+        earliest_finish[stage_id] = start + durations[stage_id]
+    length = max(earliest_finish.values())
+
+    # Latest finish of each stage that does not delay the job
+    latest_finish = {}
+    for stage_id in reversed(order):
+        latest_finish[stage_id] = min((latest_finish[child] - durations[child] for child in children[stage_id]),
+                                      default=length)
+    slack = {stage_id: latest_finish[stage_id] - earliest_finish[stage_id] for stage_id in order}
+
+    stage_id = max(order, key=lambda s: earliest_finish[s])
+    path = [stage_id]
+    while stage_id in last_parent:
+        stage_id = last_parent[stage_id]
+        path.append(stage_id)
+    return CriticalPath(job.job_id, length, path[::-1], slack)
+
+
+def critical_paths(log_parser):
+    """ Returns a dict job id -> CriticalPath, for all jobs of log_parser. """
+    return {job_id: job_critical_path(job) for job_id, job in log_parser.jobs.items()}
+
+
+def write_critical_paths_report(out, paths):
+    """ Writes the critical path of each job, then the stages with slack, by decreasing slack. """
+    for path in paths.values():
+        out.write("Job {}: {}ms on the critical path: {}\n".format(
+            path.job_id, path.length, " -> ".join(str(stage_id) for stage_id in path.stage_ids)))
+        with_slack = sorted(((slack, stage_id) for stage_id, slack in path.slack.items() if slack > 0), reverse=True)
+        if with_slack:
+            out.write("\tSlack: {}\n".format(", ".join("stage {} {}ms".format(stage_id, slack)
+                                                       for slack, stage_id in with_slack)))
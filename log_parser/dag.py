@@ -0,0 +1,116 @@
+import graphviz
+from graphviz import Digraph
+
+
+CRITICAL_PATH_STYLE = dict(color="red", penwidth="2")
+
+
+def _digraph(nodes, edges, highlighted_nodes=(), highlighted_edges=()):
+    dag = Digraph()
+    for node_id, label in nodes.items():
+        dag.node(str(node_id), label, **(CRITICAL_PATH_STYLE if node_id in highlighted_nodes else {}))
+    for parent, child in edges:
+        dag.edge(str(parent), str(child), **(CRITICAL_PATH_STYLE if (parent, child) in highlighted_edges else {}))
+    return dag
+
+
+def stages_dag(log_parser):
+    """
+    The DAG of the stages of all jobs, each stage and dependency once (a stage can be listed by many jobs).
+    The critical path of each job is highlighted.
+    """
+    nodes = {}  # stage id -> label; as in DOT, the last label given to a node is the one kept
+    edges = {}  # (parent, child) -> None, an ordered set
+    for j in log_parser.jobs.values():
+        for s in j.stages:
+            assert type(s.stage_id) == int
+            nodes[s.stage_id] = f"{s.stage_id} ({s.get_completion_time()}ms, j={j.job_id})"
+            for parent in s.parent_ids:
+                assert type(parent) == int
+                edges[(parent, s.stage_id)] = None
+
+    critical_nodes = set()
+    critical_edges = set()
+    for path in log_parser.get_critical_paths().values():
+        critical_nodes.update(path.stage_ids)
+        critical_edges.update(zip(path.stage_ids, path.stage_ids[1:]))
+    return _digraph(nodes, edges, critical_nodes, critical_edges)
+
+
+def collapse_linear_chains(nodes, edges):
+    """
+    Merges every node that has a single parent, itself with a single child, into that parent: a linear chain of
+    nodes becomes one node, labelled with its first and last labels. Returns the new (nodes, edges).
+    """
+    parents = {}
+    num_children = {}
+    for parent, child in edges:
+        parents.setdefault(child, []).append(parent)
+        num_children[parent] = num_children.get(parent, 0) + 1
+
+    head = {}  # node -> first node of its chain
+    for node in nodes:
+        chain = []
+        while node not in head:
+            chain.append(node)
+            node_parents = parents.get(node, ())
+            if len(node_parents) != 1 or node_parents[0] not in nodes or num_children[node_parents[0]] != 1:
+                head[node] = node
+                break
+            node = node_parents[0]
+        for n in chain:
+            head[n] = head[node]
+
+    chain_lengths = {}
+    for node in nodes:
+        chain_lengths[head[node]] = chain_lengths.get(head[node], 0) + 1
+    # The tail of a chain is its node that is not the parent of another node of the chain.
+    not_tails = set(parents[node][0] for node in nodes if head[node] != node)
+    chain_tails = {head[node]: node for node in nodes if node not in not_tails}
+
+    collapsed_nodes = {}
+    for node, label in nodes.items():
+        if head[node] == node:
+            if chain_lengths[node] == 1:
+                collapsed_nodes[node] = label
+            else:
+                collapsed_nodes[node] = f"{label} ... {nodes[chain_tails[node]]} ({chain_lengths[node]} RDDs)"
+    collapsed_edges = {}
+    for parent, child in edges:
+        parent, child = head.get(parent, parent), head.get(child, child)
+        if parent != child:
+            collapsed_edges[(parent, child)] = None
+    return collapsed_nodes, collapsed_edges
+
+
+def rdds_dag(log_parser, max_nodes=None):
+    """
+    The DAG of the RDDs of all stages, each RDD and dependency once (the same lineage is listed by many stages).
+    With more than max_nodes RDDs, linear chains of RDDs are collapsed into one node each.
+    """
+    nodes = {}  # rdd id -> label; as in DOT, the last label given to a node is the one kept
+    edges = {}  # (parent, child) -> None, an ordered set
+    for j in log_parser.jobs.values():
+        for s in j.stages:
+            for r in s.RDDs:
+                assert type(r.rdd_id) == int
+                nodes[r.rdd_id] = f"{r.name} {r.rdd_id} (j={j.job_id}, s={s.stage_id})"
+                for parent in r.parent_ids:
+                    assert type(parent) == int
+                    edges[(parent, r.rdd_id)] = None
+    if max_nodes is not None and len(nodes) > max_nodes:
+        nodes, edges = collapse_linear_chains(nodes, edges)
+    return _digraph(nodes, edges)
+
+
+def save_dag(dag, filename, render=True, view=False):
+    """ Saves the DOT source of dag to filename and, if render is set, lays it out with Graphviz into filename.pdf. """
+    if render:
+        dag.render(filename, view=view)
+    else:
+        dag.save(filename)
+
+
+def render_dot_file(filename, format="pdf"):
+    """ Lays out a DOT file saved by save_dag(render=False), e.g. in a worker process. Returns the output path. """
+    return graphviz.render("dot", format, filename)
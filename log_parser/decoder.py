@@ -0,0 +1,74 @@
+import io
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class Decoder:
+    """
+    A JSON backend for event log lines. `binary` decoders get the lines as bytes straight from the file; the
+    others get str lines, decoded from UTF-8 by the io layer in large chunks, which is faster than per line.
+    """
+
+    def __init__(self, name, loads, binary):
+        self.name = name
+        self.loads = loads
+        self.binary = binary
+
+    def event_prefix(self):
+        """ EVENT_PREFIX, as bytes or str like the lines of this decoder. """
+        return EVENT_PREFIX if self.binary else EVENT_PREFIX.decode()
+
+    def lines(self, binary_file):
+        """ Iterates over the lines of a binary file object, as this decoder wants them. """
+        if self.binary:
+            return binary_file
+        # Lines are split on "\n" only, like in binary mode, so a line always holds exactly one JSON document.
+        return io.TextIOWrapper(binary_file, encoding="utf-8", newline="\n")
+
+
+def _orjson_loads(line):
+    try:
+        return orjson.loads(line)
+    except orjson.JSONDecodeError:
+        # orjson refuses some documents that json accepts (NaN, integers beyond 64 bits, lone surrogates),
+        # json decides for those so that both backends give the same results.
+        return json.loads(line)
+
+
+DECODERS = {"json": Decoder("json", json.loads, binary=False)}
+if orjson is not None:
+    DECODERS["orjson"] = Decoder("orjson", _orjson_loads, binary=True)
+
+
+EVENT_PREFIX = b'{"Event":"'
+_TEXT_EVENT_PREFIX = EVENT_PREFIX.decode()
+
+
+def event_type_of(line):
+    """
+    Returns the event type of a raw (bytes or str) event log line without decoding it, or None when the line does
+    not start the way Spark writes events ('{"Event":"<type>",...') and has to be decoded to know.
+    """
+    if isinstance(line, str):
+        if line.startswith(_TEXT_EVENT_PREFIX):
+            end = line.find('"', len(_TEXT_EVENT_PREFIX))
+            if end > 0:
+                return line[len(_TEXT_EVENT_PREFIX):end]
+    elif line.startswith(EVENT_PREFIX):
+        end = line.find(b'"', len(EVENT_PREFIX))
+        if end > 0:
+            return line[len(EVENT_PREFIX):end].decode()
+    return None
+
+
+def get_decoder(name=None):
+    """ name is one of DECODERS, or None for the fastest one installed. """
+    if name is None:
+        name = "orjson" if "orjson" in DECODERS else "json"
+    if name not in DECODERS:
+        raise ValueError(f"unknown or not installed JSON decoder '{name}', available: {', '.join(DECODERS)}")
+    return DECODERS[name]
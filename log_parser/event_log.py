@@ -0,0 +1,219 @@
+import io
+import os
+import re
+import struct
+
+ROLLING_LOG_DIR_PREFIX = "eventlog_v2_"
+IN_PROGRESS_SUFFIX = ".inprogress"
+READ_SIZE = 1 << 20
+
+_rolling_log_part_regex = re.compile(r"^events_(\d+)_")
+
+
+def _read_exactly(raw_file, size):
+    data = raw_file.read(size)
+    # A short read is the end of the file, or the block being written in an in-progress log: both end the stream.
+    return data if len(data) == size else None
+
+
+def _import_codec_module(codec, module, package):
+    try:
+        return __import__(module, fromlist=["_"])
+    except ImportError:
+        raise ImportError(f"reading {codec} compressed event logs needs the '{package}' package")
+
+
+def _lz4_chunks(raw_file):
+    """ The LZ4BlockOutputStream format of lz4-java, used by Spark's lz4 codec. """
+    lz4_block = _import_codec_module("lz4", "lz4.block", "lz4")
+    while True:
+        header = _read_exactly(raw_file, 21)
+        if header is None:
+            return
+        magic, token, compressed_length, length, _ = struct.unpack("<8sBiiI", header)
+        if magic != b"LZ4Block":
+            raise ValueError("corrupt lz4 event log: bad block magic")
+        data = _read_exactly(raw_file, compressed_length)
+        if data is None:
+            return
+        if length == 0:
+            continue  # end mark of a stream, another stream may follow
+        if token & 0xF0 == 0x10:
+            yield data
+        else:
+            yield lz4_block.decompress(data, uncompressed_size=length)
+
+
+def _snappy_chunks(raw_file):
+    """ The SnappyOutputStream format of snappy-java, used by Spark's snappy codec. """
+    snappy = _import_codec_module("snappy", "snappy", "python-snappy")
+    header = _read_exactly(raw_file, 16)
+    if header is None:
+        return
+    if header[:8] != b"\x82SNAPPY\x00":
+        raise ValueError("corrupt snappy event log: bad stream header")
+    while True:
+        length = _read_exactly(raw_file, 4)
+        if length is None:
+            return
+        data = _read_exactly(raw_file, struct.unpack(">i", length)[0])
+        if data is None:
+            return
+        yield snappy.uncompress(data)
+
+
+def _lzf_chunks(raw_file):
+    """ The LZFOutputStream format of compress-lzf, used by Spark's lzf codec. """
+    lzf = _import_codec_module("lzf", "lzf", "python-lzf")
+    while True:
+        header = _read_exactly(raw_file, 5)
+        if header is None:
+            return
+        if header[:2] != b"ZV":
+            raise ValueError("corrupt lzf event log: bad chunk header")
+        length = struct.unpack(">H", header[3:5])[0]
+        if header[2] == 0:
+            data = _read_exactly(raw_file, length)
+            if data is None:
+                return
+            yield data
+        else:
+            uncompressed_length = _read_exactly(raw_file, 2)
+            data = _read_exactly(raw_file, length) if uncompressed_length is not None else None
+            if data is None:
+                return
+            yield lzf.decompress(data, struct.unpack(">H", uncompressed_length)[0])
+
+
+def _zstd_chunks(raw_file):
+    zstandard = _import_codec_module("zstd", "zstandard", "zstandard")
+    reader = zstandard.ZstdDecompressor().stream_reader(raw_file, read_across_frames=True)
+    while True:
+        chunk = reader.read(READ_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _plain_chunks(raw_file):
+    while True:
+        chunk = raw_file.read(READ_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+# file extension (as in spark.eventLog.compression.codec) -> generator of the decompressed chunks of a file
+CODECS = {
+    ".lz4": _lz4_chunks,
+    ".lzf": _lzf_chunks,
+    ".snappy": _snappy_chunks,
+    ".zstd": _zstd_chunks,
+}
+
+
+class _ChunkReader(io.RawIOBase):
+    """ A raw binary stream over an iterator of bytes chunks. """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.pending = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.pending = memoryview(chunk)
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def close(self):
+        close = getattr(self.chunks, "close", None)
+        if close is not None:
+            close()
+        super().close()
+
+
+def codec_of(path):
+    """ Returns the compression codec extension of an event log file (e.g. ".lz4"), or None if it is plain. """
+    if path.endswith(IN_PROGRESS_SUFFIX):
+        path = path[:-len(IN_PROGRESS_SUFFIX)]
+    extension = os.path.splitext(path)[1]
+    return extension if extension in CODECS else None
+
+
+def is_rolling_log_dir(path):
+    return os.path.basename(os.path.normpath(path)).startswith(ROLLING_LOG_DIR_PREFIX) and os.path.isdir(path)
+
+
+def is_in_progress(path):
+    """ Whether Spark is still writing the event log (an ".inprogress" file, or a rolling log whose status says so). """
+    if os.path.isdir(path):
+        return any(name.startswith("appstatus_") and name.endswith(IN_PROGRESS_SUFFIX) for name in os.listdir(path))
+    return path.endswith(IN_PROGRESS_SUFFIX)
+
+
+def rolling_log_parts(path):
+    """ The event files of a rolling event log directory ("events_<N>_<app id>[.<codec>]"), in order. """
+    parts = []
+    for name in os.listdir(path):
+        match = _rolling_log_part_regex.match(name)
+        if match:
+            parts.append((int(match.group(1)), os.path.join(path, name)))
+    return [part for _, part in sorted(parts)]
+
+
+def _file_chunks(path):
+    codec = codec_of(path)
+    with open(path, "rb") as raw_file:
+        yield from (CODECS[codec] if codec else _plain_chunks)(raw_file)
+
+
+def _rolling_log_chunks(path):
+    for part in rolling_log_parts(path):
+        yield from _file_chunks(part)
+
+
+def open_event_log(path):
+    """
+    Opens an event log as a binary file object of its decompressed content. path is an event log file, plain or
+    compressed (the codec is told by its extension), or a rolling event log directory whose parts are read in order.
+    """
+    if os.path.isdir(path):
+        return io.BufferedReader(_ChunkReader(_rolling_log_chunks(path)), READ_SIZE)
+    if codec_of(path) is None:
+        return open(path, "rb")
+    return io.BufferedReader(_ChunkReader(_file_chunks(path)), READ_SIZE)
+
+
+def skip(event_log, size):
+    """ Skips the first size bytes of an event log opened by open_event_log. Returns the number of bytes skipped. """
+    if event_log.seekable():
+        return event_log.seek(min(size, event_log.seek(0, io.SEEK_END)))
+    skipped = 0
+    while skipped < size:
+        chunk = event_log.read(min(READ_SIZE, size - skipped))
+        if not chunk:
+            break
+        skipped += len(chunk)
+    return skipped
+
+
+def find_event_logs(directory):
+    """
+    Lists the event logs under directory: files, and rolling event log directories that each hold one application.
+    Hidden files and directories are skipped.
+    """
+    event_logs = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        event_logs.extend(os.path.join(root, d) for d in dirs if d.startswith(ROLLING_LOG_DIR_PREFIX))
+        dirs[:] = [d for d in dirs if not d.startswith(ROLLING_LOG_DIR_PREFIX)]
+        event_logs.extend(os.path.join(root, f) for f in files if not f.startswith("."))
+    return sorted(event_logs)
@@ -1,5 +1,7 @@
+import io
 from datetime import datetime
-from numpy import array
+
+from log_parser.stats import report_runtime_stats
 
 
 class Executor:
@@ -26,6 +28,7 @@ class Executor:
         self.start_timestamp = data["Timestamp"]
         self.total_cores = data["Executor Info"]["Total Cores"]
         self.tasks = []
+        self.runtime_stats = None  # RuntimeStats of the successful tasks, see stats.py
 
         self.remove_reason = None
         self.remove_timestamp = None
@@ -39,30 +42,32 @@ class Executor:
         self.remove_timestamp = data["Timestamp"]
 
     def calc_task_times(self):
-        runtimes = []
-        for t in self.tasks:
-            runtimes.append(int(t.finish_time or 0) - int(t.launch_time or 0))
-        runtimes = array(runtimes)
-        if len(runtimes) == 0:
+        if len(self.tasks) == 0:
             print("vv WARN: empty task runtimes for executor vv ")
             return 0, 0, 0, 0
-        return runtimes.mean(), runtimes.std(), runtimes.min(), runtimes.max()
+        return self.tasks.runtime_moments()
 
     def report(self, indent):
+        out = io.StringIO()
+        self.write_report(out, indent)
+        return out.getvalue()
+
+    def write_report(self, out, indent):
         pfx = "\t" * indent
-        s = pfx + "Executor {}\n".format(self.executor_id)
+        out.write(pfx + "Executor {}\n".format(self.executor_id))
         indent += 1
         pfx = "\t" * indent
-        s += pfx + "Host: " + self.host + "\n"
-        s += pfx + "Total cores: {}\n".format(self.total_cores)
-        s += pfx + "Started at: {}\n".format(datetime.fromtimestamp(self.start_timestamp / 1000))
+        out.write(pfx + "Host: " + self.host + "\n")
+        out.write(pfx + "Total cores: {}\n".format(self.total_cores))
+        out.write(pfx + "Started at: {}\n".format(datetime.fromtimestamp(self.start_timestamp / 1000)))
         if self.remove_timestamp is not None:
-            s += pfx + "Run time: {}ms\n".format(self.remove_timestamp - self.start_timestamp)
-        s += pfx + "Number of block managers: {}\n".format(len(self.block_managers))
-        s += pfx + "Number of executed tasks: {}\n".format(len(self.tasks))
+            out.write(pfx + "Run time: {}ms\n".format(self.remove_timestamp - self.start_timestamp))
+        out.write(pfx + "Number of block managers: {}\n".format(len(self.block_managers)))
+        out.write(pfx + "Number of executed tasks: {}\n".format(len(self.tasks)))
 
         avgrt, stdrt, minrt, maxrt = self.calc_task_times()
-        s += pfx + "Average task runtime: {} (stddev {})\n".format(avgrt, stdrt)
-        s += pfx + "Min/max task time: {} min, {} max\n".format(minrt, maxrt)
-        s += pfx + "Termination reason: {}\n".format(self.remove_reason)
-        return s
+        out.write(pfx + "Average task runtime: {} (stddev {})\n".format(avgrt, stdrt))
+        out.write(pfx + "Min/max task time: {} min, {} max\n".format(minrt, maxrt))
+        if self.runtime_stats is not None:
+            out.write(report_runtime_stats(self.runtime_stats, pfx))
+        out.write(pfx + "Termination reason: {}\n".format(self.remove_reason))
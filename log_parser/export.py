@@ -0,0 +1,303 @@
+import csv
+import json
+import os
+from collections import namedtuple
+from itertools import islice
+
+import numpy
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Rows written at once: tables are written batch by batch, never built whole in memory.
+BATCH_ROWS = 1 << 16
+
+FORMATS = ("parquet", "csv", "ndjson")
+
+Column = namedtuple("Column", ["name", "type"])  # type: "int", "float", "string" or "bool"
+
+# The tables of an application. Every row carries the app_id of its application, so that the files of many
+# applications can be queried as one table (e.g. "SELECT ... FROM 'export/tasks/*.parquet'" in DuckDB).
+# List-valued fields (parent ids) are written as comma separated strings, to stay flat in every format.
+_STATS_COLUMNS = [Column("executed_tasks", "int"), Column("successful_tasks", "int"), Column("mean_runtime", "float"),
+                  Column("p50_runtime", "float"), Column("p90_runtime", "float"), Column("p99_runtime", "float"),
+                  Column("max_runtime", "float"), Column("skew", "float")]
+
+TABLES = {
+    "applications": [
+        Column("app_id", "string"), Column("app_name", "string"), Column("spark_version", "string"),
+        Column("java_version", "string"), Column("start_time", "int"), Column("end_time", "int"),
+        Column("num_jobs", "int"), Column("num_stages", "int"), Column("num_tasks", "int"),
+        Column("num_executors", "int"), Column("log_path", "string"),
+    ],
+    "jobs": [
+        Column("app_id", "string"), Column("job_id", "int"), Column("submission_time", "int"),
+        Column("end_time", "int"), Column("result", "string"), Column("num_stages", "int"),
+    ],
+    "stages": [
+        Column("app_id", "string"), Column("job_id", "int"), Column("stage_id", "int"), Column("attempt_id", "int"),
+        Column("name", "string"), Column("num_tasks", "int"), Column("submission_time", "int"),
+        Column("completion_time", "int"), Column("parent_ids", "string"),
+    ] + _STATS_COLUMNS,
+    # One row per RDD of each stage, with its storage as listed with that stage.
+    "rdds": [
+        Column("app_id", "string"), Column("job_id", "int"), Column("stage_id", "int"), Column("rdd_id", "int"),
+        Column("name", "string"), Column("callsite", "string"), Column("num_partitions", "int"),
+        Column("replication", "int"), Column("memory_size", "int"), Column("disk_size", "int"),
+        Column("cached_partitions", "int"), Column("parent_ids", "string"),
+    ],
+    "executors": [
+        Column("app_id", "string"), Column("executor_id", "string"), Column("host", "string"),
+        Column("total_cores", "int"), Column("start_time", "int"), Column("remove_time", "int"),
+        Column("remove_reason", "string"),
+    ] + _STATS_COLUMNS,
+    "block_managers": [
+        Column("app_id", "string"), Column("executor_id", "string"), Column("maximum_memory", "int"),
+        Column("add_time", "int"),
+    ],
+    "sql_executions": [
+        Column("app_id", "string"), Column("execution_id", "int"), Column("description", "string"),
+        Column("start_time", "int"), Column("end_time", "int"), Column("wall_time", "int"),
+        Column("job_ids", "string"), Column("num_operators", "int"),
+    ],
+    # One row per SQL metric of each operator of the plans; operator is the index of the operator in depth first
+    # order, parent that of its parent operator (-1 for the root).
+    "sql_metrics": [
+        Column("app_id", "string"), Column("execution_id", "int"), Column("operator", "int"), Column("parent", "int"),
+        Column("operator_name", "string"), Column("metric", "string"), Column("metric_type", "string"),
+        Column("value", "int"),
+    ],
+    # Columns of TaskTable; those of "SparkListenerTaskEnd" are null for tasks that did not finish, and the metrics
+    # for tasks without metrics.
+    "tasks": [
+        Column("app_id", "string"), Column("task_id", "int"), Column("stage_id", "int"),
+        Column("stage_attempt_id", "int"), Column("executor_id", "string"), Column("launch_time", "int"),
+        Column("locality", "string"), Column("speculative", "bool"), Column("finish_time", "int"),
+        Column("getting_result_time", "int"), Column("index", "int"), Column("end_reason", "string"),
+        Column("failed", "bool"), Column("type", "string"), Column("disk_spilled_bytes", "int"),
+        Column("memory_spilled_bytes", "int"), Column("executor_deserialize_time", "int"),
+        Column("executor_run_time", "int"), Column("jvm_gc_time", "int"), Column("result_serialize_time", "int"),
+        Column("result_size", "int"),
+    ],
+}
+
+
+def default_format():
+    """ Parquet when pyarrow is installed, CSV otherwise. """
+    return "parquet" if pyarrow is not None else "csv"
+
+
+def _to_list(values):
+    """ A column of a batch as a list, None for nulls. Columns are lists, numpy arrays or numpy masked arrays. """
+    return values.tolist() if isinstance(values, numpy.ndarray) else values
+
+
+class CsvTableWriter:
+    extension = "csv"
+
+    def __init__(self, path, columns):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([c.name for c in columns])
+
+    def write_batch(self, batch):
+        self.writer.writerows(zip(*(_to_list(values) for values in batch)))
+
+    def close(self):
+        self.file.close()
+
+
+class NdjsonTableWriter:
+    extension = "ndjson"
+
+    def __init__(self, path, columns):
+        self.file = open(path, "w")
+        self.names = [c.name for c in columns]
+
+    def write_batch(self, batch):
+        names = self.names
+        self.file.writelines(json.dumps(dict(zip(names, row))) + "\n"
+                             for row in zip(*(_to_list(values) for values in batch)))
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetTableWriter:
+    extension = "parquet"
+
+    def __init__(self, path, columns):
+        types = {"int": pyarrow.int64(), "float": pyarrow.float64(), "string": pyarrow.string(),
+                 "bool": pyarrow.bool_()}
+        self.schema = pyarrow.schema([(c.name, types[c.type]) for c in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write_batch(self, batch):
+        arrays = []
+        for values, field in zip(batch, self.schema):
+            if isinstance(values, numpy.ma.MaskedArray):
+                array = pyarrow.array(numpy.ma.getdata(values), mask=numpy.ma.getmaskarray(values), type=field.type)
+            else:
+                array = pyarrow.array(values, type=field.type)
+            arrays.append(array)
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {"csv": CsvTableWriter, "ndjson": NdjsonTableWriter, "parquet": ParquetTableWriter}
+
+
+def get_writer_class(format=None):
+    """ format is one of FORMATS, or None for default_format(). """
+    if format is None:
+        format = default_format()
+    if format not in WRITERS:
+        raise ValueError(f"unknown export format '{format}', available: {', '.join(FORMATS)}")
+    if format == "parquet" and pyarrow is None:
+        raise ValueError("the parquet export format needs pyarrow (pip3 install pyarrow), use csv or ndjson")
+    return WRITERS[format]
+
+
+def _row_batches(rows):
+    """ Batches (lists of columns) of BATCH_ROWS rows at most of an iterable of rows. """
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, BATCH_ROWS))
+        if not chunk:
+            return
+        yield [list(column) for column in zip(*chunk)]
+
+
+def _stats_fields(tasks, runtime_stats):
+    executed = len(tasks)
+    if runtime_stats is None:
+        return [executed, 0, None, None, None, None, None, None]
+    return [executed, runtime_stats.count, float(runtime_stats.mean), float(runtime_stats.p50),
+            float(runtime_stats.p90), float(runtime_stats.p99), float(runtime_stats.max),
+            None if runtime_stats.skew is None else float(runtime_stats.skew)]
+
+
+def _ids(ids):
+    return ",".join(str(i) for i in ids)
+
+
+def application_rows(log_parser, app_id):
+    data = log_parser.parsed_data
+    yield [app_id, log_parser.get_app_name(), data.get("spark_version"), data.get("java_version"),
+           data.get("app_start_timestamp"), data.get("app_end_timestamp"), len(log_parser.jobs),
+           len(log_parser.stages), len(log_parser.tasks), len(log_parser.executors), log_parser.filename]
+
+
+def job_rows(log_parser, app_id):
+    for job in log_parser.jobs.values():
+        yield [app_id, job.job_id, job.submission_time, job.end_time, job.result, len(job.stages)]
+
+
+def stage_rows(log_parser, app_id):
+    for job in log_parser.jobs.values():
+        for stage in job.stages:
+            yield [app_id, job.job_id, stage.stage_id, stage.attempt_id, stage.name, stage.task_num,
+                   stage.submission_time, stage.completion_time, _ids(stage.parent_ids)] \
+                + _stats_fields(stage.tasks, stage.runtime_stats)
+
+
+def rdd_rows(log_parser, app_id):
+    for job in log_parser.jobs.values():
+        for stage in job.stages:
+            for rdd in stage.RDDs:
+                storage = stage.get_rdd_storage(rdd)
+                yield [app_id, job.job_id, stage.stage_id, rdd.rdd_id, rdd.name, rdd.callsite, rdd.partitions,
+                       rdd.replication, storage.memory_size, storage.disk_size, storage.cached_partitions,
+                       _ids(rdd.parent_ids)]
+
+
+def executor_rows(log_parser, app_id):
+    for executor in log_parser.executors.values():
+        yield [app_id, executor.executor_id, executor.host, executor.total_cores, executor.start_timestamp,
+               executor.remove_timestamp, executor.remove_reason] \
+            + _stats_fields(executor.tasks, executor.runtime_stats)
+
+
+def block_manager_rows(log_parser, app_id):
+    for bm in log_parser.block_managers:
+        yield [app_id, bm.executor_id, bm.maximum_memory, bm.add_timestamp]
+
+
+def sql_execution_rows(log_parser, app_id):
+    for execution in log_parser.sql_executions.values():
+        yield [app_id, execution.execution_id, execution.description, execution.start_time, execution.end_time,
+               execution.get_wall_time(), _ids(execution.job_ids), len(execution.plan)]
+
+
+def sql_metric_rows(log_parser, app_id):
+    for execution in log_parser.sql_executions.values():
+        plan = execution.plan
+        for accumulator_id, metric in plan.metrics.items():
+            yield [app_id, execution.execution_id, metric.node, plan.parents[metric.node], plan.names[metric.node],
+                   metric.name, metric.type, execution.metric_values.get(accumulator_id)]
+
+
+def task_batches(table, app_id):
+    """ Batches of the "tasks" table, sliced straight from the columns of the TaskTable. """
+    strings = numpy.array(table.strings, dtype=object)  # code -> string, None for code 0
+
+    def int_column(name, rows, nulls=None):
+        values = table.column(name)[rows]
+        return values if nulls is None else numpy.ma.masked_array(values, mask=nulls)
+
+    for start in range(0, len(table), BATCH_ROWS):
+        rows = slice(start, min(start + BATCH_ROWS, len(table)))
+        not_finished = table.column("finished")[rows] == 0
+        no_metrics = table.column("has_metrics")[rows] == 0
+        yield [
+            [app_id] * (rows.stop - rows.start),
+            int_column("task_id", rows), int_column("stage_id", rows), int_column("stage_attempt_id", rows),
+            strings[table.column("executor")[rows]], int_column("launch_time", rows),
+            strings[table.column("locality")[rows]], table.column("speculative")[rows] != 0,
+            int_column("finish_time", rows, not_finished), int_column("getting_result_time", rows, not_finished),
+            int_column("index", rows, not_finished), strings[table.column("end_reason")[rows]],
+            table.column("failed")[rows] != 0, strings[table.column("type")[rows]],
+        ] + [int_column(name, rows, no_metrics)
+             for name in ("disk_spilled_bytes", "memory_spilled_bytes", "executor_deserialize_time",
+                          "executor_run_time", "jvm_gc_time", "result_serialize_time", "result_size")]
+
+
+def export_application(log_parser, directory, name, format=None):
+    """
+    Writes the parsed application of log_parser as flat tables (see TABLES), one file per table in
+    directory/<table>/<name>.<format>, e.g. export/tasks/<name>.parquet, and returns the paths written. format is
+    one of FORMATS, by default Parquet when pyarrow is installed and CSV otherwise. In streaming mode, tasks are not
+    kept and the "tasks" table is not written.
+    """
+    writer_class = get_writer_class(format)
+    app_id = log_parser.get_app_id()
+    batches = {
+        "applications": _row_batches(application_rows(log_parser, app_id)),
+        "jobs": _row_batches(job_rows(log_parser, app_id)),
+        "stages": _row_batches(stage_rows(log_parser, app_id)),
+        "rdds": _row_batches(rdd_rows(log_parser, app_id)),
+        "executors": _row_batches(executor_rows(log_parser, app_id)),
+        "block_managers": _row_batches(block_manager_rows(log_parser, app_id)),
+        "sql_executions": _row_batches(sql_execution_rows(log_parser, app_id)),
+        "sql_metrics": _row_batches(sql_metric_rows(log_parser, app_id)),
+    }
+    if not log_parser.streaming:
+        batches["tasks"] = task_batches(log_parser.tasks, app_id)
+
+    paths = []
+    for table, table_batches in batches.items():
+        os.makedirs(os.path.join(directory, table), exist_ok=True)
+        path = os.path.join(directory, table, f"{name}.{writer_class.extension}")
+        writer = writer_class(path, TABLES[table])
+        try:
+            for batch in table_batches:
+                writer.write_batch(batch)
+        finally:
+            writer.close()
+        paths.append(path)
+    return paths
@@ -1,8 +1,24 @@
+import io
+import sys
 from datetime import datetime
 
+from log_parser.sql import SQL_EXECUTION_ID_PROPERTY
+from log_parser.stats import report_runtime_stats
+
+# Task metrics summed over a stage that are read from the accumulables of "SparkListenerStageCompleted"
+STAGE_ACCUMULABLES = {
+    "internal.metrics.executorRunTime": "executor_run_time",
+    "internal.metrics.jvmGCTime": "jvm_gc_time",
+    "internal.metrics.memoryBytesSpilled": "memory_spilled_bytes",
+    "internal.metrics.diskBytesSpilled": "disk_spilled_bytes",
+    "internal.metrics.shuffle.read.remoteBytesRead": "shuffle_remote_bytes_read",
+    "internal.metrics.shuffle.read.localBytesRead": "shuffle_local_bytes_read",
+    "internal.metrics.shuffle.write.bytesWritten": "shuffle_bytes_written",
+}
+
 
 class Job:
-    def __init__(self, start_data):
+    def __init__(self, start_data, rdds=None):
         # you can find a line with event_type = "SparkListenerJobStart" and copy it into https://jsonformatter.org
         # see the hierarchical structure
         """ example of "SparkListenerJobStart"
@@ -23,9 +39,12 @@ class Job:
         self.stages = []
 
         self.submission_time = start_data["Submission Time"]
+        # The SQL execution the job runs for, if any (see sql.py)
+        execution_id = (start_data.get("Properties") or {}).get(SQL_EXECUTION_ID_PROPERTY)
+        self.sql_execution_id = int(execution_id) if execution_id is not None else None
 
         for stage_data in start_data["Stage Infos"]:
-            self.stages.append(Stage(stage_data))   # class Stage
+            self.stages.append(Stage(stage_data, rdds))   # class Stage
 
         self.result = None
         self.end_time = None
@@ -48,35 +67,54 @@ class Job:
         self.end_time = data["Completion Time"]
 
     def report(self, indent):
+        out = io.StringIO()
+        self.write_report(out, indent)
+        return out.getvalue()
+
+    def write_report(self, out, indent):
         pfx = "\t" * indent
         # indent means 'tab'
-        s = pfx + "Job {}\n".format(self.job_id)
+        out.write(pfx + "Job {}\n".format(self.job_id))
         indent += 1
         pfx = "\t" * indent
-        s += pfx + "Submission time: {}\n".format(datetime.fromtimestamp(self.submission_time/1000))
-        s += pfx + "End time: {}\n".format(datetime.fromtimestamp(self.end_time / 1000))
-        s += pfx + "Run time: {}ms \n".format(int(self.end_time or 0) - int(self.submission_time))
-        s += pfx + "Result: {}\n".format(self.result)
-        s += pfx + "Number of stages: {}\n".format(len(self.stages))
+        out.write(pfx + "Submission time: {}\n".format(datetime.fromtimestamp(self.submission_time/1000)))
+        out.write(pfx + "End time: {}\n".format(
+            datetime.fromtimestamp(self.end_time / 1000) if self.end_time else None))
+        out.write(pfx + "Run time: {}ms \n".format(int(self.end_time or 0) - int(self.submission_time)))
+        out.write(pfx + "Result: {}\n".format(self.result))
+        out.write(pfx + "Number of stages: {}\n".format(len(self.stages)))
         for stage in self.stages:
-            s += stage.report(indent)
+            stage.write_report(out, indent)
             # self.stages.append(Stage(stage_data))
-        return s
 
 
 class Stage:
-    def __init__(self, stage_data):
+    def __init__(self, stage_data, rdds=None):
+        """ rdds is the RDD registry of the application (RDD id -> RDD), shared by all its stages. """
         self.stage_id = stage_data["Stage ID"]
+        self.attempt_id = stage_data["Stage Attempt ID"]
         self.name = stage_data["Stage Name"]
         self.parent_ids = stage_data["Parent IDs"] if "Parent IDs" in stage_data else []
 
         self.details = stage_data["Details"]
         self.task_num = stage_data["Number of Tasks"]
         self.RDDs = []
+        self.rdd_storage = {}  # RDD id -> storage of the RDD in this stage, where it differs from RDD.storage
         self.tasks = []
+        self.runtime_stats = None  # RuntimeStats of the successful tasks, see stats.py
+        self.metrics = {}  # task metrics summed over the stage (see STAGE_ACCUMULABLES), once it completed
 
+        if rdds is None:
+            rdds = {}
         for rdd_data in stage_data["RDD Info"]:
-            self.RDDs.append(RDD(rdd_data))
+            rdd = rdds.get(rdd_data["RDD ID"])
+            if rdd is None:
+                rdd = rdds[rdd_data["RDD ID"]] = RDD(rdd_data)
+            else:
+                storage = RDDStorage.of(rdd_data)
+                if storage != rdd.storage:
+                    self.rdd_storage[rdd.rdd_id] = storage
+            self.RDDs.append(rdd)
 
         self.completion_time = None
         self.submission_time = None
@@ -84,35 +122,66 @@ class Stage:
     def complete(self, data):
         self.completion_time = data["Stage Info"]["Completion Time"]
         self.submission_time = data["Stage Info"]["Submission Time"]
+        for accumulable in data["Stage Info"].get("Accumulables", ()):
+            name = STAGE_ACCUMULABLES.get(accumulable.get("Name"))
+            if name is not None:
+                self.metrics[name] = accumulable["Value"]
 
     def report(self, indent):
+        out = io.StringIO()
+        self.write_report(out, indent)
+        return out.getvalue()
+
+    def write_report(self, out, indent):
         pfx = "\t" * indent
-        s = pfx + "Stage '{}' (id={})\n".format(self.name, self.stage_id)
+        out.write(pfx + "Stage '{}' (id={})\n".format(self.name, self.stage_id))
         indent += 1
         pfx = "\t" * indent
-        s += pfx + "Number of tasks: {}\n".format(self.task_num)
-        s += pfx + "Number of executed tasks: {}\n".format(len(self.tasks))
+        out.write(pfx + "Number of tasks: {}\n".format(self.task_num))
+        out.write(pfx + "Number of executed tasks: {}\n".format(len(self.tasks)))
         if len(self.tasks) > 0:
-            s += pfx + "Tasks average completion times: {}ms\n".format(self.get_tasks_average_completion_times())
-        s += pfx + "Completion time: {}ms\n".format(int(self.completion_time or 0) - int(self.submission_time or 0))
+            out.write(pfx + "Tasks average completion times: {}ms\n".format(
+                self.get_tasks_average_completion_times()))
+        if self.runtime_stats is not None:
+            out.write(report_runtime_stats(self.runtime_stats, pfx))
+        out.write(pfx + "Completion time: {}ms\n".format(self.get_completion_time()))
         for rdd in self.RDDs:
-            s += rdd.report(indent)
-        s += pfx + "Parent IDs: {}\n".format(self.parent_ids)
-
-        return s
+            rdd.write_report(out, indent, self.get_rdd_storage(rdd))
+        out.write(pfx + "Parent IDs: {}\n".format(self.parent_ids))
 
     def get_tasks_average_completion_times(self):
         if len(self.tasks) > 0:
-            sum_of_task_execution_times = float(0)
-            for t in self.tasks:
-                sum_of_task_execution_times += int(t.finish_time or 0) - int(t.launch_time or 0)
-
-            return sum_of_task_execution_times / len(self.tasks)
+            return self.tasks.mean_runtime()
         return 0
 
     def get_completion_time(self):
         return int(self.completion_time or 0) - int(self.submission_time or 0)
 
+    def get_rdd_storage(self, rdd):
+        """ The storage of rdd (one of self.RDDs) as listed with this stage. """
+        return self.rdd_storage.get(rdd.rdd_id, rdd.storage)
+
+
+class RDDStorage(tuple):
+    """ Storage fields of an RDD, which change from stage to stage as partitions get cached or evicted. """
+
+    __slots__ = ()
+
+    def __new__(cls, memory_size, disk_size, cached_partitions):
+        return tuple.__new__(cls, (memory_size, disk_size, cached_partitions))
+
+    def __getnewargs__(self):
+        return tuple(self)  # for pickle, which would call __new__ without arguments
+
+    @classmethod
+    def of(cls, rdd_data):
+        return cls(rdd_data["Memory Size"], rdd_data["Disk Size"], rdd_data.get("Number of Cached Partitions", 0))
+
+    memory_size = property(lambda self: self[0])
+    disk_size = property(lambda self: self[1])
+    cached_partitions = property(lambda self: self[2])
+
+
 class RDD:
     """
     "RDD Info": [
@@ -135,126 +204,99 @@ class RDD:
           "Memory Size": 0,
           "Disk Size": 0
         }, ...
+
+    An RDD is listed by every stage that computes it or depends on it: the LogParser keeps one RDD object per RDD id,
+    shared by these stages. Its storage is the one it was first listed with, see Stage.get_rdd_storage.
     """
 
     def __init__(self, rdd_data):
         self.rdd_id = rdd_data["RDD ID"]
-        self.name = rdd_data["Name"]
+        self.name = sys.intern(rdd_data["Name"])
+        self.callsite = rdd_data.get("Callsite")
         self.parent_ids = rdd_data["Parent IDs"] if "Parent IDs" in rdd_data else []
 
-        self.disk_size = rdd_data["Disk Size"]
-        self.memory_size = rdd_data["Memory Size"]
+        self.storage = RDDStorage.of(rdd_data)
         self.partitions = rdd_data["Number of Partitions"]
         self.replication = rdd_data["Storage Level"]["Replication"]
 
-    def report(self, indent):
+    @property
+    def memory_size(self):
+        return self.storage.memory_size
+
+    @property
+    def disk_size(self):
+        return self.storage.disk_size
+
+    def report(self, indent, storage=None):
+        out = io.StringIO()
+        self.write_report(out, indent, storage)
+        return out.getvalue()
+
+    def write_report(self, out, indent, storage=None):
+        if storage is None:
+            storage = self.storage
         pfx = "\t" * indent
-        s = pfx + "RDD '{}' (id={})\n".format(self.name, self.rdd_id)
+        out.write(pfx + "RDD '{}' (id={})\n".format(self.name, self.rdd_id))
         indent += 1
         pfx = "\t" * indent
-        s += pfx + "Size: {}B memory {}B disk\n".format(self.memory_size, self.disk_size)
-        s += pfx + "Partitions: {}\n".format(self.partitions)
-        s += pfx + "Replication: {}\n".format(self.replication)
-        s += pfx + "Parent IDs: {}\n".format(self.parent_ids)
-        return s
+        out.write(pfx + "Size: {}B memory {}B disk\n".format(storage.memory_size, storage.disk_size))
+        out.write(pfx + "Partitions: {}\n".format(self.partitions))
+        out.write(pfx + "Replication: {}\n".format(self.replication))
+        out.write(pfx + "Parent IDs: {}\n".format(self.parent_ids))
+
+
+def _int_column(name, flag=None):
+    def get(self):
+        if flag is not None and not getattr(self.table, flag)[self.row]:
+            return None
+        return getattr(self.table, name)[self.row]
+    return property(get)
+
+
+def _string_column(name):
+    return property(lambda self: self.table.strings[getattr(self.table, name)[self.row]])
+
+
+def _flag_column(name):
+    return property(lambda self: bool(getattr(self.table, name)[self.row]))
 
 
 class Task:
     """
-    {
-      "Event": "SparkListenerTaskStart",
-      "Stage ID": 0,
-      "Stage Attempt ID": 0,
-      "Task Info": {
-        "Task ID": 1,
-        "Index": 1,
-        "Attempt": 0,
-        "Launch Time": 1499523032866,
-        "Executor ID": "7",
-        "Host": "172.31.47.174",
-        "Locality": "PROCESS_LOCAL",
-        "Speculative": false,
-        "Getting Result Time": 0,
-        "Finish Time": 0,
-        "Failed": false,
-        "Accumulables": []
-        }
-    }
+    One row of a TaskTable (see task_table.py), with the attributes of a task:
+    values of "SparkListenerTaskStart", and of "SparkListenerTaskEnd" once the task has finished (None before).
     """
-    def __init__(self, data):
-        self.task_id = data["Task Info"]["Task ID"]
-        self.stage_id = data["Stage ID"]
-        self.executor_id = data["Task Info"]["Executor ID"]
-
-        self.launch_time = data["Task Info"]["Launch Time"]
-        self.locality = data["Task Info"]["Locality"]
-        self.speculative = data["Task Info"]["Speculative"]
-
-        self.end_reason = None
-        self.failed = False
-        self.finish_time = None
-        # def calc_task_times(self):
-        self.getting_result_time = None
-        self.index = None
-        self.type = None
-
-        self.has_metrics = False
-        self.disk_spilled_bytes = None
-        self.memory_spilled_bytes = None
-        self.executor_deserialize_time = None
-        self.executor_run_time = None
-        self.jvm_gc_time = None
-        self.result_serialize_time = None
-        self.result_size = None
-
-    def finish(self, data):
-        """
-        {
-          "Event": "SparkListenerTaskEnd",
-          "Stage ID": 0,
-          "Stage Attempt ID": 0,
-          "Task Type": "ResultTask",
-          "Task End Reason": {
-            "Reason": "Success"
-          },
-          "Task Info": {
-            "Task ID": 0,
-            "Index": 0,
-            "Attempt": 0,
-            "Launch Time": 1499523032831,
-            "Executor ID": "6",
-            "Host": "172.31.47.174",
-            "Locality": "PROCESS_LOCAL",
-            "Speculative": false,
-            "Getting Result Time": 0,
-            "Finish Time": 1499523035339,
-            "Failed": false,
-            "Accumulables": [
-              {
-                "ID": 0,
-                "Name": "internal.metrics.executorDeserializeTime",
-                "Update": 1945,
-                "Value": 1945,
-                "Internal": true,
-                "Count Failed Values": true
-              },...
-        """
-        self.end_reason = data["Task End Reason"]["Reason"]
-        self.failed = data["Task Info"]["Failed"]
-        self.finish_time = data["Task Info"]["Finish Time"]
-        self.getting_result_time = data["Task Info"]["Getting Result Time"]
-        self.index = data["Task Info"]["Index"]
-        self.type = data["Task Type"]  # "Task Type": "ResultTask"
-
-        if "Task Metrics" in data:
-            self.has_metrics = True
-            self.disk_spilled_bytes = data["Task Metrics"]["Disk Bytes Spilled"]
-            self.memory_spilled_bytes = data["Task Metrics"]["Memory Bytes Spilled"]
-            self.executor_deserialize_time = data["Task Metrics"]["Executor Deserialize Time"]
-            self.executor_run_time = data["Task Metrics"]["Executor Run Time"]
-            self.jvm_gc_time = data["Task Metrics"]["JVM GC Time"]
-            self.result_serialize_time = data["Task Metrics"]["Result Serialization Time"]
-            self.result_size = data["Task Metrics"]["Result Size"]
+
+    __slots__ = ("table", "row")
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    task_id = _int_column("task_id")
+    stage_id = _int_column("stage_id")
+    stage_attempt_id = _int_column("stage_attempt_id")
+    executor_id = _string_column("executor")
+
+    launch_time = _int_column("launch_time")
+    locality = _string_column("locality")
+    speculative = _flag_column("speculative")
+
+    end_reason = _string_column("end_reason")
+    failed = _flag_column("failed")
+    finish_time = _int_column("finish_time", "finished")
+    getting_result_time = _int_column("getting_result_time", "finished")
+    index = _int_column("index", "finished")
+    type = _string_column("type")
+
+    has_metrics = _flag_column("has_metrics")
+    disk_spilled_bytes = _int_column("disk_spilled_bytes", "has_metrics")
+    memory_spilled_bytes = _int_column("memory_spilled_bytes", "has_metrics")
+    executor_deserialize_time = _int_column("executor_deserialize_time", "has_metrics")
+    executor_run_time = _int_column("executor_run_time", "has_metrics")
+    jvm_gc_time = _int_column("jvm_gc_time", "has_metrics")
+    result_serialize_time = _int_column("result_serialize_time", "has_metrics")
+    result_size = _int_column("result_size", "has_metrics")
 
     def report(self, indent):
         pfx = "\t" * indent
@@ -264,8 +306,6 @@ class Task:
         s += pfx + "Started at: {}\n".format(datetime.fromtimestamp(self.launch_time / 1000))
         s += pfx + "Ended at: {}\n".format(datetime.fromtimestamp(self.finish_time / 1000) if self.finish_time else None)
         s += pfx + "Run time: {}ms\n".format(int(self.finish_time or 0) - int(self.launch_time or 0))
-        assert self.finish_time is not None
-        assert self.launch_time is not None
         s += pfx + "End reason: {}\n".format(self.end_reason)
         s += pfx + "Locality: {}\n".format(self.locality)
         s += pfx + "Speculative: {}\n".format(self.speculative)
@@ -0,0 +1,95 @@
+import os
+
+from log_parser.decoder import event_type_of
+from log_parser.decoder import get_decoder
+from log_parser.event_log import codec_of
+from log_parser.event_log import is_in_progress
+from log_parser.event_log import open_event_log
+from log_parser.event_log import rolling_log_parts
+
+TAIL_SIZE = 1 << 16
+
+HEADER_EVENT_TYPES = {"SparkListenerLogStart", "SparkListenerEnvironmentUpdate", "SparkListenerApplicationStart"}
+
+
+class ApplicationMetadata:
+    """ What an event log tells about its application in its first events, and in its last one once it ended. """
+
+    def __init__(self, path):
+        self.path = path
+        self.app_name = None
+        self.app_id = None
+        self.spark_version = None
+        self.start_timestamp = None
+        self.end_timestamp = None
+        self.in_progress = is_in_progress(path)
+
+    def get_duration(self):
+        if self.start_timestamp is None or self.end_timestamp is None:
+            return None
+        return self.end_timestamp - self.start_timestamp
+
+    def add_event(self, json_data):
+        event_type = json_data["Event"]
+        if event_type == "SparkListenerLogStart":
+            self.spark_version = json_data["Spark Version"]
+        elif event_type == "SparkListenerEnvironmentUpdate":
+            self.app_name = json_data["Spark Properties"]["spark.app.name"]
+            self.app_id = json_data["Spark Properties"]["spark.app.id"]
+        elif event_type == "SparkListenerApplicationStart":
+            self.start_timestamp = json_data["Timestamp"]
+            # Same as in the environment, for logs that lack it
+            self.app_name = self.app_name or json_data.get("App Name")
+            self.app_id = self.app_id or json_data.get("App ID")
+        elif event_type == "SparkListenerApplicationEnd":
+            self.end_timestamp = json_data["Timestamp"]
+
+
+def _scan_tail(metadata, path, decoder):
+    if os.path.isdir(path):
+        # The last part of a rolling log is bounded in size (spark.eventLog.rolling.maxFileSize): it can be streamed.
+        parts = rolling_log_parts(path)
+        if not parts:
+            return
+        path = parts[-1]
+        if codec_of(path) is not None:
+            with open_event_log(path) as log_file:
+                for line in log_file:
+                    if event_type_of(line) == "SparkListenerApplicationEnd":
+                        metadata.add_event(decoder.loads(line))
+            return
+    elif codec_of(path) is not None:
+        return  # the end of a compressed file cannot be read without decompressing all of it
+
+    tail_start = max(0, os.path.getsize(path) - TAIL_SIZE)
+    with open(path, "rb") as log_file:
+        log_file.seek(tail_start)
+        lines = log_file.read().split(b"\n")
+    if tail_start > 0:
+        lines = lines[1:]  # cut, the end event is the last (or almost) line anyway
+    for line in reversed(lines):
+        if event_type_of(line) == "SparkListenerApplicationEnd":
+            metadata.add_event(decoder.loads(line))
+            return
+
+
+def scan_metadata(path, decoder=None):
+    """
+    Returns the ApplicationMetadata of an event log, reading only its header (up to the application start event)
+    and its end for the application end: the last bytes of a plain file, the last part of a rolling log.
+    The end time of a compressed single file log is left unknown.
+    """
+    decoder = get_decoder(decoder)
+    metadata = ApplicationMetadata(path)
+    with open_event_log(path) as log_file:
+        for line in log_file:
+            event_type = event_type_of(line)
+            if event_type is not None and event_type not in HEADER_EVENT_TYPES:
+                continue
+            json_data = decoder.loads(line)
+            metadata.add_event(json_data)
+            if json_data["Event"] == "SparkListenerApplicationStart":
+                break  # the header is over
+    if not metadata.in_progress:
+        _scan_tail(metadata, path, decoder)
+    return metadata
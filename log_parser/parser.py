@@ -1,32 +1,96 @@
-import json
+import io
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from numpy import array
-from graphviz import Digraph
+import numpy
 
+from log_parser.aggregate import StreamingTasks
+from log_parser.aggregate import TaskAggregate
 from log_parser.block_manager import BlockManager
+from log_parser.critical_path import critical_paths
+from log_parser.critical_path import write_critical_paths_report
+from log_parser.dag import rdds_dag
+from log_parser.dag import save_dag
+from log_parser.dag import stages_dag
+from log_parser.decoder import event_type_of
+from log_parser.decoder import get_decoder
+from log_parser.event_log import open_event_log
+from log_parser.event_log import skip
 from log_parser.executor import Executor
 from log_parser.job import Job
-from log_parser.job import Task
-
-
-def get_json(line):
-    # Need to first strip the trailing newline, and then escape newlines (which can appear
-    # in the middle of some of the JSON) so that JSON library doesn't barf.
-    return json.loads(line.strip("\n").replace("\n", "\\n"))
+from log_parser.metadata import scan_metadata
+from log_parser.profiler import peak_rss_mb
+from log_parser.quality import BLOCK_MANAGER_OF_UNKNOWN_EXECUTOR
+from log_parser.quality import DUPLICATE_JOB
+from log_parser.quality import JOB_END_WITHOUT_START
+from log_parser.quality import LINK_CATEGORIES
+from log_parser.quality import TASKS_OF_UNKNOWN_EXECUTOR
+from log_parser.quality import UNKNOWN_EXECUTOR_REMOVED
+from log_parser.quality import DataQuality
+from log_parser.quality import OrphanEventError
+from log_parser.shard import TASK_END
+from log_parser.shard import TASK_START
+from log_parser.shard import can_shard
+from log_parser.shard import merge_shards
+from log_parser.shard import parse_shard
+from log_parser.shard import shard_boundaries
+from log_parser.sql import SQL_EVENT_PACKAGE
+from log_parser.sql import SQL_EVENT_TYPES
+from log_parser.sql import SQLExecution
+from log_parser.sql import write_sql_report
+from log_parser.state import dump_state
+from log_parser.state import load_state
+from log_parser.stats import group_runtime_stats
+from log_parser.task_table import TaskList
+from log_parser.task_table import TaskTable
+from log_parser.utilization import cluster_utilization
+from log_parser.utilization import write_utilization_report
+
+HEAD_SIZE = 4096
+
+
+def get_json(line, decoder=None):
+    # Lines are split on "\n" only (see Decoder.lines), so a line holds a single JSON document and the trailing
+    # newline is just whitespace for the decoder: it gets the line as read, without copies.
+    return get_decoder(decoder).loads(line)
 
 
 class LogParser:
-    def __init__(self, filename, is_logging_enable=False):
+    def __init__(self, filename, is_logging_enable=False, decoder=None, streaming=False, lenient=False):
+        """
+        In streaming mode, tasks are not kept: each one is folded into running aggregates of its stage, its executor
+        and the application when it ends (see aggregate.py), so memory does not grow with the number of tasks. The
+        per-task parts of the analysis (task list, stragglers, utilization timeline) are then not available.
+
+        In lenient mode, lines that cannot be decoded and events that cannot be handled (a task end whose start was
+        lost, a field missing, ...) are counted in `quality` (see quality.py) and skipped instead of ending the parse,
+        so that the log of a crashed application still gives a report of what it holds.
+        """
         self.filename = filename
+        self.decoder = decoder  # name of the JSON decoder (see decoder.py), None for the fastest one installed
+        self.streaming = streaming
+        self.lenient = lenient
+        self.quality = DataQuality()
         self.parsed_data = {}  # empty dicts.
         self.block_managers = []  # empty lists.
 
         self.executors = {}
         self.jobs = {}
-        self.tasks = {}
+        self.stages = {}  # (stage id, stage attempt id) -> stages of that attempt, one per job that lists it
+        self.rdds = {}  # RDD id -> RDD, shared by all the stages that list the RDD
+        self.sql_executions = {}  # execution id -> SQLExecution
+        self.sql_accumulators = {}  # accumulator id -> id of the SQL execution whose plan has that metric
+        self.critical_paths = {}  # job id -> CriticalPath, computed by finalize()
+        self.tasks = StreamingTasks() if streaming else TaskTable()
+        self.unsupported_event_types = set()
+        self.listeners = self.builtin_listeners()  # event type -> functions called with each event of that type
 
         self.is_logging_enable = is_logging_enable
 
+        self.offset = 0  # bytes of the log processed by process_incremental
+        self.head = b""  # first bytes of the log, to tell whether it is still the same log
+
     def do_SparkListenerLogStart(self, data):
         self.parsed_data["spark_version"] = data["Spark Version"]
         # parsed_data is a empty dict.
@@ -46,6 +110,7 @@ class LogParser:
 
     def do_SparkListenerApplicationStart(self, data):
         self.parsed_data["app_start_timestamp"] = data["Timestamp"]
+        self.parsed_data["app_attempt_id"] = data.get("App Attempt ID")  # only in cluster mode on YARN
 
     def do_SparkListenerApplicationEnd(self, data):
         self.parsed_data["app_end_timestamp"] = data["Timestamp"]
@@ -54,211 +119,538 @@ class LogParser:
         job_id = data["Job ID"]
         if job_id in self.jobs:
             print("ERROR: Duplicate job ID!")
+            self.quality.record(DUPLICATE_JOB, "job {}".format(job_id))
             return
-        job = Job(data)  # that class Job
+        job = Job(data, self.rdds)  # that class Job
         # job = return s
         self.jobs[job_id] = job  # record into the `dict`
+        for s in job.stages:
+            self.stages.setdefault((s.stage_id, s.attempt_id), []).append(s)
 
     def do_SparkListenerStageSubmitted(self, data):
-        pass
+        stage_id = data["Stage Info"]["Stage ID"]
+        attempt_id = data["Stage Info"]["Stage Attempt ID"]
+        if (stage_id, attempt_id) in self.stages:
+            return
+        # A retried attempt is not listed in the "Stage Infos" of its job, it shares the stages of the previous attempt.
+        for previous_attempt_id in range(attempt_id - 1, -1, -1):
+            if (stage_id, previous_attempt_id) in self.stages:
+                self.stages[(stage_id, attempt_id)] = self.stages[(stage_id, previous_attempt_id)]
+                return
 
     def do_SparkListenerExecutorAdded(self, data):
         exec_id = data["Executor ID"]
         self.executors[exec_id] = Executor(data)
 
     def do_SparkListenerTaskStart(self, data):
-        task_id = data["Task Info"]["Task ID"]
-        self.tasks[task_id] = Task(data)
+        self.tasks.start(data)
 
     def do_SparkListenerTaskEnd(self, data):
-        task_id = data["Task Info"]["Task ID"]
-        self.tasks[task_id].finish(data)
+        self.tasks.finish(data)
 
     def do_SparkListenerExecutorRemoved(self, data):
         exec_id = data["Executor ID"]
+        if exec_id not in self.executors:
+            raise OrphanEventError(UNKNOWN_EXECUTOR_REMOVED, exec_id)
         self.executors[exec_id].remove(data)
 
     def do_SparkListenerBlockManagerRemoved(self, data):
         pass
 
     def do_SparkListenerStageCompleted(self, data):
-        stage_id = data["Stage Info"]["Stage ID"]
-        for j in self.jobs.values():
-            for s in j.stages:  # class Stage in job.py
-                if s.stage_id == stage_id:
-                    s.complete(data)
+        key = (data["Stage Info"]["Stage ID"], data["Stage Info"]["Stage Attempt ID"])
+        for s in self.stages.get(key, ()):  # class Stage in job.py
+            s.complete(data)
+        if self.sql_accumulators:
+            # The values of the accumulators, summed over the tasks so far: SQL metrics are among them
+            for accumulable in data["Stage Info"].get("Accumulables", ()):
+                self.set_sql_metric(accumulable["ID"], accumulable.get("Value"))
+
+    def do_SparkListenerSQLExecutionStart(self, data):
+        execution = SQLExecution(data)
+        self.sql_executions[execution.execution_id] = execution
+        for accumulator_id in execution.plan.metrics:
+            self.sql_accumulators[accumulator_id] = execution.execution_id
+
+    def do_SparkListenerSQLAdaptiveExecutionUpdate(self, data):
+        execution = self.sql_executions.get(data["executionId"])
+        if execution is None:
+            return
+        execution.update_plan(data)
+        for accumulator_id in execution.plan.metrics:
+            self.sql_accumulators[accumulator_id] = execution.execution_id
+
+    def do_SparkListenerSQLExecutionEnd(self, data):
+        execution = self.sql_executions.get(data["executionId"])
+        if execution is not None:
+            execution.complete(data)
+
+    def do_SparkListenerDriverAccumUpdates(self, data):
+        """ SQL metrics updated on the driver: {"executionId": 0, "accumUpdates": [[accumulator id, value], ...]} """
+        for accumulator_id, value in data["accumUpdates"]:
+            self.set_sql_metric(accumulator_id, value)
+
+    def set_sql_metric(self, accumulator_id, value):
+        execution_id = self.sql_accumulators.get(accumulator_id)
+        if execution_id is None:
+            return  # not an SQL metric
+        try:
+            self.sql_executions[execution_id].metric_values[accumulator_id] = int(value)
+        except (TypeError, ValueError):
+            pass  # not a number
 
     def do_SparkListenerJobEnd(self, data):
         job_id = data["Job ID"]
+        if job_id not in self.jobs:
+            raise OrphanEventError(JOB_END_WITHOUT_START, job_id)
         self.jobs[job_id].complete(data)
 
     def process_name_only(self):
-        with open(self.filename, "r") as log_file:
+        """ Reads only the header of the log (see metadata.py) and returns the application name, if it has one. """
+        metadata = scan_metadata(self.filename, self.decoder)
+        if metadata.app_name is not None:
+            self.parsed_data["app_name"] = metadata.app_name
+        return metadata.app_name
+
+    def builtin_listeners(self):
+        """ The do_<event type> methods, as listeners of their event type. """
+        listeners = {name[len("do_"):]: [getattr(self, name)] for name in dir(type(self)) if name.startswith("do_")}
+        for event_type in SQL_EVENT_TYPES:
+            listeners[SQL_EVENT_PACKAGE + event_type] = listeners.pop(event_type)
+        return listeners
+
+    def subscribe(self, event_type, listener):
+        """
+        Calls listener(json_data) for every event of event_type (e.g. "SparkListenerBlockUpdated"), after the
+        listeners subscribed before it, such as the do_* method of that type. Events that have no listener are not
+        even decoded. Listeners are not saved with the parser state: pass them to resume() again.
+        """
+        self.listeners.setdefault(event_type, []).append(listener)
+
+    def subscribe_all(self, listeners):
+        """ subscribe() each listener of listeners, a dict event type -> list of listeners. """
+        for event_type, functions in listeners.items():
+            for listener in functions:
+                self.subscribe(event_type, listener)
+
+    def process_event(self, json_data):
+        try:
+            event_type = json_data["Event"]
+            listeners = self.listeners.get(event_type)
+            if listeners is None:
+                # print("WARNING: unknown event type: " + event_type)
+                self.unsupported_event_types.add(event_type)
+                return
+            for listener in listeners:
+                listener(json_data)
+        except Exception as e:
+            if not self.lenient:
+                raise
+            self.quality.record_event_error(json_data, e)
+
+    def decode_line(self, decoder, line):
+        """ The decoded line, or None for a line that cannot be decoded in lenient mode (it is counted). """
+        try:
+            return decoder.loads(line)
+        except ValueError as e:
+            if not self.lenient:
+                raise
+            self.quality.record_bad_line(line, e)
+            return None
+
+    def process(self, profile=None):
+        """ Processes the whole log. With a ParseProfile (see profiler.py), where the time goes is recorded in it. """
+        if profile is not None:
+            return self._process_profiled(profile)
+        decoder = get_decoder(self.decoder)
+        # The event type is read from the raw line first: events without listeners are not decoded. It is compared
+        # as it is in the line (bytes or str), to save decoding it for every event.
+        prefix = decoder.event_prefix()
+        quote = prefix[-1:]
+        subscribed = {(t.encode() if decoder.binary else t) for t in self.listeners}
+        with decoder.lines(open_event_log(self.filename)) as log_file:
             for line in log_file:
-                json_data = get_json(line)
-                event_type = json_data["Event"]
-
-                if event_type == "SparkListenerEnvironmentUpdate":
-                    self.do_SparkListenerEnvironmentUpdate(json_data)
-
-    def process(self):
-        with open(self.filename, "r") as log_file:
-            unsupported_event_types = set()
+                if line.startswith(prefix):
+                    end = line.find(quote, len(prefix))
+                    if end > 0 and line[len(prefix):end] not in subscribed:
+                        self.unsupported_event_types.add(event_type_of(line))
+                        continue
+                try:
+                    json_data = decoder.loads(line)
+                except ValueError as e:
+                    if not self.lenient:
+                        raise
+                    self.quality.record_bad_line(line, e)
+                    continue
+                self.process_event(json_data)
+
+        self.warn_unsupported_event_types()
+        self.finalize()
+
+    def process_sharded(self, jobs):
+        """
+        process() with `jobs` processes: the log is split into byte ranges that are parsed at once (see shard.py),
+        then merged in order, to the same state as process(). Task events, most of a log, are decoded in parallel;
+        the others are few and processed here. Logs that cannot be split (compressed, rolling, or too small), streaming
+        and lenient modes and listeners subscribed to task events fall back to process().
+        """
+        builtin = {TASK_START: [self.do_SparkListenerTaskStart], TASK_END: [self.do_SparkListenerTaskEnd]}
+        ranges = shard_boundaries(self.filename, jobs) if jobs > 1 and can_shard(self.filename) else []
+        custom_task_listeners = any(self.listeners.get(t) != l for t, l in builtin.items())
+        if len(ranges) <= 1 or self.streaming or self.lenient or custom_task_listeners:
+            return self.process()
+
+        with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+            futures = [pool.submit(parse_shard, self.filename, start, end, self.decoder, set(self.listeners))
+                       for start, end in ranges]
+            shards = [future.result() for future in futures]
+
+        decoder = get_decoder(self.decoder)
+        for shard in shards:
+            for line in shard.lines:
+                self.process_event(decoder.loads(line))
+            self.unsupported_event_types |= shard.unsupported_event_types
+        merge_shards(self.tasks, shards)
+
+        self.warn_unsupported_event_types()
+        self.finalize()
+
+    def _process_profiled(self, profile, incremental=False):
+        # Apart from process() so that the loop without profiling pays nothing for it.
+        start = time.perf_counter()
+        if incremental:
+            self.process_incremental(profile, finalize=False)
+        else:
+            decoder = get_decoder(self.decoder)
+            with decoder.lines(open_event_log(self.filename)) as log_file:
+                for line in log_file:
+                    profile.process_line(self, decoder, line)
+            self.warn_unsupported_event_types()
+        finalize_start = time.perf_counter()
+        self.finalize()
+        end = time.perf_counter()
+        profile.wall_s += end - start
+        profile.finalize_s += end - finalize_start
+        profile.peak_rss_mb = peak_rss_mb()
+
+    def process_incremental(self, profile=None, finalize=True):
+        """
+        Processes the lines appended to the log since the previous call (all of them on the first call), e.g. of an
+        ".inprogress" log that Spark is still writing. A trailing line without its newline is being written: it is
+        left for the next call. If the log is not the one read before (other head, or shorter), it is parsed again
+        from the start. See resume() to keep the state between runs, and process() for profile.
+        """
+        if profile is not None and finalize:
+            return self._process_profiled(profile, incremental=True)
+        decoder = get_decoder(self.decoder)
+        with open_event_log(self.filename) as log_file:
+            head = log_file.peek(HEAD_SIZE)[:HEAD_SIZE]
+            common = min(len(head), len(self.head))
+            if head[:common] != self.head[:common] or skip(log_file, self.offset) < self.offset:
+                # Not the log read before (it was replaced or truncated): parse it from the start.
+                listeners = self.listeners
+                self.__init__(self.filename, self.is_logging_enable, self.decoder, self.streaming, self.lenient)
+                self.listeners = listeners
+                return self.process_incremental(profile, finalize)
+            self.head = max(head, self.head, key=len)
 
             for line in log_file:
-                json_data = get_json(line)
-                event_type = json_data["Event"]
-
-                # 13 event types
-                if event_type == "SparkListenerLogStart":
-                    self.do_SparkListenerLogStart(json_data)
-                elif event_type == "SparkListenerBlockManagerAdded":
-                    self.do_SparkListenerBlockManagerAdded(json_data)
-                elif event_type == "SparkListenerEnvironmentUpdate":
-                    self.do_SparkListenerEnvironmentUpdate(json_data)
-                elif event_type == "SparkListenerApplicationStart":
-                    self.do_SparkListenerApplicationStart(json_data)
-                elif event_type == "SparkListenerApplicationEnd":
-                    self.do_SparkListenerApplicationEnd(json_data)
-                elif event_type == "SparkListenerJobStart":
-                    self.do_SparkListenerJobStart(json_data)
-                elif event_type == "SparkListenerStageSubmitted":
-                    self.do_SparkListenerStageSubmitted(json_data)
-                elif event_type == "SparkListenerExecutorAdded":
-                    self.do_SparkListenerExecutorAdded(json_data)
-                elif event_type == "SparkListenerTaskStart":
-                    self.do_SparkListenerTaskStart(json_data)
-                elif event_type == "SparkListenerTaskEnd":
-                    self.do_SparkListenerTaskEnd(json_data)
-                elif event_type == "SparkListenerExecutorRemoved":
-                    self.do_SparkListenerExecutorRemoved(json_data)
-                elif event_type == "SparkListenerBlockManagerRemoved":
-                    self.do_SparkListenerBlockManagerRemoved(json_data)
-                elif event_type == "SparkListenerStageCompleted":
-                    self.do_SparkListenerStageCompleted(json_data)
-                elif event_type == "SparkListenerJobEnd":
-                    self.do_SparkListenerJobEnd(json_data)
+                if not line.endswith(b"\n"):
+                    break
+                if profile is None:
+                    event_type = event_type_of(line)
+                    if event_type is not None and event_type not in self.listeners:
+                        self.unsupported_event_types.add(event_type)
+                    else:
+                        json_data = self.decode_line(decoder, line)
+                        if json_data is not None:
+                            self.process_event(json_data)
                 else:
-                    # print("WARNING: unknown event type: " + event_type)
-                    unsupported_event_types.add(event_type)
-
-            if len(unsupported_event_types) > 0 and self.is_logging_enable:
-                print("WARNING: unknown event types:\n\t{}".format("\n\t".join(unsupported_event_types)))
+                    profile.process_line(self, decoder, line)
+                self.offset += len(line)
+
+        self.warn_unsupported_event_types()
+        if finalize:
+            self.finalize()
+
+    @classmethod
+    def resume(cls, filename, checkpoint_path, is_logging_enable=False, decoder=None, streaming=False, profile=None,
+               lenient=False, listeners=None):
+        """
+        Returns a LogParser of filename, resumed from the state saved in checkpoint_path when there is one for this
+        log, and processed up to the end of the log with process_incremental(). The state is then saved again.
+        listeners (event type -> list of listeners, see subscribe()) are subscribed before, so they are called with
+        the events processed by this call: those appended since the checkpoint.
+        """
+        log_parser = load_state(checkpoint_path)
+        if (not isinstance(log_parser, cls) or log_parser.filename != filename or log_parser.streaming != streaming
+                or log_parser.lenient != lenient):
+            log_parser = cls(filename, is_logging_enable, decoder, streaming, lenient)
+        if listeners:
+            log_parser.subscribe_all(listeners)
+        log_parser.process_incremental(profile)
+        dump_state(log_parser, checkpoint_path)
+        return log_parser
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["listeners"]  # bound methods and user functions: rebuilt on load
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.listeners = self.builtin_listeners()
+
+    def warn_unsupported_event_types(self):
+        if len(self.unsupported_event_types) > 0 and self.is_logging_enable:
+            print("WARNING: unknown event types:\n\t{}".format("\n\t".join(self.unsupported_event_types)))
+
+    def finalize(self):
+        """ Links and summarises what has been processed. Can be run again after more events have been processed. """
+        for e in self.executors.values():
+            e.block_managers = []
+            e.tasks = []
+            e.runtime_stats = None
+        for stages in self.stages.values():
+            for s in stages:
+                s.tasks = []
+                s.runtime_stats = None
+
+        self.quality.discard(LINK_CATEGORIES)
+
+        # Link SQL executions and their jobs
+        for execution in self.sql_executions.values():
+            execution.job_ids = []
+        for job in self.jobs.values():
+            execution = self.sql_executions.get(job.sql_execution_id)
+            if execution is not None:
+                execution.job_ids.append(job.job_id)
 
         # Link block managers and executors
         for bm in self.block_managers:
             if bm.executor_id != "driver":
-                self.executors[bm.executor_id].block_managers.append(bm)
-
-        for t in self.tasks.values():
-            self.executors[t.executor_id].tasks.append(t)
-            for j in self.jobs.values():
-                for s in j.stages:
-                    if s.stage_id == t.stage_id:
-                        s.tasks.append(t)
-
-        self.parsed_data["num_failed_tasks"] = 0
-        self.parsed_data["num_success_tasks"] = 0
-        for t in self.tasks.values():
-            if t.end_reason != "Success":
-                self.parsed_data["num_failed_tasks"] += 1
-            else:
-                self.parsed_data["num_success_tasks"] += 1
+                executor = self.executor_to_link(bm.executor_id, BLOCK_MANAGER_OF_UNKNOWN_EXECUTOR, "block manager")
+                if executor is not None:
+                    executor.block_managers.append(bm)
+
+        # Read by the report and the stages DAG
+        self.critical_paths = critical_paths(self)
+
+        if self.streaming:
+            self.link_task_aggregates()
+            return
+
+        stage_groups, stages_of_group = self.group_tasks_by_stages()
+        self.link_tasks(stage_groups, stages_of_group)
 
         # Total average and stddev task run time
-        all_runtimes = [x.finish_time - x.launch_time for x in self.tasks.values() if x.end_reason == "Success"]
-        all_runtimes = array(all_runtimes)
+        successful = self.tasks.column("end_reason") == self.tasks.string_codes.get("Success", -1)
+        self.compute_runtime_stats(successful, stage_groups, stages_of_group)
+        self.parsed_data["num_failed_tasks"] = int(len(self.tasks) - successful.sum())
+        self.parsed_data["num_success_tasks"] = int(successful.sum())
+
+        all_runtimes = self.tasks.runtimes()[successful]
+        if len(all_runtimes) == 0:
+            # e.g. an in-progress log where no task has finished yet
+            for key in ("tot_avg_task_runtime", "tot_std_task_runtime", "min_task_runtime", "max_task_runtime"):
+                self.parsed_data[key] = None
+            return
         self.parsed_data["tot_avg_task_runtime"] = all_runtimes.mean()
         self.parsed_data["tot_std_task_runtime"] = all_runtimes.std()
         self.parsed_data["min_task_runtime"] = all_runtimes.min()
         self.parsed_data["max_task_runtime"] = all_runtimes.max()
 
+    def link_tasks(self, stage_groups, stages_of_group):
+        """ Links the tasks to their executor and to their stages, grouped by group_tasks_by_stages(). """
+        table = self.tasks
+        for code, rows in table.group_rows(table.column("executor")).items():
+            executor = self.executor_to_link(table.strings[code], TASKS_OF_UNKNOWN_EXECUTOR, f"{len(rows)} tasks")
+            if executor is not None:
+                executor.tasks = TaskList(table, rows)
+
+        for group, rows in table.group_rows(stage_groups).items():
+            for s in stages_of_group[group]:
+                s.tasks = TaskList(table, rows)
+
+    def executor_to_link(self, executor_id, category, what):
+        """ The executor of id executor_id, or None (counted in quality) if it was never added, in lenient mode. """
+        executor = self.executors.get(executor_id)
+        if executor is None:
+            if not self.lenient:
+                raise KeyError(executor_id)
+            self.quality.record(category, f"{what} of executor {executor_id}")
+        return executor
+
+    def link_task_aggregates(self):
+        """ finalize() of streaming mode: the same summaries, from the aggregates of StreamingTasks. """
+        self.tasks.flush()
+        for executor_id, aggregate in self.tasks.by_executor.items():
+            executor = self.executor_to_link(executor_id, TASKS_OF_UNKNOWN_EXECUTOR, f"{len(aggregate)} tasks")
+            if executor is not None:
+                executor.tasks = aggregate
+                executor.runtime_stats = aggregate.runtime_stats()
+
+        # As in group_tasks_by_stages, the attempts of a retried stage are merged into the stages they share.
+        aggregates = {}
+        for key, aggregate in self.tasks.by_stage.items():
+            stages = self.stages.get(key, ())
+            merged = aggregates.setdefault(id(stages), (stages, TaskAggregate()))[1]
+            merged.merge(aggregate)
+        for stages, aggregate in aggregates.values():
+            runtime_stats = aggregate.runtime_stats()
+            for s in stages:
+                s.tasks = aggregate
+                s.runtime_stats = runtime_stats
+
+        overall = self.tasks.overall
+        self.parsed_data["num_failed_tasks"] = len(overall) - self.tasks.num_successful
+        self.parsed_data["num_success_tasks"] = self.tasks.num_successful
+        successful = overall.successful
+        self.parsed_data["tot_avg_task_runtime"] = successful.total / successful.count if successful.count else None
+        self.parsed_data["tot_std_task_runtime"] = successful.std if successful.count else None
+        self.parsed_data["min_task_runtime"] = successful.min
+        self.parsed_data["max_task_runtime"] = successful.max
+
+    def compute_runtime_stats(self, successful, stage_groups, stages_of_group):
+        """
+        Runtime distribution of the successful tasks of each stage and executor, see stats.py. The tasks are grouped
+        by stages as in link_tasks().
+        """
+        table = self.tasks
+        runtimes = table.runtimes()[successful]
+        task_ids = table.column("task_id")[successful]
+
+        executor_codes = table.column("executor")[successful]
+        for code, stats in group_runtime_stats(executor_codes, runtimes, task_ids).items():
+            executor = self.executors.get(table.strings[code])
+            if executor is not None:  # link_tasks raised, or counted in quality, for an executor never added
+                executor.runtime_stats = stats
+
+        for group, stats in group_runtime_stats(stage_groups[successful], runtimes, task_ids).items():
+            for s in stages_of_group[group]:
+                s.runtime_stats = stats
+
+    def group_tasks_by_stages(self):
+        """
+        Returns (group per task row, stages of each group), where a group is a list of stages sharing their tasks.
+        """
+        table = self.tasks
+        # The attempts of a retried stage share their stages (see do_SparkListenerStageSubmitted), so the keys are
+        # first mapped to one group per list of stages.
+        keys = (table.column("stage_id") << 16) | table.column("stage_attempt_id")
+        unique_keys, key_indices = numpy.unique(keys, return_inverse=True)
+        groups = {}
+        group_of_key = numpy.empty(len(unique_keys), dtype=numpy.int64)
+        for i, key in enumerate(unique_keys):
+            stages = self.stages.get((int(key) >> 16, int(key) & 0xFFFF), ())
+            group_of_key[i] = groups.setdefault(id(stages), (len(groups), stages))[0]
+        stages_of_group = [stages for _, stages in groups.values()]
+        return group_of_key[key_indices], stages_of_group
+
+    def get_critical_paths(self):
+        """
+        Returns a dict job id -> CriticalPath (see critical_path.py): the stages that set the run time of the job.
+        They are found by finalize().
+        """
+        return self.critical_paths
+
+    def get_utilization(self):
+        """
+        Returns (cluster, executors): the Utilization (see utilization.py) of the cores of all executors, and a dict
+        executor id -> Utilization of its cores.
+        """
+        return cluster_utilization(self)
+
     def get_app_name(self):
-        return self.parsed_data["app_name"]
+        return self.parsed_data.get("app_name")  # None when the log lost its "SparkListenerEnvironmentUpdate"
 
     def get_app_id(self):
-        return self.parsed_data["app_id"]
-
-    def generate_report(self):
-        # return s
-        s = "Report for '{}' execution {}\n".format(self.parsed_data["app_name"], self.parsed_data["app_id"])
-        s += "Spark version: {}\n".format(self.parsed_data["spark_version"])
-        s += "Java version: {}\n".format(self.parsed_data["java_version"])
-        s += "Application Start time: {}\n".format(
-            datetime.fromtimestamp(self.parsed_data["app_start_timestamp"] / 1000))
-        s += "Application End time: {}\n".format(datetime.fromtimestamp(self.parsed_data["app_end_timestamp"] / 1000))
-        s += "Commandline: {}\n\n".format(self.parsed_data["commandline"])
-
-        s += "---> Jobs <---\n"
-        s += "In total, there are {} jobs in {}\n".format(len(self.jobs), self.parsed_data["app_name"])
-        s += "\n"
+        return self.parsed_data.get("app_id")
+
+    def generate_report(self, max_tasks=None):
+        out = io.StringIO()
+        self.write_report(out, max_tasks)
+        return out.getvalue()
+
+    def write_report(self, out, max_tasks=None):
+        """
+        Writes the report section by section to the file-like `out`, so the whole report is never held in memory.
+        max_tasks caps the number of tasks listed in the per-task section (None lists all of them, 0 none).
+        """
+        # Fields of events a truncated log may have lost are None.
+        app_name = self.get_app_name()
+        out.write("Report for '{}' execution {}\n".format(app_name, self.get_app_id()))
+        out.write("Spark version: {}\n".format(self.parsed_data.get("spark_version")))
+        out.write("Java version: {}\n".format(self.parsed_data.get("java_version")))
+        app_start_timestamp = self.parsed_data.get("app_start_timestamp")
+        out.write("Application Start time: {}\n".format(
+            datetime.fromtimestamp(app_start_timestamp / 1000) if app_start_timestamp else None))
+        app_end_timestamp = self.parsed_data.get("app_end_timestamp")  # not there while the application runs
+        out.write("Application End time: {}\n".format(
+            datetime.fromtimestamp(app_end_timestamp / 1000) if app_end_timestamp else None))
+        out.write("Commandline: {}\n\n".format(self.parsed_data.get("commandline")))
+
+        if self.lenient or len(self.quality) > 0:
+            out.write("---> Data quality <---\n")
+            self.quality.write_report(out)
+            out.write("\n")
+
+        out.write("---> Jobs <---\n")
+        out.write("In total, there are {} jobs in {}\n".format(len(self.jobs), app_name))
+        out.write("\n")
         for j in self.jobs.values():
-            s += j.report(0)
-            s += "\n"
-
-        s += "---> Tasks <---\n"
-        s += "Total tasks: {}\n".format(len(self.tasks))
-        s += "Successful tasks: {}\n".format(self.parsed_data["num_success_tasks"])
-        s += "Failed tasks: {}\n".format(self.parsed_data["num_failed_tasks"])
-        s += "Task average runtime: {} ({} stddev)\n".format(self.parsed_data["tot_avg_task_runtime"],
-                                                             self.parsed_data["tot_std_task_runtime"])
-        s += "Task min/max runtime: {} min, {} max\n".format(self.parsed_data["min_task_runtime"],
-                                                             self.parsed_data["max_task_runtime"])
-        for t in self.tasks.values():
-            s += t.report(0)
-            s += "\n"
-
-        s += "---> Executors <---\n"
-        s += "In total, there are {} executors in {}\n".format(len(self.executors), self.parsed_data["app_name"])
-        s += "\n"
+            j.write_report(out, 0)
+            out.write("\n")
+
+        if self.sql_executions:
+            out.write("---> SQL executions <---\n")
+            write_sql_report(out, self)
+            out.write("\n")
+
+        out.write("---> Critical paths <---\n")
+        write_critical_paths_report(out, self.get_critical_paths())
+        out.write("\n")
+
+        out.write("---> Tasks <---\n")
+        out.write("Total tasks: {}\n".format(len(self.tasks)))
+        out.write("Successful tasks: {}\n".format(self.parsed_data["num_success_tasks"]))
+        out.write("Failed tasks: {}\n".format(self.parsed_data["num_failed_tasks"]))
+        out.write("Task average runtime: {} ({} stddev)\n".format(self.parsed_data["tot_avg_task_runtime"],
+                                                                  self.parsed_data["tot_std_task_runtime"]))
+        out.write("Task min/max runtime: {} min, {} max\n".format(self.parsed_data["min_task_runtime"],
+                                                                  self.parsed_data["max_task_runtime"]))
+        if self.streaming:
+            out.write("(tasks are not listed in streaming mode)\n")
+        else:
+            num_listed_tasks = len(self.tasks) if max_tasks is None else min(max_tasks, len(self.tasks))
+            for t in itertools.islice(self.tasks.values(), num_listed_tasks):
+                out.write(t.report(0))
+                out.write("\n")
+            if num_listed_tasks < len(self.tasks):
+                out.write("... {} more tasks not listed\n".format(len(self.tasks) - num_listed_tasks))
+
+        out.write("---> Executors <---\n")
+        out.write("In total, there are {} executors in {}\n".format(len(self.executors), app_name))
+        out.write("\n")
         for e in self.executors.values():
-            s += e.report(0)
-            s += "\n"
-
-        s += "---> Block managers <---\n"
-        s += "In total, there are {} block managers in {}\n".format(len(self.block_managers),
-                                                                    self.parsed_data["app_name"])
-        for bm in self.block_managers:
-            s += bm.report(0)
-
-        s += "\n"
-
-        # print('generate_report is finished.')
-
-        return s
+            e.write_report(out, 0)
+            out.write("\n")
 
-    def save_plot_of_stages_dag(self, filename, view=False):
-        dag = Digraph()
+        if not self.streaming:
+            out.write("---> Core utilization <---\n")
+            write_utilization_report(out, *self.get_utilization())
+            out.write("\n")
 
-        for j in self.jobs.values():
-            for s in j.stages:
-                assert type(s.stage_id) == int
-                dag.node(str(s.stage_id), f"{s.stage_id} ({s.get_completion_time()}ms, j={j.job_id})")
-
-        for j in self.jobs.values():
-            for s in j.stages:
-                for parent in s.parent_ids:
-                    assert type(parent) == int
-                    assert type(s.stage_id) == int
-                    dag.edge(str(parent), str(s.stage_id))
-
-        dag.render(filename, view=view)
+        out.write("---> Block managers <---\n")
+        out.write("In total, there are {} block managers in {}\n".format(len(self.block_managers),
+                                                                         app_name))
+        for bm in self.block_managers:
+            out.write(bm.report(0))
 
-    def save_plot_of_rdds_dag(self, filename, view=False):
-        dag = Digraph()
+        out.write("\n")
 
-        for j in self.jobs.values():
-            for s in j.stages:
-                for r in s.RDDs:
-                    assert type(r.rdd_id) == int
-                    dag.node(str(r.rdd_id), f"{r.name} {r.rdd_id} (j={j.job_id}, s={s.stage_id})")
+    def save_plot_of_stages_dag(self, filename, view=False, render=True):
+        save_dag(stages_dag(self), filename, render=render, view=view)
 
-        for j in self.jobs.values():
-            for s in j.stages:
-                for r in s.RDDs:
-                    for parent in r.parent_ids:
-                        assert type(parent) == int
-                        assert type(r.rdd_id) == int
-                        dag.edge(str(parent), str(r.rdd_id))
-
-        dag.render(filename, view=view)
\ No newline at end of file
+    def save_plot_of_rdds_dag(self, filename, view=False, render=True, max_nodes=None):
+        save_dag(rdds_dag(self, max_nodes), filename, render=render, view=view)
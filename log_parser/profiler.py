@@ -0,0 +1,103 @@
+import json
+import sys
+import time
+
+from log_parser.decoder import event_type_of
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+
+def peak_rss_mb():
+    """ Peak resident memory of this process so far, in MB (None where it is not known). """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1 << 20) if sys.platform == "darwin" else max_rss / 1024  # bytes on macOS, KB elsewhere
+
+
+class EventProfile:
+    __slots__ = ("count", "bytes", "decode_s", "handler_s")
+
+    def __init__(self):
+        self.count = 0
+        self.bytes = 0
+        self.decode_s = 0.0
+        self.handler_s = 0.0
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ParseProfile:
+    """
+    Where the time of LogParser.process() goes: per event type, the number of events, their bytes, the time spent
+    decoding them and in their do_* handler; and for the whole parse, the wall time, the time of finalize() and the
+    peak resident memory. Pass one to LogParser.process(profile=...); without one, nothing is measured.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.events = {}  # event type -> EventProfile
+        self.wall_s = 0.0
+        self.finalize_s = 0.0
+        self.peak_rss_mb = None
+
+    def process_line(self, log_parser, decoder, line):
+        """ log_parser.process_event of the decoded line, timed; or the line skipped, as LogParser.process does. """
+        start = time.perf_counter()
+        event_type = event_type_of(line)
+        if event_type is not None and event_type not in log_parser.listeners:
+            log_parser.unsupported_event_types.add(event_type)
+            decoded = handled = time.perf_counter()
+        else:
+            json_data = log_parser.decode_line(decoder, line)
+            decoded = time.perf_counter()
+            if json_data is not None:
+                log_parser.process_event(json_data)
+                event_type = json_data.get("Event") if isinstance(json_data, dict) else None
+            handled = time.perf_counter()
+
+        event = self.events.get(event_type)
+        if event is None:
+            event = self.events[event_type] = EventProfile()
+        event.count += 1
+        # str lines (of a text decoder) are counted in bytes too, as in the file
+        event.bytes += len(line.encode()) if isinstance(line, str) else len(line)
+        event.decode_s += decoded - start
+        event.handler_s += handled - decoded
+
+    def merge(self, other):
+        """ Adds the measures of other, e.g. of another log. """
+        for event_type, other_event in other.events.items():
+            event = self.events.get(event_type)
+            if event is None:
+                event = self.events[event_type] = EventProfile()
+            for name in EventProfile.__slots__:
+                setattr(event, name, getattr(event, name) + getattr(other_event, name))
+        self.wall_s += other.wall_s
+        self.finalize_s += other.finalize_s
+        if other.peak_rss_mb is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0, other.peak_rss_mb)
+
+    def to_dict(self):
+        decode_s = sum(e.decode_s for e in self.events.values())
+        handler_s = sum(e.handler_s for e in self.events.values())
+        events = sorted(self.events.items(), key=lambda item: item[1].decode_s + item[1].handler_s, reverse=True)
+        return {
+            "path": self.path,
+            "wall_s": self.wall_s,
+            "decode_s": decode_s,
+            "handler_s": handler_s,
+            "finalize_s": self.finalize_s,
+            # reading, decompressing and splitting lines, and the profiling itself
+            "other_s": self.wall_s - decode_s - handler_s - self.finalize_s,
+            "peak_rss_mb": self.peak_rss_mb,
+            "events": {event_type: event.to_dict() for event_type, event in events},
+        }
+
+    def write(self, path):
+        with open(path, "w") as profile_file:
+            json.dump(self.to_dict(), profile_file, indent=2)
@@ -0,0 +1,81 @@
+# Categories of the problems found in a log, see DataQuality
+UNDECODABLE_LINE = "undecodable line"
+TRUNCATED_LAST_LINE = "truncated last line"
+MISSING_FIELD = "event without a field it needs"
+INVALID_EVENT = "invalid event"
+DUPLICATE_JOB = "job started twice"
+TASK_END_WITHOUT_START = "task end without its task start"
+JOB_END_WITHOUT_START = "job end without its job start"
+UNKNOWN_EXECUTOR_REMOVED = "removal of an executor never added"
+# Found when linking, by finalize()
+TASKS_OF_UNKNOWN_EXECUTOR = "tasks of an executor never added"
+BLOCK_MANAGER_OF_UNKNOWN_EXECUTOR = "block manager of an executor never added"
+LINK_CATEGORIES = (TASKS_OF_UNKNOWN_EXECUTOR, BLOCK_MANAGER_OF_UNKNOWN_EXECUTOR)
+
+
+class OrphanEventError(KeyError):
+    """ An event that refers to a task, job or executor that the log did not introduce (e.g. its start was lost). """
+
+    def __init__(self, category, key):
+        super().__init__(key)
+        self.category = category
+        self.key = key
+
+    def __str__(self):
+        return f"{self.category}: {self.key}"
+
+
+class DataQuality:
+    """
+    The problems found in a log parsed in lenient mode (see LogParser), where they are counted instead of stopping
+    the parse: per category, their number and the first MAX_EXAMPLES of them.
+    """
+
+    MAX_EXAMPLES = 5
+    MAX_EXAMPLE_LENGTH = 120
+
+    def __init__(self):
+        self.counts = {}  # category -> number of problems
+        self.examples = {}  # category -> descriptions of the first problems
+
+    def record(self, category, example):
+        self.counts[category] = self.counts.get(category, 0) + 1
+        examples = self.examples.setdefault(category, [])
+        if len(examples) < self.MAX_EXAMPLES:
+            examples.append(example[:self.MAX_EXAMPLE_LENGTH])
+
+    def record_bad_line(self, line, error):
+        """ A line that could not be decoded: the last one of a log cut while it was written, or garbage. """
+        truncated = line[-1:] not in (b"\n", "\n")
+        if isinstance(line, bytes):
+            line = line.decode(errors="replace")
+        self.record(TRUNCATED_LAST_LINE if truncated else UNDECODABLE_LINE, f"{error} in {line.strip()!r}")
+
+    def record_event_error(self, json_data, error):
+        """ An event whose handling failed with error. """
+        event_type = json_data.get("Event") if isinstance(json_data, dict) else None
+        if isinstance(error, OrphanEventError):
+            self.record(error.category, f"{event_type} of {error.key}")
+        elif isinstance(error, KeyError):
+            self.record(MISSING_FIELD, f"{event_type} without {error}")
+        else:
+            self.record(INVALID_EVENT, f"{event_type}: {type(error).__name__}: {error}")
+
+    def discard(self, categories):
+        for category in categories:
+            self.counts.pop(category, None)
+            self.examples.pop(category, None)
+
+    def __len__(self):
+        """ The number of problems. """
+        return sum(self.counts.values())
+
+    def write_report(self, out):
+        if len(self) == 0:
+            out.write("No problems found in the log\n")
+            return
+        out.write("{} problems found in the log, the report covers what could be parsed:\n".format(len(self)))
+        for category, count in sorted(self.counts.items(), key=lambda item: -item[1]):
+            out.write("\t{}: {}\n".format(category, count))
+            for example in self.examples[category]:
+                out.write("\t\t{}\n".format(example))
@@ -0,0 +1,431 @@
+import io
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections import deque
+from concurrent.futures import CancelledError
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import unquote
+from urllib.parse import urlsplit
+
+from log_parser.event_log import find_event_logs
+from log_parser.event_log import is_in_progress
+from log_parser.event_log import rolling_log_parts
+from log_parser.export import TABLES
+from log_parser.export import application_rows
+from log_parser.export import stage_rows
+from log_parser.parser import LogParser
+from log_parser.watch import get_watcher
+from log_parser.watch import watch_tree
+
+# Seconds between two scans of the directory when the watcher was not woken up before (always, when polling)
+POLL_INTERVAL = 10
+MAX_QUEUE = 64
+MAX_APPLICATIONS = 256
+# Tasks listed in the reports kept in memory
+REPORT_MAX_TASKS = 1000
+# The quantiles of the latencies in /metrics are over the last LATENCY_WINDOW parses
+LATENCY_WINDOW = 1024
+QUANTILES = (0.5, 0.9, 0.99)
+
+COUNTERS = {
+    "logs_queued": "Logs queued for parsing",
+    "logs_parsed": "Logs parsed",
+    "logs_failed": "Logs whose parse failed",
+    "logs_reloaded": "Logs parsed again because their evicted application was requested",
+    "scans_deferred": "Scans that stopped at a full queue, leaving the other logs for the next scan",
+}
+
+
+def log_version(path):
+    """ What changes when a log does: the size and modification time of the file, or of each part of a rolling log. """
+    files = rolling_log_parts(path) if os.path.isdir(path) else [path]
+    version = []
+    for f in files:
+        stat = os.stat(f)
+        version.append((f, stat.st_size, stat.st_mtime_ns))
+    return tuple(version)
+
+
+class ParsedApplication:
+    """
+    What the service keeps of a parsed log: its summary and its stages, as in the "applications" and "stages" tables
+    of export.py, and its report. Like ApplicationSummary, it is small and cheap to pickle back from a worker process.
+    """
+
+    def __init__(self, path, version, summary, stages, report):
+        self.path = path
+        self.version = version  # log_version of the log that was parsed
+        self.summary = summary
+        self.stages = stages
+        self.report = report
+
+    @classmethod
+    def from_log_parser(cls, log_parser, version, max_tasks=None):
+        app_id = log_parser.get_app_id()
+        summary = dict(zip([c.name for c in TABLES["applications"]], next(application_rows(log_parser, app_id))))
+        start, end = summary["start_time"], summary["end_time"]
+        summary["duration_ms"] = end - start if start is not None and end is not None else None
+        summary["num_failed_tasks"] = log_parser.parsed_data.get("num_failed_tasks")
+        summary["num_sql_executions"] = len(log_parser.sql_executions)
+        summary["num_data_quality_problems"] = len(log_parser.quality)
+        summary["attempt_id"] = log_parser.parsed_data.get("app_attempt_id")
+        summary["key"] = application_key(app_id, summary["attempt_id"], log_parser.filename)
+        stage_columns = [c.name for c in TABLES["stages"]]
+        stages = [dict(zip(stage_columns, row)) for row in stage_rows(log_parser, app_id)]
+        return cls(log_parser.filename, version, summary, stages, log_parser.generate_report(max_tasks))
+
+    @property
+    def key(self):
+        """ How the HTTP API names the application (see application_key). """
+        return self.summary["key"]
+
+
+def log_name(path):
+    return os.path.basename(os.path.normpath(path))
+
+
+def application_key(app_id, attempt_id, path):
+    """
+    The name of an application in the HTTP API: its id, followed by its attempt id for the logs of the attempts of an
+    application on YARN, or the name of its log when the log lost its id.
+    """
+    if app_id is None:
+        return log_name(path)
+    return f"{app_id}_{attempt_id}" if attempt_id is not None else app_id
+
+
+def parse_log_safely(path, version, lenient=False, streaming=False, max_tasks=REPORT_MAX_TASKS, cache=None):
+    """
+    Parses the log at path, in a worker process. Returns (ParsedApplication, None), or (None, the error message).
+    With a cache (a ParseCache), a log parsed before, e.g. before the service restarted, is loaded from there.
+    """
+    try:
+        log_parser = cache.get(path) if cache is not None else None
+        if log_parser is None or log_parser.streaming != streaming or log_parser.lenient != lenient:
+            log_parser = LogParser(path, streaming=streaming, lenient=lenient)
+            log_parser.process()
+            if cache is not None:
+                cache.put(path, log_parser)
+        return ParsedApplication.from_log_parser(log_parser, version, max_tasks), None
+    except Exception as e:
+        return None, f"error on parse {path}, {type(e).__name__}: {e}"
+
+
+class LatencyWindow:
+    """ The number and sum of latencies (s), and the last LATENCY_WINDOW of them for their quantiles. """
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+
+    def quantiles(self):
+        """ quantile -> latency, over the recent latencies; empty before the first one. """
+        recent = sorted(self.recent)
+        return {q: recent[int(q * (len(recent) - 1))] for q in QUANTILES} if recent else {}
+
+
+class ApplicationStore:
+    """
+    The ParsedApplication of the last max_applications logs, by path: the least recently parsed or served is evicted
+    first. The logs of the evicted ones are remembered by key, to be parsed again when they are requested (see
+    WatchService.get_application). Safe to use from several threads.
+
+    Keys are unique: an application whose key is taken by the log of another path, kept or evicted (e.g. a copy of a
+    log), is named by the name of its log instead.
+    """
+
+    def __init__(self, max_applications=MAX_APPLICATIONS):
+        self.max_applications = max_applications
+        self.applications = OrderedDict()  # path -> ParsedApplication, least recently used first
+        self.evicted = {}  # ParsedApplication.key -> path, of the evicted applications
+        self.num_evicted = 0
+        self.lock = threading.Lock()
+
+    def put(self, application):
+        with self.lock:
+            if self._is_taken(application.key, application.path):
+                application.summary["key"] = log_name(application.path)
+            self.applications[application.path] = application
+            self.applications.move_to_end(application.path)
+            if self.evicted.get(application.key) == application.path:
+                del self.evicted[application.key]
+            while len(self.applications) > self.max_applications:
+                _, evicted = self.applications.popitem(last=False)
+                self.evicted[evicted.key] = evicted.path
+                self.num_evicted += 1
+
+    def _is_taken(self, key, path):
+        """ Whether key names the application of a log other than path. """
+        if self.evicted.get(key, path) != path:
+            return True
+        return any(application.key == key and p != path for p, application in self.applications.items())
+
+    def remove(self, path):
+        """ Forgets the application of a log that was removed. """
+        with self.lock:
+            application = self.applications.pop(path, None)
+            if application is None:
+                self.evicted = {key: p for key, p in self.evicted.items() if p != path}
+
+    def evicted_path(self, key):
+        """ The path of the log of the evicted application of key, or None. """
+        with self.lock:
+            return self.evicted.get(key)
+
+    def get(self, key):
+        """ The ParsedApplication of key (see ParsedApplication.key), or None. """
+        with self.lock:
+            for path, application in reversed(self.applications.items()):
+                if application.key == key:
+                    self.applications.move_to_end(path)
+                    return application
+        return None
+
+    def values(self):
+        """ The applications, most recently used first. """
+        with self.lock:
+            return list(reversed(self.applications.values()))
+
+    def __len__(self):
+        return len(self.applications)
+
+
+class WatchService:
+    """
+    Keeps the finished logs of a directory parsed: a thread scans the directory whenever the watcher (inotify, or
+    polling where inotify is not available) wakes it up, and at least every poll_interval seconds, and queues the logs
+    that are new or changed; `jobs` worker processes parse them; their ParsedApplication are kept in an
+    ApplicationStore, and served over HTTP by serve() (see ServiceRequestHandler).
+
+    The queue holds max_queue logs at most. When it is full, a scan stops there and the other logs wait in the
+    directory until a next scan: a burst of logs is parsed at the pace of the workers, without growing memory.
+    """
+
+    def __init__(self, directory, jobs=1, max_queue=MAX_QUEUE, max_applications=MAX_APPLICATIONS,
+                 poll_interval=POLL_INTERVAL, lenient=False, streaming=False, max_tasks=REPORT_MAX_TASKS, cache=None,
+                 use_inotify=True):
+        self.directory = directory
+        self.jobs = jobs
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.parse = partial(parse_log_safely, lenient=lenient, streaming=streaming, max_tasks=max_tasks, cache=cache)
+        self.queue = queue.Queue(maxsize=max_queue)  # (path, log_version, time it was queued)
+        self.store = ApplicationStore(max_applications)
+        self.versions = {}  # path -> log_version when the log was queued, for the logs seen by the last scan
+        self.watcher = None
+        self.pool = None
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.num_parsing = 0
+        self.queue_latency = LatencyWindow()
+        self.parse_latency = LatencyWindow()
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def start(self):
+        """ Starts the watch thread and the parse threads, each of which waits on one parse in the worker processes. """
+        self.pool = ProcessPoolExecutor(max_workers=self.jobs)
+        self.watcher = get_watcher(self.use_inotify)
+        threads = [threading.Thread(target=self._watch_loop, name="watch", daemon=True)]
+        threads += [threading.Thread(target=self._parse_loop, name=f"parse-{i}", daemon=True)
+                    for i in range(self.jobs)]
+        for thread in threads:
+            thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _count(self, counter, n=1):
+        with self.lock:
+            self.counters[counter] += n
+
+    def scan(self):
+        """
+        Queues the finished logs of the directory that are new or changed since they were queued. Returns False when
+        the queue was full before all of them were.
+        """
+        watch_tree(self.watcher, self.directory)
+        paths = find_event_logs(self.directory)
+        for path in self.versions.keys() - set(paths):
+            del self.versions[path]
+            self.store.remove(path)
+        for path in paths:
+            if is_in_progress(path):
+                continue  # parsed once finished: Spark renames the log, or updates the status of a rolling log
+            try:
+                version = log_version(path)
+            except FileNotFoundError:
+                continue  # removed since it was listed
+            if self.versions.get(path) == version:
+                continue
+            try:
+                self.queue.put_nowait((path, version, time.monotonic()))
+            except queue.Full:
+                self._count("scans_deferred")
+                return False
+            self.versions[path] = version
+            self._count("logs_queued")
+        return True
+
+    def _watch_loop(self):
+        while not self.stopping.is_set():
+            complete = True
+            try:
+                complete = self.scan()
+            except OSError as e:
+                print(f"error on scan {self.directory}, {e}", file=sys.stderr)
+            # After a deferred scan, the rest is queued as soon as the workers made room
+            self.watcher.wait(self.poll_interval if complete else min(self.poll_interval, 1))
+
+    def _parse_loop(self):
+        while not self.stopping.is_set():
+            path, version, queued_at = self.queue.get()
+            started_at = time.monotonic()
+            with self.lock:
+                self.num_parsing += 1
+                pool = self.pool
+            try:
+                application, message = pool.submit(self.parse, path, version).result()
+            except (CancelledError, RuntimeError):  # stop() shut the pool down
+                return
+            except BrokenProcessPool:
+                # A worker died, e.g. killed for running out of memory on a huge log: the pool cannot be used again
+                application, message = None, f"error on parse {path}, the worker process parsing it died"
+                with self.lock:
+                    if self.pool is pool and not self.stopping.is_set():
+                        self.pool = ProcessPoolExecutor(max_workers=self.jobs)
+            finally:
+                with self.lock:
+                    self.num_parsing -= 1
+            with self.lock:
+                self.queue_latency.add(started_at - queued_at)
+                self.parse_latency.add(time.monotonic() - started_at)
+            if application is not None:
+                self.store.put(application)
+                self._count("logs_parsed")
+            else:
+                print(message, file=sys.stderr)
+                self._count("logs_failed")
+
+    def get_application(self, key):
+        """
+        The ParsedApplication of key, or None. An application evicted from the store is parsed again (or loaded from
+        the ParseCache, with one) in a worker process, and put back into the store.
+        """
+        application = self.store.get(key)
+        if application is not None:
+            return application
+        path = self.store.evicted_path(key)
+        if path is None:
+            return None
+        try:
+            application, message = self.pool.submit(self.parse, path, log_version(path)).result()
+        except (OSError, CancelledError, RuntimeError, BrokenProcessPool) as e:
+            application, message = None, f"error on parse {path}, {type(e).__name__}: {e}"
+        if application is None:
+            print(message, file=sys.stderr)
+            return None
+        self.store.put(application)
+        self._count("logs_reloaded")
+        return application
+
+    def write_metrics(self, out):
+        """ Writes the metrics of the service in the Prometheus text format. """
+        def metric(name, kind, help, value):
+            out.write(f"# HELP log_parser_{name} {help}\n# TYPE log_parser_{name} {kind}\n")
+            out.write(f"log_parser_{name} {value}\n")
+
+        def summary(name, help, latency):
+            out.write(f"# HELP log_parser_{name} {help}\n# TYPE log_parser_{name} summary\n")
+            for q, seconds in latency.quantiles().items():
+                out.write(f'log_parser_{name}{{quantile="{q}"}} {seconds:.6f}\n')
+            out.write(f"log_parser_{name}_sum {latency.sum:.6f}\nlog_parser_{name}_count {latency.count}\n")
+
+        with self.lock:
+            metric("queue_depth", "gauge", "Logs queued, waiting for a worker", self.queue.qsize())
+            metric("queue_capacity", "gauge", "Logs the queue holds at most", self.queue.maxsize)
+            metric("parses_in_progress", "gauge", "Logs being parsed", self.num_parsing)
+            metric("applications", "gauge", "Parsed applications kept in memory", len(self.store))
+            metric("applications_evicted_total", "counter", "Parsed applications evicted from memory",
+                   self.store.num_evicted)
+            for counter, help in COUNTERS.items():
+                metric(f"{counter}_total", "counter", help, self.counters[counter])
+            summary("queue_wait_seconds", "Time logs waited in the queue", self.queue_latency)
+            summary("parse_seconds", "Time to parse a log, in its worker process", self.parse_latency)
+
+    def serve(self, host, port):
+        """ Starts the service and serves its HTTP API on host:port until interrupted. """
+        server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+        server.service = self
+        self.start()
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            self.stop()
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    The HTTP API of the WatchService of the server, read only:
+    - GET /applications: the summaries of the parsed applications, most recently used first
+    - GET /applications/<key>: the summary of an application, by id (see ParsedApplication.key)
+    - GET /applications/<key>/stages: its stages, with the runtime statistics of their tasks
+    - GET /applications/<key>/report: its report, as text
+    - GET /metrics: the metrics of the service (queue depth, parse latency, ...) for Prometheus
+    """
+
+    def do_GET(self):
+        service = self.server.service
+        parts = [unquote(part) for part in urlsplit(self.path).path.split("/") if part]
+        if parts == ["metrics"]:
+            out = io.StringIO()
+            service.write_metrics(out)
+            self._send(200, "text/plain; version=0.0.4", out.getvalue())
+            return
+        if parts == ["applications"]:
+            self._send_json(200, [application.summary for application in service.store.values()])
+            return
+        if len(parts) in (2, 3) and parts[0] == "applications":
+            application = service.get_application(parts[1])
+            if application is None:
+                self._send_json(404, {"error": f"no parsed application '{parts[1]}'"})
+            elif len(parts) == 2:
+                self._send_json(200, application.summary)
+            elif parts[2] == "stages":
+                self._send_json(200, application.stages)
+            elif parts[2] == "report":
+                self._send(200, "text/plain; charset=utf-8", application.report)
+            else:
+                self._send_json(404, {"error": f"unknown resource '{parts[2]}'"})
+            return
+        self._send_json(404, {"error": f"unknown path '{self.path}'"})
+
+    def _send(self, status, content_type, body):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, data):
+        self._send(status, "application/json", json.dumps(data))
+
+    def log_message(self, format, *args):
+        pass  # no line on stderr per request
@@ -0,0 +1,256 @@
+import mmap
+import os
+from array import array
+
+import numpy
+
+from log_parser.decoder import event_type_of
+from log_parser.decoder import get_decoder
+from log_parser.event_log import codec_of
+
+# Shards are at least this big: below, starting a process costs more than it saves.
+MIN_SHARD_SIZE = 32 << 20
+
+TASK_START = "SparkListenerTaskStart"
+TASK_END = "SparkListenerTaskEnd"
+
+# Columns of TaskTable read from "SparkListenerTaskStart" and "SparkListenerTaskEnd", as kept by a shard.
+START_INT_COLUMNS = ("task_id", "stage_id", "stage_attempt_id", "launch_time")
+START_STRING_COLUMNS = ("executor", "locality")
+START_FLAG_COLUMNS = ("speculative",)
+END_INT_COLUMNS = ("task_id", "finish_time", "getting_result_time", "index", "disk_spilled_bytes",
+                   "memory_spilled_bytes", "executor_deserialize_time", "executor_run_time", "jvm_gc_time",
+                   "result_serialize_time", "result_size")
+END_STRING_COLUMNS = ("end_reason", "type")
+END_FLAG_COLUMNS = ("failed", "has_metrics")
+
+
+def can_shard(filename):
+    """ Only a plain file can be read from any offset: compressed logs and rolling log directories cannot. """
+    return os.path.isfile(filename) and codec_of(filename) is None
+
+
+def shard_boundaries(filename, num_shards):
+    """
+    Splits a log into at most num_shards byte ranges [start, end) of MIN_SHARD_SIZE bytes at least, each ending just
+    after a newline (or at the end of the file), so that every line is in exactly one range.
+    """
+    size = os.path.getsize(filename)
+    num_shards = max(1, min(num_shards, size // MIN_SHARD_SIZE))
+    if num_shards == 1:
+        return [(0, size)]
+    with open(filename, "rb") as log_file, mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as log_map:
+        boundaries = [0]
+        for i in range(1, num_shards):
+            newline = log_map.find(b"\n", max(boundaries[-1], size * i // num_shards))
+            boundaries.append(size if newline < 0 else newline + 1)
+        boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+class Shard:
+    """
+    What the events of one byte range of a log amount to, so that the ranges can be parsed in parallel and merged in
+    order (see merge_shards):
+    - the task starts and ends, as columns (`start_<column>` and `end_<column>` arrays) with the offset of their line;
+      strings are coded in `strings`, in the order they are first met, code 0 standing for None
+    - the other lines that have listeners, undecoded and in order ("SparkListenerJobStart", ...): they are few
+    - the types of the events without listeners
+    """
+
+    def __init__(self):
+        self.start_offset = array("q")
+        for name in START_INT_COLUMNS:
+            setattr(self, "start_" + name, array("q"))
+        for name in START_STRING_COLUMNS:
+            setattr(self, "start_" + name, array("i"))
+        for name in START_FLAG_COLUMNS:
+            setattr(self, "start_" + name, array("b"))
+        self.end_offset = array("q")
+        for name in END_INT_COLUMNS:
+            setattr(self, "end_" + name, array("q"))
+        for name in END_STRING_COLUMNS:
+            setattr(self, "end_" + name, array("i"))
+        for name in END_FLAG_COLUMNS:
+            setattr(self, "end_" + name, array("b"))
+
+        self.strings = [None]
+        self.string_codes = {None: 0}
+        self.lines = []
+        self.unsupported_event_types = set()
+
+    def intern(self, s):
+        code = self.string_codes.get(s)
+        if code is None:
+            code = self.string_codes[s] = len(self.strings)
+            self.strings.append(s)
+        return code
+
+    def start(self, offset, data):
+        """ As TaskTable.start """
+        info = data["Task Info"]
+        self.start_offset.append(offset)
+        self.start_task_id.append(info["Task ID"])
+        self.start_stage_id.append(data["Stage ID"])
+        self.start_stage_attempt_id.append(data["Stage Attempt ID"])
+        self.start_executor.append(self.intern(info["Executor ID"]))
+        self.start_launch_time.append(info["Launch Time"])
+        self.start_locality.append(self.intern(info["Locality"]))
+        self.start_speculative.append(info["Speculative"])
+
+    def finish(self, offset, data):
+        """ As TaskTable.finish """
+        info = data["Task Info"]
+        self.end_offset.append(offset)
+        self.end_task_id.append(info["Task ID"])
+        self.end_end_reason.append(self.intern(data["Task End Reason"]["Reason"]))
+        self.end_failed.append(info["Failed"])
+        self.end_finish_time.append(info["Finish Time"])
+        self.end_getting_result_time.append(info["Getting Result Time"])
+        self.end_index.append(info["Index"])
+        self.end_type.append(self.intern(data["Task Type"]))
+
+        if "Task Metrics" in data:
+            metrics = data["Task Metrics"]
+            self.end_has_metrics.append(True)
+            self.end_disk_spilled_bytes.append(metrics["Disk Bytes Spilled"])
+            self.end_memory_spilled_bytes.append(metrics["Memory Bytes Spilled"])
+            self.end_executor_deserialize_time.append(metrics["Executor Deserialize Time"])
+            self.end_executor_run_time.append(metrics["Executor Run Time"])
+            self.end_jvm_gc_time.append(metrics["JVM GC Time"])
+            self.end_result_serialize_time.append(metrics["Result Serialization Time"])
+            self.end_result_size.append(metrics["Result Size"])
+        else:
+            self.end_has_metrics.append(False)
+            for name in END_INT_COLUMNS[4:]:
+                getattr(self, "end_" + name).append(0)
+
+
+def parse_shard(filename, start, end, decoder, event_types):
+    """
+    Parses the lines of filename in [start, end) into a Shard, in a worker process: the log is mapped in memory, not
+    read or sent. event_types are the event types that have listeners; task starts and ends are decoded here, the
+    other events with listeners are left to the parent process.
+    """
+    decoder = get_decoder(decoder)
+    shard = Shard()
+    with open(filename, "rb") as log_file, mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as log_map:
+        log_map.seek(start)
+        offset = start
+        while offset < end:
+            line = log_map.readline()
+            event_type = event_type_of(line)
+            json_data = None
+            if event_type is None:  # not written the way Spark writes events: decode it to know
+                json_data = decoder.loads(line)
+                event_type = json_data["Event"]
+            if event_type == TASK_START:
+                shard.start(offset, json_data or decoder.loads(line))
+            elif event_type == TASK_END:
+                shard.finish(offset, json_data or decoder.loads(line))
+            elif event_type in event_types:
+                shard.lines.append(line)
+            else:
+                shard.unsupported_event_types.add(event_type)
+            offset += len(line)
+    return shard
+
+
+def _concatenate(shards, name, dtype):
+    return numpy.concatenate([numpy.frombuffer(getattr(shard, name), dtype=dtype) for shard in shards])
+
+
+def merge_shards(table, shards):
+    """
+    Fills the empty TaskTable table with the task starts and ends of shards (in log order), as if they had been
+    processed one by one. In the usual case (each task started once, and ended at most once after its start), rows
+    are built at once with numpy; otherwise the events are replayed through table.start/finish in log order.
+    """
+    # Strings are interned in the order they are first met in the log, as one by one: shard by shard, in the order
+    # they are first met in each shard.
+    code_maps = [numpy.array([table.intern(s) for s in shard.strings], dtype=numpy.int32) for shard in shards]
+
+    start_task_ids = _concatenate(shards, "start_task_id", numpy.int64)
+    end_task_ids = _concatenate(shards, "end_task_id", numpy.int64)
+    order = numpy.argsort(start_task_ids)
+    sorted_task_ids = start_task_ids[order]
+    positions = numpy.minimum(numpy.searchsorted(sorted_task_ids, end_task_ids), max(len(order) - 1, 0))
+    usual = (len(numpy.unique(start_task_ids)) == len(start_task_ids)
+             and len(numpy.unique(end_task_ids)) == len(end_task_ids)
+             and (len(end_task_ids) == 0 or len(order) > 0 and (sorted_task_ids[positions] == end_task_ids).all()))
+    if usual:
+        end_rows = order[positions] if len(end_task_ids) > 0 else numpy.zeros(0, dtype=numpy.int64)
+        usual = (_concatenate(shards, "start_offset", numpy.int64)[end_rows]
+                 < _concatenate(shards, "end_offset", numpy.int64)).all()
+    if not usual:
+        _replay(table, shards)
+        return
+
+    def strings(prefix, name):
+        return numpy.concatenate([code_map[numpy.frombuffer(getattr(shard, prefix + name), dtype=numpy.int32)]
+                                  for shard, code_map in zip(shards, code_maps)])
+
+    num_rows = len(start_task_ids)
+    columns = {name: numpy.zeros(num_rows, dtype=getattr(table, name).typecode)
+               for name in table.INT_COLUMNS + table.STRING_COLUMNS + table.FLAG_COLUMNS}
+    for name in START_INT_COLUMNS:
+        columns[name][:] = _concatenate(shards, "start_" + name, numpy.int64)
+    for name in START_STRING_COLUMNS:
+        columns[name][:] = strings("start_", name)
+    for name in START_FLAG_COLUMNS:
+        columns[name][:] = _concatenate(shards, "start_" + name, numpy.int8)
+    for name in END_INT_COLUMNS[1:]:
+        columns[name][end_rows] = _concatenate(shards, "end_" + name, numpy.int64)
+    for name in END_STRING_COLUMNS:
+        columns[name][end_rows] = strings("end_", name)
+    for name in END_FLAG_COLUMNS:
+        columns[name][end_rows] = _concatenate(shards, "end_" + name, numpy.int8)
+    columns["finished"][end_rows] = True
+    for name, values in columns.items():
+        getattr(table, name).frombytes(values.tobytes())
+
+    not_finished = numpy.ones(num_rows, dtype=bool)
+    not_finished[end_rows] = False
+    rows = numpy.flatnonzero(not_finished)
+    table.running = dict(zip(start_task_ids[rows].tolist(), rows.tolist()))
+    table.max_task_id = int(start_task_ids.max()) if num_rows > 0 else -1
+
+
+def _replay(table, shards):
+    """ The task events of shards through table.start/finish, in log order, as dicts of the fields they read. """
+    events = []
+    for shard in shards:
+        for i, offset in enumerate(shard.start_offset):
+            events.append((offset, 0, shard, i))
+        for i, offset in enumerate(shard.end_offset):
+            events.append((offset, 1, shard, i))
+    events.sort(key=lambda event: event[0])
+    for _, is_end, shard, i in events:
+        if not is_end:
+            table.start({
+                "Stage ID": shard.start_stage_id[i],
+                "Stage Attempt ID": shard.start_stage_attempt_id[i],
+                "Task Info": {"Task ID": shard.start_task_id[i], "Executor ID": shard.strings[shard.start_executor[i]],
+                              "Launch Time": shard.start_launch_time[i],
+                              "Locality": shard.strings[shard.start_locality[i]],
+                              "Speculative": bool(shard.start_speculative[i])},
+            })
+            continue
+        data = {
+            "Task Type": shard.strings[shard.end_type[i]],
+            "Task End Reason": {"Reason": shard.strings[shard.end_end_reason[i]]},
+            "Task Info": {"Task ID": shard.end_task_id[i], "Failed": bool(shard.end_failed[i]),
+                          "Finish Time": shard.end_finish_time[i],
+                          "Getting Result Time": shard.end_getting_result_time[i], "Index": shard.end_index[i]},
+        }
+        if shard.end_has_metrics[i]:
+            data["Task Metrics"] = {
+                "Disk Bytes Spilled": shard.end_disk_spilled_bytes[i],
+                "Memory Bytes Spilled": shard.end_memory_spilled_bytes[i],
+                "Executor Deserialize Time": shard.end_executor_deserialize_time[i],
+                "Executor Run Time": shard.end_executor_run_time[i],
+                "JVM GC Time": shard.end_jvm_gc_time[i],
+                "Result Serialization Time": shard.end_result_serialize_time[i],
+                "Result Size": shard.end_result_size[i],
+            }
+        table.finish(data)
@@ -0,0 +1,157 @@
+import heapq
+import sys
+from array import array
+from collections import namedtuple
+
+# Spark SQL events are written with the package of their class
+SQL_EVENT_PACKAGE = "org.apache.spark.sql.execution.ui."
+SQL_EVENT_TYPES = ("SparkListenerSQLExecutionStart", "SparkListenerSQLExecutionEnd",
+                   "SparkListenerDriverAccumUpdates", "SparkListenerSQLAdaptiveExecutionUpdate")
+# The job property that tells the SQL execution a job runs for
+SQL_EXECUTION_ID_PROPERTY = "spark.sql.execution.id"
+
+MAX_DESCRIPTION_LENGTH = 200
+# Metric types whose values are durations, and their unit in ms
+TIMING_METRIC_TYPES = {"timing": 1, "nsTiming": 1e-6}
+REPORT_TOP = 20
+
+SQLMetric = namedtuple("SQLMetric", ["node", "name", "type"])  # node is the index of the operator in its SQLPlan
+
+
+class SQLPlan:
+    """
+    The physical plan of an SQL execution ("sparkPlanInfo"), kept compact: one entry per operator, in depth first
+    order, with its name and the index of its parent (-1 for the root), and the SQL metrics of the operators by
+    accumulator id. The plan description strings, often bigger than the rest of the log, are dropped.
+    """
+
+    __slots__ = ("names", "parents", "metrics")
+
+    def __init__(self, plan_info):
+        self.names = []
+        self.parents = array("i")
+        self.metrics = {}  # accumulator id -> SQLMetric
+        stack = [(plan_info, -1)]
+        while stack:
+            node_info, parent = stack.pop()
+            node = len(self.names)
+            self.names.append(sys.intern(node_info["nodeName"]))
+            self.parents.append(parent)
+            for metric in node_info.get("metrics", ()):
+                self.metrics[metric["accumulatorId"]] = SQLMetric(node, sys.intern(metric["name"]),
+                                                                  sys.intern(metric["metricType"]))
+            stack.extend((child, node) for child in reversed(node_info.get("children", ())))
+
+    def __len__(self):
+        return len(self.names)
+
+
+class SQLExecution:
+    """
+    {
+      "Event": "org.apache.spark.sql.execution.ui.SparkListenerSQLExecutionStart",
+      "executionId": 0,
+      "description": "select count(*) from t",
+      "details": "...",
+      "physicalPlanDescription": "== Physical Plan ==\\n...",
+      "sparkPlanInfo": {
+        "nodeName": "HashAggregate",
+        "simpleString": "HashAggregate(keys=[], functions=[count(1)])",
+        "children": [...],
+        "metadata": {},
+        "metrics": [{"name": "number of output rows", "accumulatorId": 12, "metricType": "sum"}, ...]
+      },
+      "time": 1499523032866
+    }
+    """
+
+    def __init__(self, data):
+        self.execution_id = data["executionId"]
+        self.description = (data.get("description") or "")[:MAX_DESCRIPTION_LENGTH]
+        self.start_time = data["time"]
+        self.end_time = None
+        self.plan = SQLPlan(data["sparkPlanInfo"])
+        self.metric_values = {}  # accumulator id -> value, for the metrics of the plan
+        self.job_ids = []  # linked by LogParser.finalize
+
+    def update_plan(self, data):
+        """ "SparkListenerSQLAdaptiveExecutionUpdate": adaptive query execution replaced the plan. """
+        self.plan = SQLPlan(data["sparkPlanInfo"])
+
+    def complete(self, data):
+        self.end_time = data["time"]
+
+    def get_wall_time(self):
+        """ ms from start to end, None while the execution runs. """
+        return self.end_time - self.start_time if self.end_time is not None else None
+
+    def operator_metrics(self):
+        """ Returns a list, per operator of the plan, of {metric name: value} of the metrics that have a value. """
+        metrics = [{} for _ in range(len(self.plan))]
+        for accumulator_id, metric in self.plan.metrics.items():
+            value = self.metric_values.get(accumulator_id)
+            if value is not None:
+                metrics[metric.node][metric.name] = value
+        return metrics
+
+    def operator_times(self):
+        """ Returns a list of the time (ms) of each operator of the plan: the sum of its timing metrics. """
+        times = [0.0] * len(self.plan)
+        for accumulator_id, metric in self.plan.metrics.items():
+            unit = TIMING_METRIC_TYPES.get(metric.type)
+            value = self.metric_values.get(accumulator_id)
+            if unit is not None and value is not None:
+                times[metric.node] += value * unit
+        return times
+
+
+def stages_task_time(jobs):
+    """ Sum of the task runtimes (ms) of the stages of jobs, each stage attempt counted once. """
+    seen = set()
+    total = 0
+    for job in jobs:
+        for stage in job.stages:
+            key = (stage.stage_id, stage.attempt_id)
+            if key not in seen and len(stage.tasks) > 0:
+                seen.add(key)
+                total += stage.tasks.total_runtime()
+    return total
+
+
+def write_sql_report(out, log_parser, top=REPORT_TOP):
+    """
+    Writes the slowest SQL executions, with their jobs and task time, and the operators that took the most time
+    according to their timing metrics: each one, and per operator name over all executions.
+    """
+    executions = log_parser.sql_executions
+    out.write("In total, there are {} SQL executions\n".format(len(executions)))
+    if not executions:
+        return
+
+    out.write("Slowest executions:\n")
+    slowest = heapq.nlargest(top, executions.values(), key=lambda e: e.get_wall_time() or 0)
+    for execution in slowest:
+        jobs = [log_parser.jobs[job_id] for job_id in execution.job_ids]
+        out.write("\tExecution {}: {}ms wall time, {} jobs, {}ms task time: {}\n".format(
+            execution.execution_id, execution.get_wall_time(), len(jobs), stages_task_time(jobs),
+            execution.description.replace("\n", " ")))
+
+    operators = []  # (time, execution id, operator index, operator name)
+    times_by_name = {}  # operator name -> [total time, number of operators]
+    for execution in executions.values():
+        for node, time in enumerate(execution.operator_times()):
+            if time > 0:
+                name = execution.plan.names[node]
+                operators.append((time, execution.execution_id, node, name))
+                total = times_by_name.setdefault(name, [0.0, 0])
+                total[0] += time
+                total[1] += 1
+    if not operators:
+        out.write("No timing metrics in the SQL plans\n")
+        return
+    out.write("Heaviest operators (by their timing metrics):\n")
+    for time, execution_id, node, name in heapq.nlargest(top, operators):
+        out.write("\t{} (operator {} of execution {}): {:.0f}ms\n".format(name, node, execution_id, time))
+    out.write("Time per operator name:\n")
+    for name, (time, count) in heapq.nlargest(top, times_by_name.items(), key=lambda item: item[1][0]):
+        out.write("\t{}: {:.0f}ms over {} operators\n".format(name, time, count))
@@ -0,0 +1,35 @@
+import os
+import pickle
+import struct
+import zlib
+
+MAGIC = b"SPARKLOGPARSER"
+# Bump when parsed state changes shape (new attributes, other meaning), so that saved states are not loaded anymore.
+STATE_VERSION = 9
+
+_header = struct.Struct(f"<{len(MAGIC)}sI")
+
+
+def dump_state(obj, path):
+    """ Saves obj (e.g. a LogParser) to path: a version stamped, compressed pickle, written atomically. """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as state_file:
+        state_file.write(_header.pack(MAGIC, STATE_VERSION))
+        state_file.write(zlib.compress(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL), 1))
+    os.replace(temporary_path, path)
+
+
+def load_state(path):
+    """ Returns the object saved by dump_state, or None if there is none or it was saved by another version. """
+    try:
+        with open(path, "rb") as state_file:
+            header = state_file.read(_header.size)
+            if len(header) != _header.size or _header.unpack(header) != (MAGIC, STATE_VERSION):
+                return None
+            return pickle.loads(zlib.decompress(state_file.read()))
+    except FileNotFoundError:
+        return None
+    except (zlib.error, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        # Truncated or written by incompatible code: as good as no state.
+        return None
@@ -0,0 +1,78 @@
+from collections import namedtuple
+
+import numpy
+
+# A task is a straggler when it runs longer than STRAGGLER_FACTOR times the median runtime of its group.
+STRAGGLER_FACTOR = 3.0
+PERCENTILES = (50, 90, 99)
+
+RuntimeStats = namedtuple("RuntimeStats", ["count", "mean", "p50", "p90", "p99", "max", "skew", "stragglers"])
+RuntimeStats.__doc__ = """
+Distribution of the task runtimes (ms) of a group of tasks, e.g. of a stage or an executor. skew is max / median
+(None when the median is 0) and stragglers the ids of the tasks longer than STRAGGLER_FACTOR times the median
+(None when they are not known).
+"""
+
+
+def group_runtime_stats(keys, runtimes, task_ids):
+    """
+    Returns a dict key -> RuntimeStats of the tasks of each key, given one key, runtime and task id per task.
+    All groups are computed at once with numpy: one sort by (key, runtime), then percentiles are read at their
+    positions in each group, as numpy.percentile does with linear interpolation.
+    """
+    if len(keys) == 0:
+        return {}
+    if keys.min() >= 0 and keys.max() < 1 << 23 and runtimes.min() >= 0 and runtimes.max() < 1 << 40:
+        # Both fit in one int64, which sorts several times faster than lexsort
+        order = numpy.argsort((keys.astype(numpy.int64) << 40) | runtimes)
+    else:
+        order = numpy.lexsort((runtimes, keys))
+    sorted_keys = keys[order]
+    sorted_runtimes = runtimes[order].astype(numpy.float64)
+    starts = numpy.concatenate(([0], numpy.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1))
+    counts = numpy.diff(numpy.append(starts, len(keys)))
+
+    percentiles = []
+    for q in PERCENTILES:
+        position = starts + (counts - 1) * (q / 100)
+        below = numpy.floor(position).astype(numpy.int64)
+        above = numpy.ceil(position).astype(numpy.int64)
+        percentiles.append(sorted_runtimes[below]
+                           + (sorted_runtimes[above] - sorted_runtimes[below]) * (position - below))
+    medians = percentiles[0]
+    maxima = sorted_runtimes[starts + counts - 1]
+    means = numpy.add.reduceat(sorted_runtimes, starts) / counts
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        skews = maxima / medians
+
+    # Stragglers, in the order of the sort: by group, then by runtime
+    group_of_sorted = numpy.repeat(numpy.arange(len(starts)), counts)
+    is_straggler = sorted_runtimes > STRAGGLER_FACTOR * medians[group_of_sorted]
+    is_straggler &= medians[group_of_sorted] > 0
+    straggler_groups = group_of_sorted[is_straggler]
+    straggler_ids = task_ids[order][is_straggler]
+    straggler_bounds = numpy.searchsorted(straggler_groups, numpy.arange(len(starts) + 1))
+
+    stats = {}
+    for group, start in enumerate(starts):
+        stats[int(sorted_keys[start])] = RuntimeStats(
+            count=int(counts[group]), mean=float(means[group]),
+            p50=float(percentiles[0][group]), p90=float(percentiles[1][group]), p99=float(percentiles[2][group]),
+            max=float(maxima[group]), skew=float(skews[group]) if medians[group] > 0 else None,
+            stragglers=straggler_ids[straggler_bounds[group]:straggler_bounds[group + 1]][::-1])
+    return stats
+
+
+def report_runtime_stats(stats, pfx, max_stragglers=10):
+    """ Report lines of stats (a RuntimeStats), prefixed with pfx. Only the max_stragglers longest are listed. """
+    s = pfx + "Task runtime p50/p90/p99/max: {:.0f}/{:.0f}/{:.0f}/{:.0f}ms\n".format(
+        stats.p50, stats.p90, stats.p99, stats.max)
+    s += pfx + "Task runtime skew (max/median): {}\n".format(
+        "{:.2f}".format(stats.skew) if stats.skew is not None else None)
+    if stats.stragglers is None:
+        return s  # not known, e.g. in streaming mode
+    stragglers = [int(task_id) for task_id in stats.stragglers[:max_stragglers]]
+    s += pfx + "Stragglers (> {:g}x median): {}{}{}\n".format(
+        STRAGGLER_FACTOR, len(stats.stragglers), " " + str(stragglers) if stragglers else "",
+        " ..." if len(stats.stragglers) > max_stragglers else "")
+    return s
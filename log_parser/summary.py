@@ -0,0 +1,18 @@
+class ApplicationSummary:
+    """
+    The part of a parsed application that the analysis needs. Unlike a whole LogParser it is small and cheap to
+    pickle, so it can be sent back from a worker process.
+    """
+
+    def __init__(self, app_name, app_id, stages_times):
+        self.app_name = app_name
+        self.app_id = app_id
+        self.stages_times = stages_times  # stage id -> completion time (ms)
+
+    @classmethod
+    def from_log_parser(cls, log_parser):
+        stages_times = {}
+        for job in log_parser.jobs.values():
+            for stage in job.stages:
+                stages_times[stage.stage_id] = stage.get_completion_time()
+        return cls(log_parser.get_app_name(), log_parser.get_app_id(), stages_times)
@@ -0,0 +1,255 @@
+from array import array
+
+import numpy
+
+from log_parser.job import Task
+from log_parser.quality import TASK_END_WITHOUT_START
+from log_parser.quality import OrphanEventError
+
+
+class TaskTable:
+    """
+    All tasks of an application, stored column by column in `array` columns (one row per task) instead of one
+    object per task. Strings (executor id, locality, end reason, task type) are interned in `strings` and the
+    columns hold their codes; code 0 stands for None.
+
+    The table behaves like the former `{task_id: Task}` dict: `len`, `in`, `[task_id]`, `keys()` and `values()`,
+    where a Task is a light view over one row.
+    """
+
+    INT_COLUMNS = ("task_id", "stage_id", "stage_attempt_id", "launch_time", "finish_time", "getting_result_time",
+                   "index", "disk_spilled_bytes", "memory_spilled_bytes", "executor_deserialize_time",
+                   "executor_run_time", "jvm_gc_time", "result_serialize_time", "result_size")
+    STRING_COLUMNS = ("executor", "locality", "end_reason", "type")
+    FLAG_COLUMNS = ("speculative", "failed", "finished", "has_metrics")
+
+    def __init__(self):
+        for name in self.INT_COLUMNS:
+            setattr(self, name, array("q"))
+        for name in self.STRING_COLUMNS:
+            setattr(self, name, array("i"))
+        for name in self.FLAG_COLUMNS:
+            setattr(self, name, array("b"))
+
+        self.strings = [None]
+        self.string_codes = {None: 0}
+
+        self.running = {}  # task id -> row, for the tasks that have started but not finished yet
+        self.max_task_id = -1
+        self._rows_by_task_id = None  # (sorted task ids, their rows), built on demand
+        self._recent_rows = {}  # task id -> row, for the rows added since _rows_by_task_id was built
+
+    def intern(self, s):
+        code = self.string_codes.get(s)
+        if code is None:
+            code = len(self.strings)
+            self.strings.append(s)
+            self.string_codes[s] = code
+        return code
+
+    def column(self, name):
+        """ Returns a column as a numpy array (a view, so do not keep it while tasks are being added). """
+        return numpy.frombuffer(getattr(self, name), dtype=getattr(self, name).typecode)
+
+    def find_row(self, task_id):
+        row = self.running.get(task_id)
+        if row is not None:
+            return row
+        if task_id > self.max_task_id:
+            return None
+        row = self._recent_rows.get(task_id)
+        if row is not None:
+            return row
+        if self._rows_by_task_id is None:
+            task_ids = self.column("task_id")
+            rows = numpy.argsort(task_ids, kind="stable")
+            self._rows_by_task_id = (task_ids[rows], rows)
+            self._recent_rows = {}
+        task_ids, rows = self._rows_by_task_id
+        i = numpy.searchsorted(task_ids, task_id, side="right") - 1
+        if i >= 0 and task_ids[i] == task_id:
+            return int(rows[i])
+        return None
+
+    def start(self, data):
+        """
+        {
+          "Event": "SparkListenerTaskStart",
+          "Stage ID": 0,
+          "Stage Attempt ID": 0,
+          "Task Info": {
+            "Task ID": 1,
+            "Index": 1,
+            "Attempt": 0,
+            "Launch Time": 1499523032866,
+            "Executor ID": "7",
+            "Host": "172.31.47.174",
+            "Locality": "PROCESS_LOCAL",
+            "Speculative": false,
+            "Getting Result Time": 0,
+            "Finish Time": 0,
+            "Failed": false,
+            "Accumulables": []
+            }
+        }
+        """
+        task_id = data["Task Info"]["Task ID"]
+        row = self.find_row(task_id)
+        if row is None:
+            row = len(self.task_id)
+            for name in self.INT_COLUMNS + self.STRING_COLUMNS + self.FLAG_COLUMNS:
+                getattr(self, name).append(0)
+            self.max_task_id = max(self.max_task_id, task_id)
+            if self._rows_by_task_id is not None:
+                # Task ids out of order (e.g. tasks of concurrent stages) are found in _recent_rows, without sorting
+                # the table again at each of them; it is sorted again once they are as many as the sorted rows.
+                self._recent_rows[task_id] = row
+                if len(self._recent_rows) > len(self._rows_by_task_id[0]):
+                    self._rows_by_task_id = None
+                    self._recent_rows = {}
+        else:
+            # A task started again replaces the former one, as it did in the `{task_id: Task}` dict.
+            for name in self.INT_COLUMNS + self.STRING_COLUMNS + self.FLAG_COLUMNS:
+                getattr(self, name)[row] = 0
+        self.running[task_id] = row
+
+        self.task_id[row] = task_id
+        self.stage_id[row] = data["Stage ID"]
+        self.stage_attempt_id[row] = data["Stage Attempt ID"]
+        self.executor[row] = self.intern(data["Task Info"]["Executor ID"])
+
+        self.launch_time[row] = data["Task Info"]["Launch Time"]
+        self.locality[row] = self.intern(data["Task Info"]["Locality"])
+        self.speculative[row] = data["Task Info"]["Speculative"]
+        return row
+
+    def finish(self, data):
+        """
+        {
+          "Event": "SparkListenerTaskEnd",
+          "Stage ID": 0,
+          "Stage Attempt ID": 0,
+          "Task Type": "ResultTask",
+          "Task End Reason": {
+            "Reason": "Success"
+          },
+          "Task Info": {
+            "Task ID": 0,
+            "Index": 0,
+            "Attempt": 0,
+            "Launch Time": 1499523032831,
+            "Executor ID": "6",
+            "Host": "172.31.47.174",
+            "Locality": "PROCESS_LOCAL",
+            "Speculative": false,
+            "Getting Result Time": 0,
+            "Finish Time": 1499523035339,
+            "Failed": false,
+            "Accumulables": [
+              {
+                "ID": 0,
+                "Name": "internal.metrics.executorDeserializeTime",
+                "Update": 1945,
+                "Value": 1945,
+                "Internal": true,
+                "Count Failed Values": true
+              },...
+        """
+        task_id = data["Task Info"]["Task ID"]
+        row = self.running.pop(task_id, None)
+        if row is None:
+            row = self.find_row(task_id)
+            if row is None:
+                raise OrphanEventError(TASK_END_WITHOUT_START, task_id)
+
+        self.end_reason[row] = self.intern(data["Task End Reason"]["Reason"])
+        self.failed[row] = data["Task Info"]["Failed"]
+        self.finish_time[row] = data["Task Info"]["Finish Time"]
+        self.finished[row] = True
+        self.getting_result_time[row] = data["Task Info"]["Getting Result Time"]
+        self.index[row] = data["Task Info"]["Index"]
+        self.type[row] = self.intern(data["Task Type"])  # "Task Type": "ResultTask"
+
+        if "Task Metrics" in data:
+            metrics = data["Task Metrics"]
+            self.has_metrics[row] = True
+            self.disk_spilled_bytes[row] = metrics["Disk Bytes Spilled"]
+            self.memory_spilled_bytes[row] = metrics["Memory Bytes Spilled"]
+            self.executor_deserialize_time[row] = metrics["Executor Deserialize Time"]
+            self.executor_run_time[row] = metrics["Executor Run Time"]
+            self.jvm_gc_time[row] = metrics["JVM GC Time"]
+            self.result_serialize_time[row] = metrics["Result Serialization Time"]
+            self.result_size[row] = metrics["Result Size"]
+        return row
+
+    def group_rows(self, keys):
+        """
+        Groups the rows by `keys` (one integer per row). Returns a dict key -> numpy array of its rows, in row order.
+        """
+        order = numpy.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        boundaries = numpy.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+        starts = numpy.concatenate(([0], boundaries)) if len(keys) > 0 else boundaries
+        return {int(sorted_keys[start]): rows for start, rows in zip(starts, numpy.split(order, boundaries))}
+
+    def runtimes(self, rows=None):
+        """ finish - launch time per row, with 0 as finish time of the tasks that did not finish. """
+        runtimes = self.column("finish_time") - self.column("launch_time")
+        return runtimes if rows is None else runtimes[rows]
+
+    def __len__(self):
+        return len(self.task_id)
+
+    def __contains__(self, task_id):
+        return self.find_row(task_id) is not None
+
+    def __getitem__(self, task_id):
+        row = self.find_row(task_id)
+        if row is None:
+            raise KeyError(task_id)
+        return Task(self, row)
+
+    def keys(self):
+        return iter(self.task_id)
+
+    def values(self):
+        return (Task(self, row) for row in range(len(self)))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_rows_by_task_id"] = None
+        state["_recent_rows"] = {}
+        return state
+
+
+class TaskList:
+    """ Some rows of a TaskTable, e.g. the tasks of one stage or of one executor. """
+
+    __slots__ = ("table", "rows")
+
+    def __init__(self, table, rows):
+        self.table = table
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return (Task(self.table, int(row)) for row in self.rows)
+
+    def column(self, name):
+        return self.table.column(name)[self.rows]
+
+    def runtimes(self):
+        return self.table.runtimes(self.rows)
+
+    def mean_runtime(self):
+        return float(self.runtimes().sum()) / len(self)
+
+    def total_runtime(self):
+        return int(self.runtimes().sum())
+
+    def runtime_moments(self):
+        """ (mean, std, min, max) of the runtimes. """
+        runtimes = self.runtimes()
+        return runtimes.mean(), runtimes.std(), runtimes.min(), runtimes.max()
@@ -0,0 +1,114 @@
+from collections import namedtuple
+
+import numpy
+
+# Number of points of the downsampled concurrency series
+NUM_BUCKETS = 40
+
+Utilization = namedtuple("Utilization", ["start", "end", "busy_core_ms", "capacity_core_ms", "idle_core_ms",
+                                         "utilization", "max_concurrency", "concurrency", "cores"])
+Utilization.__doc__ = """
+How busy cores were from start to end (ms timestamps). busy_core_ms is the run time of the tasks in that window,
+capacity_core_ms the cores available times their lifetime, idle_core_ms the difference and utilization the percentage
+of capacity that was busy (None without capacity). concurrency and cores are series of NUM_BUCKETS values: the average
+number of running tasks and of available cores in each of NUM_BUCKETS equal slices of the window.
+"""
+
+
+def step_integral(starts, ends, weights=None):
+    """
+    Sweep-line over the intervals [starts, ends): returns (times, integral, maximum) where times are the sorted
+    interval bounds, integral the area (ms times weight) below the sum of the intervals up to each time, and maximum
+    the highest sum of weights at any time. Between two times the integral is linear, see numpy.interp.
+    """
+    if weights is None:
+        weights = numpy.ones(len(starts), dtype=numpy.int64)
+    times = numpy.concatenate((starts, ends)).astype(numpy.int64)
+    deltas = numpy.concatenate((weights, -weights))
+    # At equal times, intervals end before others start: touching intervals do not overlap.
+    order = numpy.argsort(times * 2 + (deltas > 0))
+    times = times[order]
+    level = numpy.cumsum(deltas[order])
+    integral = numpy.concatenate(([0], numpy.cumsum(level[:-1] * numpy.diff(times))))
+    return times, integral, int(level.max()) if len(level) else 0
+
+
+def _buckets(times, integral, start, end):
+    """ Average value of the step function of (times, integral) in each of NUM_BUCKETS slices of [start, end]. """
+    edges = numpy.linspace(start, end, NUM_BUCKETS + 1)
+    if len(times) == 0 or end <= start:
+        return numpy.zeros(NUM_BUCKETS)
+    return numpy.diff(numpy.interp(edges, times, integral)) / (edges[1] - edges[0])
+
+
+def utilization(launch_times, finish_times, start, end, core_starts, core_ends, cores):
+    """
+    Utilization of the cores of (core_starts, core_ends, cores): one interval per executor, by the tasks of
+    (launch_times, finish_times), both clipped to [start, end].
+    """
+    launch_times = numpy.clip(launch_times, start, end)
+    finish_times = numpy.clip(finish_times, start, end)
+    task_times, task_integral, max_concurrency = step_integral(launch_times, finish_times)
+    core_times, core_integral, _ = step_integral(numpy.clip(core_starts, start, end), numpy.clip(core_ends, start, end),
+                                                 numpy.asarray(cores, dtype=numpy.int64))
+    busy = int(task_integral[-1]) if len(task_integral) else 0
+    capacity = int(core_integral[-1]) if len(core_integral) else 0
+    return Utilization(
+        start=start, end=end, busy_core_ms=busy, capacity_core_ms=capacity, idle_core_ms=max(capacity - busy, 0),
+        utilization=100 * busy / capacity if capacity > 0 else None, max_concurrency=max_concurrency,
+        concurrency=_buckets(task_times, task_integral, start, end),
+        cores=_buckets(core_times, core_integral, start, end))
+
+
+def _finished(tasks):
+    if len(tasks) == 0:
+        return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+    finished = tasks.column("finished").astype(bool)
+    return tasks.column("launch_time")[finished], tasks.column("finish_time")[finished]
+
+
+def executor_utilization(executor, app_end):
+    """ Utilization of executor over its lifetime, which ends at app_end if it was not removed. """
+    end = executor.remove_timestamp or app_end
+    launch_times, finish_times = _finished(executor.tasks)
+    return utilization(launch_times, finish_times, executor.start_timestamp, end,
+                       [executor.start_timestamp], [end], [executor.total_cores])
+
+
+def cluster_utilization(log_parser):
+    """
+    Utilization of all executors of log_parser together, from the start to the end of the application (or, while
+    it runs, to the last task finish time) and a dict executor id -> Utilization of each executor.
+    """
+    tasks = log_parser.tasks
+    launch_times, finish_times = _finished(tasks)
+    start = log_parser.parsed_data.get("app_start_timestamp")
+    end = log_parser.parsed_data.get("app_end_timestamp")
+    if end is None:
+        end = max([int(finish_times.max()) if len(finish_times) else 0] +
+                  [e.remove_timestamp or 0 for e in log_parser.executors.values()])
+    if start is None:
+        start = min([e.start_timestamp for e in log_parser.executors.values()], default=end)
+
+    executors = list(log_parser.executors.values())
+    cluster = utilization(launch_times, finish_times, start, end,
+                          [e.start_timestamp for e in executors], [e.remove_timestamp or end for e in executors],
+                          [e.total_cores for e in executors])
+    return cluster, {e.executor_id: executor_utilization(e, end) for e in executors}
+
+
+def write_utilization_report(out, cluster, executors):
+    def summary(u):
+        return "{:.1f} busy of {:.1f} core-s ({}), {:.1f} idle core-s, at most {} tasks at once".format(
+            u.busy_core_ms / 1000, u.capacity_core_ms / 1000,
+            "{:.1f}%".format(u.utilization) if u.utilization is not None else "n/a",
+            u.idle_core_ms / 1000, u.max_concurrency)
+
+    out.write("Cluster: {}\n".format(summary(cluster)))
+    out.write("\tRunning tasks / cores, per {:.0f}ms: {}\n".format(
+        (cluster.end - cluster.start) / NUM_BUCKETS,
+        " ".join("{:.1f}/{:.0f}".format(c, k) for c, k in zip(cluster.concurrency, cluster.cores))))
+    for executor_id, u in executors.items():
+        out.write("Executor {}: {}\n".format(executor_id, summary(u)))
+        out.write("\tRunning tasks, per {:.0f}ms: {}\n".format(
+            (u.end - u.start) / NUM_BUCKETS, " ".join("{:.1f}".format(c) for c in u.concurrency)))
@@ -0,0 +1,96 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import time
+
+# inotify(7) events that can make a log appear, finish or disappear. Appends to an in-progress log (IN_MODIFY) are
+# left out: such a log is parsed once Spark renames it, which is an IN_MOVED_TO.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# After a first event, events are collected for this long (s) so that a burst (e.g. a rolling log directory being
+# copied) wakes the watcher once.
+SETTLE_TIME = 0.5
+
+
+class PollingWatcher:
+    """ Wakes up every poll interval: the fallback where inotify is not available (not Linux, network file systems). """
+
+    def watch(self, directory):
+        pass
+
+    def wait(self, timeout):
+        """ Returns after timeout seconds, False: nothing is known to have changed. """
+        time.sleep(timeout)
+        return False
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Wakes up when a directory it watches changes, through Linux inotify (called with ctypes, without a dependency).
+    The events themselves are not read: the caller scans the directory again, which also catches what happened while
+    it was not waiting. Raises OSError where inotify is not available.
+    """
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        try:
+            self._inotify_add_watch = libc.inotify_add_watch
+            inotify_init1 = libc.inotify_init1
+        except AttributeError:
+            raise OSError("inotify is not available on this system")
+        self._inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def watch(self, directory):
+        """ Watches directory (not its subdirectories); watching it again does nothing. """
+        # Fails when directory was removed since it was listed, or when out of watches (see
+        # fs.inotify.max_user_watches): changes are then only found by the next poll.
+        self._inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+
+    def _drain(self):
+        try:
+            while os.read(self.fd, 1 << 16):
+                pass
+        except BlockingIOError:
+            pass
+
+    def wait(self, timeout):
+        """ Returns True as soon as a watched directory changed, False after timeout seconds without a change. """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        time.sleep(SETTLE_TIME)
+        self._drain()
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+def get_watcher(use_inotify=True):
+    """ An InotifyWatcher where possible, a PollingWatcher otherwise. """
+    if use_inotify:
+        try:
+            return InotifyWatcher()
+        except OSError:
+            pass
+    return PollingWatcher()
+
+
+def watch_tree(watcher, directory):
+    """ Has watcher watch directory and its subdirectories, hidden ones excepted as in find_event_logs. """
+    for root, dirs, _ in os.walk(directory):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        watcher.watch(root)
@@ -1,70 +1,423 @@
 import os
 import sys
-import glob
 import re
 import json
+import argparse
 from collections import defaultdict
+from collections import namedtuple
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from slugify import slugify
 
 from analysis.plot import plot_all_stages
+from log_parser.cache import ParseCache
+from log_parser.compare import REGRESSION_THRESHOLD
+from log_parser.compare import ApplicationProfile
+from log_parser.compare import compare_profiles
+from log_parser.compare import pair_profiles
+from log_parser.compare import write_comparison_report
+from log_parser.dag import render_dot_file
+from log_parser.event_log import find_event_logs
+from log_parser.event_log import is_in_progress
+from log_parser.export import FORMATS
+from log_parser.export import export_application
+from log_parser.export import get_writer_class
+from log_parser.metadata import scan_metadata
 from log_parser.parser import LogParser
+from log_parser.profiler import ParseProfile
+from log_parser.service import MAX_APPLICATIONS
+from log_parser.service import MAX_QUEUE
+from log_parser.service import POLL_INTERVAL
+from log_parser.service import REPORT_MAX_TASKS
+from log_parser.service import WatchService
+from log_parser.summary import ApplicationSummary
 
+REPORT_BUFFER_SIZE = 1 << 20
 
-def parse_application_log(file_path, all_apps, save=True, analyse=False):
-    log_parser = LogParser(file_path)
+ParseResult = namedtuple("ParseResult", ["ok", "summary", "message", "dot_files", "profile"],
+                         defaults=[None, None, (), None])
+
+
+def parse_application_log(file_path, save=True, analyse=False, max_tasks=None, checkpoint_dir=None, cache=None,
+                          dag="render", dag_max_nodes=None, streaming=False, profile=False, export_dir=None,
+                          export_format=None, shard_jobs=1, lenient=False, listeners=None):
+    """
+    Returns a ParseResult. summary is an ApplicationSummary when analyse is set and None otherwise,
+    message is the line to print for this log (or None). max_tasks caps the per-task section of the report.
+    With a checkpoint_dir, in-progress logs are parsed incrementally from the state saved there by the previous run.
+    With a cache (a ParseCache), finished logs that did not change since they were cached are not parsed again.
+    dag is "render" to lay the DAGs out as PDFs, "dot" to only save their DOT sources, which are returned in
+    dot_files to be rendered elsewhere, or "none". RDD DAGs above dag_max_nodes RDDs have their linear chains collapsed.
+    With streaming, tasks are aggregated as they end instead of kept (see LogParser), for logs with too many tasks.
+    With profile, the parse is profiled and the ParseProfile returned (None for a log loaded from the cache).
+    With an export_dir, the parsed application is also written there as tables (see export.py) in export_format.
+    With shard_jobs > 1, a finished log is split into byte ranges parsed by that many processes (see process_sharded).
+    With lenient, problems in the log are counted and skipped instead of failing the parse (see LogParser).
+    listeners (event type -> list of listeners, see LogParser.subscribe) are called with the events parsed; a log
+    in the cache is then parsed again, since a cached parse has no events left to call them with.
+    """
+    log_parser = LogParser(file_path, streaming=streaming, lenient=lenient)
+    if listeners:
+        log_parser.subscribe_all(listeners)
+    parse_profile = ParseProfile(file_path) if profile else None
     try:
-        log_parser.process()
+        if is_in_progress(file_path):
+            if checkpoint_dir is not None:
+                checkpoint_path = os.path.join(checkpoint_dir, slugify(os.path.abspath(file_path)) + ".state")
+                log_parser = LogParser.resume(file_path, checkpoint_path, streaming=streaming, profile=parse_profile,
+                                              lenient=lenient, listeners=listeners)
+            else:
+                log_parser.process(parse_profile)
+        else:
+            cached_log_parser = cache.get(file_path) if cache is not None and not listeners else None
+            if (cached_log_parser is not None and cached_log_parser.streaming == streaming
+                    and cached_log_parser.lenient == lenient):
+                log_parser = cached_log_parser
+                parse_profile = None
+            else:
+                if shard_jobs > 1 and parse_profile is None:
+                    log_parser.process_sharded(shard_jobs)
+                else:
+                    log_parser.process(parse_profile)
+                if cache is not None:
+                    cache.put(file_path, log_parser)
     except (KeyError, json.decoder.JSONDecodeError) as e:
-        name = None
+        # The name is usually among the events parsed before the error: the log is read again only when it is not.
+        name = log_parser.get_app_name()
         try:
-            name = log_parser.process_name_only()
+            if name is None:
+                name = log_parser.process_name_only()
         finally:
-            print(f"error on parse {f'({name}) ' if name else ''}{file_path}, {e}")
-            return
+            return ParseResult(False, message=f"error on parse {f'({name}) ' if name else ''}{file_path}, {e}")
 
     name = log_parser.get_app_name()
     id = log_parser.get_app_id()
-    safe_name = slugify(name+"_"+id)
+    safe_name = slugify(f"{name or ''}_{id or ''}")
     if len(safe_name) == 0:
         safe_name = file_path.split("/")[-1]
 
+    message = None
+    dot_files = []
     if save:
         os.makedirs("parser_output", exist_ok=True)
-        report = log_parser.generate_report()
-        with open(os.path.expanduser(f"parser_output/{safe_name}_report"), "w") as report_file:
-            report_file.write(report)
-        log_parser.save_plot_of_stages_dag(f"parser_output/{safe_name}_stages_dag")
-        log_parser.save_plot_of_rdds_dag(f"parser_output/{safe_name}_RDDs_dag")
-        print(f"Log processing of application '{safe_name}' completed.")
+        with open(os.path.expanduser(f"parser_output/{safe_name}_report"), "w",
+                  buffering=REPORT_BUFFER_SIZE) as report_file:
+            log_parser.write_report(report_file, max_tasks=max_tasks)
+        if dag != "none":
+            render = dag == "render"
+            log_parser.save_plot_of_stages_dag(f"parser_output/{safe_name}_stages_dag", render=render)
+            log_parser.save_plot_of_rdds_dag(f"parser_output/{safe_name}_RDDs_dag", render=render,
+                                             max_nodes=dag_max_nodes)
+            if not render:
+                dot_files = [f"parser_output/{safe_name}_stages_dag", f"parser_output/{safe_name}_RDDs_dag"]
+        message = f"Log processing of application '{safe_name}' completed."
+        if len(log_parser.quality) > 0:
+            message += f" {len(log_parser.quality)} problems found in the log, see the data quality section."
+    if export_dir is not None:
+        export_application(log_parser, export_dir, safe_name, export_format)
+
+    summary = ApplicationSummary.from_log_parser(log_parser) if analyse else None
+    return ParseResult(True, summary, message, dot_files, parse_profile)
+
+
+def parse_application_log_safely(file_path, **kwargs):
+    """ Like parse_application_log, but any error is turned into a message so that one bad log does not stop a run. """
+    try:
+        return parse_application_log(file_path, **kwargs)
+    except Exception as e:
+        return ParseResult(False, message=f"error on parse {file_path}, {type(e).__name__}: {e}")
+
+
+def render_dot_file_safely(dot_file):
+    try:
+        render_dot_file(dot_file)
+        return None
+    except Exception as e:
+        return f"error on render {dot_file}, {type(e).__name__}: {e}"
 
 
-    if analyse:
-        regex = r"query([0-9]*)_cluster_([0-9]*)G"
-        matches = re.finditer(regex, name)
-        for match in matches:
-            groups = list(match.groups())
+def scan_application_log_safely(file_path):
+    try:
+        return True, scan_metadata(file_path), None
+    except Exception as e:
+        return False, None, f"error on scan {file_path}, {type(e).__name__}: {e}"
+
+
+def index_directory(directory, jobs=1):
+    """ Prints one tab separated line per application of the directory, from the header and end of its log only. """
+    files = find_event_logs(directory)
+    print("\t".join(["app_id", "app_name", "spark_version", "start", "end", "duration_ms", "status", "path"]))
+
+    def handle(result):
+        ok, metadata, message = result
+        if not ok:
+            print(message, file=sys.stderr)
+            return
+        start, end = metadata.start_timestamp, metadata.end_timestamp
+        print("\t".join(str(v) for v in [
+            metadata.app_id, metadata.app_name, metadata.spark_version,
+            datetime.fromtimestamp(start / 1000) if start else None,
+            datetime.fromtimestamp(end / 1000) if end else None,
+            metadata.get_duration(), "in progress" if metadata.in_progress else "finished", metadata.path]))
+
+    if jobs == 1:
+        for file in files:
+            handle(scan_application_log_safely(file))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for result in pool.map(scan_application_log_safely, files, chunksize=16):
+                handle(result)
+
+
+def profile_application_log_safely(file_path, lenient=False):
+    try:
+        log_parser = LogParser(file_path, lenient=lenient)
+        log_parser.process()
+        return True, ApplicationProfile.from_log_parser(log_parser), None
+    except Exception as e:
+        return False, None, f"error on parse {file_path}, {type(e).__name__}: {e}"
 
-            query_number, data_scale =  int(groups[0]), int(groups[1])
-            all_apps[query_number][data_scale] = log_parser
 
-            break
+def compare_directories(baseline_dir, candidate_dir, jobs=1, threshold=REGRESSION_THRESHOLD, output_path=None,
+                        lenient=False):
+    """
+    Compares each application of candidate_dir with the run of the same name in baseline_dir (see compare.py):
+    prints the regressions, writes all the comparisons as JSON to output_path, and returns the number of regressions.
+    """
+    profiles = {}
+    for directory in (baseline_dir, candidate_dir):
+        files = find_event_logs(directory)
+        profile = partial(profile_application_log_safely, lenient=lenient)
+        if jobs <= 1:
+            results = [profile(file) for file in files]
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                results = list(pool.map(profile, files))
+        for ok, _, message in results:
+            if not ok:
+                print(message)
+        profiles[directory] = [profile for ok, profile, _ in results if ok]
 
-def parse_application_log_from_directory(directory):
-    files_and_dirs = glob.glob(directory + "/**", recursive=True)
-    files = [f for f in files_and_dirs if os.path.isfile(f)]
+    pairs, unpaired = pair_profiles(profiles[baseline_dir], profiles[candidate_dir])
+    comparisons = [compare_profiles(baseline, candidate, threshold) for baseline, candidate in pairs]
+    write_comparison_report(sys.stdout, comparisons)
+    for path in unpaired:
+        print(f"No run of the same application to compare with: {path}")
+    num_regressions = sum(len(comparison["regressions"]) for comparison in comparisons)
+    print(f"Compared {len(comparisons)} applications, {num_regressions} regressions.")
+    if output_path is not None:
+        with open(output_path, "w") as output_file:
+            json.dump({"threshold": threshold, "comparisons": comparisons, "unpaired": unpaired}, output_file,
+                      indent=2)
+    return num_regressions
+
+
+def add_to_all_apps(summary, all_apps):
+    regex = r"query([0-9]*)_cluster_([0-9]*)G"
+    matches = re.finditer(regex, summary.app_name or "")
+    for match in matches:
+        groups = list(match.groups())
+
+        query_number, data_scale = int(groups[0]), int(groups[1])
+        all_apps[query_number][data_scale] = summary
+
+        break
+
+
+def parse_application_log_from_directory(directory, jobs=1, save=True, analyse=False, max_tasks=None,
+                                         checkpoint_dir=None, cache=None, dag="render", dag_max_nodes=None,
+                                         render_jobs=1, streaming=False, profile_path=None, export_dir=None,
+                                         export_format=None, shard_jobs=1, lenient=False, listeners=None):
+    """
+    Parses every log of directory with `jobs` processes. When dag is "render", the parsers only save the DOT sources
+    of the DAGs, and `render_jobs` other processes lay them out meanwhile, so that a big DAG does not hold up parsing.
+    With a profile_path, the parses are profiled and their profiles, with their total, are written there as JSON.
+    With an export_dir, the applications are written there as tables, one file per application and table.
+    listeners are passed to parse_application_log; with jobs > 1 they must be picklable (e.g. module functions).
+    """
+    files = find_event_logs(directory)
 
     apps = defaultdict(dict)
+    num_failed = 0
+    renders = []
+    profiles = []
 
-    for file in files:
-        parse_application_log(file, apps, save=True, analyse=False)
+    # Graphviz runs in its own process anyway: threads are enough to wait for it.
+    render_pool = ThreadPoolExecutor(max_workers=render_jobs) if dag == "render" else None
 
+    def handle(index, result):
+        nonlocal num_failed
+        if not result.ok:
+            num_failed += 1
+        if result.message:
+            print(f"[{index + 1}/{len(files)}] {result.message}")
+        if result.summary is not None:
+            add_to_all_apps(result.summary, apps)
+        for dot_file in result.dot_files:
+            if render_pool is not None:
+                renders.append(render_pool.submit(render_dot_file_safely, dot_file))
+        if result.profile is not None:
+            profiles.append(result.profile)
+
+    parse = partial(parse_application_log_safely, save=save, analyse=analyse, max_tasks=max_tasks,
+                    checkpoint_dir=checkpoint_dir, cache=cache, dag="dot" if dag == "render" else dag,
+                    dag_max_nodes=dag_max_nodes, streaming=streaming, profile=profile_path is not None,
+                    export_dir=export_dir, export_format=export_format, shard_jobs=shard_jobs,
+                    lenient=lenient, listeners=listeners)
+    try:
+        if jobs == 1:
+            for index, file in enumerate(files):
+                handle(index, parse(file))
+        else:
+            # map keeps the order of `files`, so the output does not depend on which worker finishes first.
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                for index, result in enumerate(pool.map(parse, files)):
+                    handle(index, result)
+    finally:
+        if render_pool is not None:
+            render_pool.shutdown()
+
+    render_errors = [error for error in (r.result() for r in renders) if error]
+    for error in render_errors:
+        print(error)
+    print(f"Parsed {len(files) - num_failed} of {len(files)} logs, {num_failed} failed."
+          + (f" {len(render_errors)} of {len(renders)} DAGs not rendered." if render_errors else ""))
+
+    if profile_path is not None:
+        total = ParseProfile()
+        for parse_profile in profiles:
+            total.merge(parse_profile)
+        with open(profile_path, "w") as profile_file:
+            json.dump({"total": total.to_dict(), "logs": [p.to_dict() for p in profiles]}, profile_file, indent=2)
+        print(f"Profile of {len(profiles)} parses written to {profile_path}.")
     return apps
 
+
+def number_of_processes(value):
+    """ argparse type of --jobs and the like: a number of processes, or 0 for one per CPU. """
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 (one per CPU) or more, not {number}")
+    return number
+
+
 if __name__ == "__main__":
-    if len(sys.argv) < 1:
-        print("Usage: python3 <main.py> <log_dir>")
-    else:
-        parse_application_log_from_directory(os.path.join(sys.argv[1]))
-        # apps = parse_application_log_from_directory(os.path.join(sys.argv[1]))
-        # plot_all_stages(apps[26], "query_26")
-        # plot_all_stages(apps[52], "query_52")
+    arg_parser = argparse.ArgumentParser(description="Parse the Spark event logs of a history directory.")
+    arg_parser.add_argument("log_dir")
+    arg_parser.add_argument("-j", "--jobs", type=number_of_processes, default=1,
+                            help="number of logs parsed in parallel, 0 for one per CPU (default: 1)")
+    arg_parser.add_argument("--shard-jobs", type=number_of_processes, default=1, metavar="N",
+                            help="split each big uncompressed log into byte ranges parsed by N processes, for single "
+                                 "logs too big for one core; 0 for one per CPU (default: 1)")
+    arg_parser.add_argument("--max-task-report", type=int, default=None, metavar="N",
+                            help="list at most N tasks in the per-task section of the reports")
+    arg_parser.add_argument("--no-task-report", dest="max_task_report", action="store_const", const=0,
+                            help="leave the per-task section out of the reports")
+    arg_parser.add_argument("--streaming", action="store_true",
+                            help="aggregate tasks as they end instead of keeping them, so memory does not grow with "
+                                 "the number of tasks (no per-task section, approximate percentiles)")
+    arg_parser.add_argument("--lenient", action="store_true",
+                            help="count and skip undecodable lines and inconsistent events (e.g. a task end without "
+                                 "its start) instead of failing, and report them in a data quality section")
+    arg_parser.add_argument("--profile", metavar="JSON",
+                            help="write where the parse time goes (per event type: count, bytes, decode and handler "
+                                 "time; wall time, peak memory) to JSON")
+    arg_parser.add_argument("--export", metavar="DIR",
+                            help="also write applications, jobs, stages, RDDs, executors, block managers and tasks as "
+                                 "tables in DIR/<table>/<application>.<format>, to be queried with pandas or DuckDB")
+    arg_parser.add_argument("--export-format", choices=FORMATS, default=None,
+                            help="format of --export tables (default: parquet if pyarrow is installed, csv otherwise)")
+    arg_parser.add_argument("--checkpoint-dir", metavar="DIR",
+                            help="parse in-progress logs incrementally, keeping their state between runs in DIR")
+    arg_parser.add_argument("--cache-dir", metavar="DIR",
+                            help="keep parsed applications in DIR and load them from there while their log is "
+                                 "unchanged")
+    arg_parser.add_argument("--cache-size", type=int, default=1024, metavar="MB",
+                            help="size limit of the cache, least recently used entries are removed (default: 1024)")
+    arg_parser.add_argument("--cache-hash", action="store_true",
+                            help="also key cache entries by a hash of the log content, not only its size and mtime")
+    arg_parser.add_argument("--dag", choices=["render", "dot", "none"], default="render",
+                            help="lay the DAGs out as PDFs with Graphviz, only save their DOT sources, or skip them "
+                                 "(default: render)")
+    arg_parser.add_argument("--dag-max-nodes", type=int, default=None, metavar="N",
+                            help="collapse linear chains of RDDs in RDD DAGs of more than N RDDs")
+    arg_parser.add_argument("--render-jobs", type=number_of_processes, default=1, metavar="N",
+                            help="number of DAGs laid out in parallel, while parsing goes on, 0 for one per CPU "
+                                 "(default: 1)")
+    arg_parser.add_argument("--analyse", action="store_true",
+                            help="fit stage times against the data scale of apps named 'query<N>_cluster_<scale>G' "
+                                 "and save the figures and prediction errors in parser_output/analysis")
+    arg_parser.add_argument("--compare", metavar="BASELINE_DIR",
+                            help="compare each application of log_dir with the run of the same name in BASELINE_DIR, "
+                                 "stage by stage, and exit with status 1 if there are regressions")
+    arg_parser.add_argument("--compare-output", metavar="JSON", help="write the comparisons of --compare to JSON")
+    arg_parser.add_argument("--regression-threshold", type=float, default=REGRESSION_THRESHOLD, metavar="R",
+                            help="relative increase above which a change is a regression (default: %(default)s)")
+    arg_parser.add_argument("--serve", type=int, metavar="PORT",
+                            help="keep running: parse the finished logs of log_dir as they appear, with --jobs "
+                                 "processes, and serve their summaries, stages and reports over HTTP on PORT")
+    arg_parser.add_argument("--serve-host", default="127.0.0.1", metavar="HOST",
+                            help="address --serve listens on (default: %(default)s, local connections only)")
+    arg_parser.add_argument("--serve-max-apps", type=int, default=MAX_APPLICATIONS, metavar="N",
+                            help="parsed applications --serve keeps in memory, least recently used evicted first "
+                                 "(default: %(default)s)")
+    arg_parser.add_argument("--serve-queue", type=int, default=MAX_QUEUE, metavar="N",
+                            help="logs --serve queues for parsing at most, the others wait in log_dir "
+                                 "(default: %(default)s)")
+    arg_parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL, metavar="S",
+                            help="seconds between scans of log_dir by --serve, which also watches it with inotify "
+                                 "where available (default: %(default)s)")
+    arg_parser.add_argument("--no-inotify", dest="inotify", action="store_false",
+                            help="only poll log_dir in --serve, e.g. on network file systems")
+    arg_parser.add_argument("--index", action="store_true",
+                            help="only list the applications of the directory (id, name, times), without parsing them")
+    args = arg_parser.parse_args()
+
+    if args.index:
+        index_directory(os.path.join(args.log_dir), jobs=args.jobs or os.cpu_count())
+        sys.exit()
+
+    if args.compare:
+        num_regressions = compare_directories(args.compare, args.log_dir, jobs=args.jobs or os.cpu_count(),
+                                              threshold=args.regression_threshold, output_path=args.compare_output,
+                                              lenient=args.lenient)
+        sys.exit(1 if num_regressions > 0 else 0)
+
+    if args.serve is not None:
+        cache = None
+        if args.cache_dir:
+            cache = ParseCache(args.cache_dir, max_size=args.cache_size << 20, hash_content=args.cache_hash)
+        service = WatchService(args.log_dir, jobs=args.jobs or os.cpu_count(), max_queue=args.serve_queue,
+                               max_applications=args.serve_max_apps, poll_interval=args.poll_interval,
+                               lenient=args.lenient, streaming=args.streaming,
+                               max_tasks=REPORT_MAX_TASKS if args.max_task_report is None else args.max_task_report,
+                               cache=cache, use_inotify=args.inotify)
+        print(f"Watching {args.log_dir}, serving on http://{args.serve_host}:{args.serve}/applications", flush=True)
+        try:
+            service.serve(args.serve_host, args.serve)
+        except KeyboardInterrupt:
+            pass
+        sys.exit()
+
+    if args.export:
+        try:
+            get_writer_class(args.export_format)
+        except ValueError as e:
+            arg_parser.error(str(e))
+
+    cache = None
+    if args.cache_dir:
+        cache = ParseCache(args.cache_dir, max_size=args.cache_size << 20, hash_content=args.cache_hash)
+    apps = parse_application_log_from_directory(os.path.join(args.log_dir), jobs=args.jobs or os.cpu_count(),
+                                                analyse=args.analyse, max_tasks=args.max_task_report,
+                                                checkpoint_dir=args.checkpoint_dir, cache=cache, dag=args.dag,
+                                                dag_max_nodes=args.dag_max_nodes,
+                                                render_jobs=args.render_jobs or os.cpu_count(),
+                                                streaming=args.streaming, profile_path=args.profile,
+                                                export_dir=args.export, export_format=args.export_format,
+                                                shard_jobs=args.shard_jobs or os.cpu_count(), lenient=args.lenient)
+    for query_number in sorted(apps):
+        figure_path, csv_path = plot_all_stages(apps[query_number], f"query_{query_number}")
+        print(f"Analysis of query {query_number} saved to {figure_path} and {csv_path}.")
@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+# The packages of the repository are imported from its root, as main.py and the benchmarks do.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_log import write_event_log  # noqa: E402
+from log_parser.parser import LogParser  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def event_log(tmp_path_factory):
+    """ A small synthetic event log, with failed and retried tasks, skipped stages and SQL executions. """
+    path = str(tmp_path_factory.mktemp("logs") / "app-synthetic")
+    write_event_log(path, num_jobs=4, stages_per_job=3, tasks_per_stage=40, num_executors=3, failure_rate=0.1,
+                    reused_stages=1, block_updates_per_task=1, sql=True)
+    return path
+
+
+@pytest.fixture
+def parse_report():
+    """ A function of a path (and LogParser keyword arguments): the report of the log, parsed with process(). """
+    def parse_report(path, **kwargs):
+        log_parser = LogParser(path, **kwargs)
+        log_parser.process()
+        return log_parser.generate_report()
+    return parse_report
@@ -0,0 +1,79 @@
+import os
+import shutil
+
+from log_parser.cache import ParseCache
+from log_parser.parser import LogParser
+
+
+def parsed(path):
+    log_parser = LogParser(path)
+    log_parser.process()
+    return log_parser
+
+
+def copy_log(event_log, directory, name):
+    path = str(directory / name)
+    shutil.copyfile(event_log, path)
+    return path
+
+
+def test_unchanged_log_is_loaded_from_the_cache(event_log, tmp_path):
+    path = copy_log(event_log, tmp_path, "app")
+    cache = ParseCache(str(tmp_path / "cache"))
+    os.makedirs(cache.directory)
+    assert cache.get(path) is None
+    log_parser = parsed(path)
+    cache.put(path, log_parser)
+    cached = cache.get(path)
+    assert cached is not None
+    assert cached.generate_report() == log_parser.generate_report()
+
+
+def test_changed_log_is_not_loaded_from_the_cache(event_log, tmp_path):
+    path = copy_log(event_log, tmp_path, "app")
+    cache = ParseCache(str(tmp_path / "cache"))
+    os.makedirs(cache.directory)
+    cache.put(path, parsed(path))
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert cache.get(path) is None
+
+    cache.put(path, parsed(path))
+    with open(path, "a") as log_file:
+        log_file.write('{"Event":"SparkListenerLogStart","Spark Version":"2.4.0"}\n')
+    assert cache.get(path) is None
+
+
+def test_content_hash_tells_logs_of_same_size_and_mtime_apart(event_log, tmp_path):
+    path = copy_log(event_log, tmp_path, "app")
+    cache = ParseCache(str(tmp_path / "cache"), hash_content=True)
+    os.makedirs(cache.directory)
+    cache.put(path, parsed(path))
+    cache_without_hash = ParseCache(cache.directory)
+    cache_without_hash.put(path, parsed(path))
+
+    stat = os.stat(path)
+    with open(path, "r+b") as log_file:
+        log_file.seek(stat.st_size // 2)
+        byte = log_file.read(1)
+        log_file.seek(stat.st_size // 2)
+        log_file.write(b"x" if byte != b"x" else b"y")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.get(path) is None
+    assert cache_without_hash.get(path) is not None  # same size and mtime: a hit without the hash
+
+
+def test_least_recently_used_entries_are_evicted(event_log, tmp_path):
+    cache = ParseCache(str(tmp_path / "cache"))
+    os.makedirs(cache.directory)
+    paths = [copy_log(event_log, tmp_path, name) for name in ("a", "b", "c")]
+    for i, path in enumerate(paths):
+        cache.put(path, parsed(path))
+        os.utime(cache.entry_path(path), (1000 + i, 1000 + i))  # put in order a, b, c
+    cache.get(paths[0])  # a is now the most recently used
+
+    sizes = [os.path.getsize(cache.entry_path(path)) for path in paths]
+    cache.max_size = sum(sizes) - 1
+    cache.evict()
+    assert [cache.get(path) is not None for path in paths] == [True, False, True]
@@ -0,0 +1,16 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("flag", ["--jobs", "--shard-jobs", "--render-jobs"])
+def test_negative_number_of_processes_is_a_usage_error(flag, tmp_path):
+    process = subprocess.run([sys.executable, "main.py", str(tmp_path), flag, "-1"], cwd=ROOT, capture_output=True,
+                             text=True)
+    assert process.returncode == 2
+    assert "must be 0 (one per CPU) or more, not -1" in process.stderr
+    assert "Traceback" not in process.stderr
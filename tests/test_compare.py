@@ -0,0 +1,94 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+from log_parser.compare import ApplicationProfile
+from log_parser.compare import _change
+from log_parser.compare import compare_profiles
+from log_parser.compare import stage_keys
+from log_parser.parser import LogParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def profile(path):
+    log_parser = LogParser(path)
+    log_parser.process()
+    return ApplicationProfile.from_log_parser(log_parser)
+
+
+def write_slower_log(event_log, path, factor):
+    """ Writes to path event_log with every stage running factor times longer. """
+    with open(event_log) as log_file, open(path, "w") as slower_file:
+        for line in log_file:
+            if '"Event":"SparkListenerStageCompleted"' in line:
+                event = json.loads(line)
+                info = event["Stage Info"]
+                info["Completion Time"] = info["Submission Time"] + factor * (info["Completion Time"]
+                                                                              - info["Submission Time"])
+                line = json.dumps(event, separators=(",", ":")) + "\n"
+            slower_file.write(line)
+    return path
+
+
+def test_stage_keys_are_unique_and_skip_skipped_stages(event_log):
+    log_parser = LogParser(event_log)
+    log_parser.process()
+    keys = [key for key, _ in stage_keys(log_parser)]
+    assert len(keys) == len(set(keys))
+    num_stages_that_ran = sum(1 for job in log_parser.jobs.values() for stage in job.stages
+                              if stage.submission_time is not None)
+    assert len(keys) == num_stages_that_ran
+
+
+def test_log_compared_with_itself_has_no_regressions(event_log):
+    comparison = compare_profiles(profile(event_log), profile(event_log))
+    assert comparison["regressions"] == []
+    assert comparison["only_in_baseline"] == [] and comparison["only_in_candidate"] == []
+    assert len(comparison["stages"]) > 0
+    assert all(change["delta"] in (0, None) for stage in comparison["stages"] for change in stage["changes"])
+
+
+def test_slower_candidate_is_flagged(event_log, tmp_path):
+    baseline = profile(event_log)
+    comparison = compare_profiles(baseline, profile(write_slower_log(event_log, str(tmp_path / "slower"), 4)))
+    assert {(r["metric"], r["stage"]) for r in comparison["regressions"]} \
+        == {("duration_ms", key) for key in baseline.stages}
+    assert all(r["ratio"] == 4 for r in comparison["regressions"])
+
+
+def test_change_of_zero_and_unknown_baselines():
+    # No ratio to a zero baseline: the absolute change decides
+    assert _change("spilled_bytes", 0, 1 << 30, 0.2) \
+        == {"metric": "spilled_bytes", "baseline": 0, "candidate": 1 << 30, "delta": 1 << 30, "ratio": None,
+            "regression": True}
+    assert _change("spilled_bytes", 0, 1, 0.2)["regression"] is False
+    for baseline, candidate in ((None, 10), (10, None), (None, None)):
+        change = _change("duration_ms", baseline, candidate, 0.2)
+        assert (change["delta"], change["ratio"], change["regression"]) == (None, None, False)
+    # "tasks" has no minimum change: it is never a regression
+    assert _change("tasks", 10, 100, 0.2)["regression"] is False
+
+
+def run_compare(baseline_dir, candidate_dir, tmp_path):
+    output = str(tmp_path / "comparison.json")
+    process = subprocess.run([sys.executable, "main.py", str(candidate_dir), "--compare", str(baseline_dir),
+                              "--compare-output", output], cwd=ROOT, capture_output=True, text=True)
+    with open(output) as output_file:
+        return process.returncode, json.load(output_file)
+
+
+def test_compare_exit_status_tells_regressions(event_log, tmp_path):
+    baseline_dir, same_dir, slower_dir = tmp_path / "baseline", tmp_path / "same", tmp_path / "slower"
+    for directory in (baseline_dir, same_dir, slower_dir):
+        directory.mkdir()
+    for directory in (baseline_dir, same_dir):
+        shutil.copyfile(event_log, directory / "app")
+    write_slower_log(event_log, str(slower_dir / "app"), 4)
+
+    status, output = run_compare(baseline_dir, same_dir, tmp_path)
+    assert status == 0 and len(output["comparisons"]) == 1
+    status, output = run_compare(baseline_dir, slower_dir, tmp_path)
+    assert status == 1 and len(output["comparisons"][0]["regressions"]) > 0
@@ -0,0 +1,73 @@
+import pytest
+
+from log_parser.parser import LogParser
+from log_parser.quality import BLOCK_MANAGER_OF_UNKNOWN_EXECUTOR
+from log_parser.quality import TASK_END_WITHOUT_START
+from log_parser.quality import TASKS_OF_UNKNOWN_EXECUTOR
+from log_parser.quality import TRUNCATED_LAST_LINE
+from log_parser.quality import UNDECODABLE_LINE
+from log_parser.quality import UNKNOWN_EXECUTOR_REMOVED
+from log_parser.quality import OrphanEventError
+
+
+def write_log(event_log, path, edit):
+    """ Writes to path the lines of event_log, as changed by edit (a function of the list of lines). """
+    with open(event_log, "rb") as log_file:
+        lines = log_file.readlines()
+    with open(path, "wb") as log_file:
+        log_file.writelines(edit(lines))
+    return str(path)
+
+
+def without_first(lines, event_type):
+    i = next(i for i, line in enumerate(lines) if f'"Event":"{event_type}"'.encode() in line)
+    return lines[:i] + lines[i + 1:]
+
+
+def parse(path, lenient):
+    log_parser = LogParser(path, lenient=lenient)
+    log_parser.process()
+    return log_parser
+
+
+def test_task_end_without_start_is_counted(event_log, tmp_path):
+    path = write_log(event_log, tmp_path / "orphan", lambda lines: without_first(lines, "SparkListenerTaskStart"))
+    with pytest.raises(OrphanEventError):
+        parse(path, lenient=False)
+    log_parser = parse(path, lenient=True)
+    assert log_parser.quality.counts == {TASK_END_WITHOUT_START: 1}
+    assert len(log_parser.tasks) == len(parse(event_log, lenient=False).tasks) - 1
+    assert "---> Data quality <---" in log_parser.generate_report()
+
+
+def test_tasks_of_an_executor_never_added_are_counted(event_log, tmp_path):
+    path = write_log(event_log, tmp_path / "no-executor",
+                     lambda lines: without_first(lines, "SparkListenerExecutorAdded"))
+    with pytest.raises(KeyError):
+        parse(path, lenient=False)
+    log_parser = parse(path, lenient=True)
+    # Its block manager and its removal are orphans too
+    expected = {TASKS_OF_UNKNOWN_EXECUTOR: 1, BLOCK_MANAGER_OF_UNKNOWN_EXECUTOR: 1, UNKNOWN_EXECUTOR_REMOVED: 1}
+    assert log_parser.quality.counts == expected
+    log_parser.finalize()  # the links are counted again, not twice
+    assert log_parser.quality.counts == expected
+
+
+def test_truncated_tail_and_garbage_lines_are_counted(event_log, tmp_path):
+    def edit(lines):
+        return lines[:10] + [b"not json\n"] + lines[10:-1] + [lines[-1][:len(lines[-1]) // 2]]
+
+    path = write_log(event_log, tmp_path / "truncated", edit)
+    with pytest.raises(ValueError):
+        parse(path, lenient=False)
+    log_parser = parse(path, lenient=True)
+    assert log_parser.quality.counts == {UNDECODABLE_LINE: 1, TRUNCATED_LAST_LINE: 1}
+    assert len(log_parser.jobs) == len(parse(event_log, lenient=False).jobs)
+
+
+def test_lenient_parse_of_a_sound_log_equals_strict_parse(event_log):
+    lenient = parse(event_log, lenient=True)
+    assert len(lenient.quality) == 0
+    strict_report = parse(event_log, lenient=False).generate_report()
+    assert lenient.generate_report().replace("---> Data quality <---\nNo problems found in the log\n\n", "") \
+        == strict_report
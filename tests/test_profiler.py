@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+from log_parser.decoder import DECODERS
+from log_parser.parser import LogParser
+from log_parser.profiler import ParseProfile
+
+
+@pytest.mark.parametrize("decoder", sorted(DECODERS))
+def test_profile_counts_the_bytes_of_the_log(decoder, event_log, tmp_path):
+    # Non-ASCII characters take several bytes in UTF-8
+    path = str(tmp_path / "app")
+    with open(event_log, encoding="utf-8") as log_file, open(path, "w", encoding="utf-8") as copy:
+        copy.write(log_file.read().replace('"spark.app.name":"synthetic"', '"spark.app.name":"synthétique ✓"'))
+
+    log_parser = LogParser(path, decoder=decoder)
+    profile = ParseProfile(path)
+    log_parser.process(profile=profile)
+    assert log_parser.get_app_name() == "synthétique ✓"
+    assert sum(event.bytes for event in profile.events.values()) == os.path.getsize(path)
+    with open(path, "rb") as log_file:
+        assert sum(event.count for event in profile.events.values()) == len(log_file.readlines())
@@ -0,0 +1,59 @@
+from log_parser.parser import LogParser
+
+
+def write_parts(path, data, cuts):
+    """ Writes data to path in the pieces between cuts, and yields after each one. """
+    start = 0
+    with open(path, "wb") as log_file:
+        for end in list(cuts) + [len(data)]:
+            log_file.write(data[start:end])
+            log_file.flush()
+            start = end
+            yield
+
+
+def test_resume_after_appended_bytes_equals_full_parse(event_log, tmp_path, parse_report):
+    with open(event_log, "rb") as log_file:
+        data = log_file.read()
+    path = str(tmp_path / "app.inprogress")
+    checkpoint_path = str(tmp_path / "app.state")
+    # Cut at a line end, then in the middle of a line, which is left for the next resume
+    line_end = data.index(b"\n", len(data) // 3) + 1
+    middle_of_line = data.index(b"\n", 2 * len(data) // 3) - 10
+    offsets = []
+    for _ in write_parts(path, data, [line_end, middle_of_line]):
+        log_parser = LogParser.resume(path, checkpoint_path)
+        offsets.append(log_parser.offset)
+
+    assert offsets[0] == line_end
+    assert offsets[1] == data.rindex(b"\n", 0, middle_of_line) + 1
+    assert offsets[2] == len(data)
+    assert log_parser.generate_report() == parse_report(path)
+
+
+def test_resume_of_a_replaced_log_parses_it_again(event_log, tmp_path, parse_report):
+    with open(event_log, "rb") as log_file:
+        data = log_file.read()
+    path = str(tmp_path / "app.inprogress")
+    checkpoint_path = str(tmp_path / "app.state")
+    with open(path, "wb") as log_file:
+        log_file.write(data)
+    LogParser.resume(path, checkpoint_path)
+
+    # Shorter than what was read: not the same log anymore
+    with open(path, "wb") as log_file:
+        log_file.write(data[:data.index(b"\n", len(data) // 2) + 1])
+    log_parser = LogParser.resume(path, checkpoint_path)
+    assert log_parser.generate_report() == parse_report(path)
+
+
+def test_resume_calls_listeners_with_the_new_events(event_log, tmp_path):
+    with open(event_log, "rb") as log_file:
+        data = log_file.read()
+    path = str(tmp_path / "app.inprogress")
+    checkpoint_path = str(tmp_path / "app.state")
+    task_ends = []
+    listeners = {"SparkListenerTaskEnd": [task_ends.append]}
+    for _ in write_parts(path, data, [data.index(b"\n", len(data) // 2) + 1]):
+        LogParser.resume(path, checkpoint_path, listeners=listeners)
+    assert len(task_ends) == data.count(b'"Event":"SparkListenerTaskEnd"')
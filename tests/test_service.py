@@ -0,0 +1,168 @@
+import json
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from log_parser.service import ApplicationStore
+from log_parser.service import ParsedApplication
+from log_parser.service import ServiceRequestHandler
+from log_parser.service import WatchService
+from log_parser.watch import get_watcher
+
+APP_ID = "app-synthetic-0000"
+
+
+def application(path, key):
+    return ParsedApplication(path, (), {"app_id": key, "key": key}, [], "")
+
+
+def copy_logs(event_log, directory, names, attempts=False):
+    """ Copies event_log to names in directory; with attempts, as the attempts 1, 2, ... of its application. """
+    with open(event_log) as log_file:
+        data = log_file.read()
+    paths = []
+    for attempt, name in enumerate(names, 1):
+        path = str(directory / name)
+        if attempts:
+            with open(path, "w") as log_file:
+                log_file.write(data.replace(f'"App ID":"{APP_ID}"',
+                                            f'"App ID":"{APP_ID}","App Attempt ID":"{attempt}"'))
+        else:
+            shutil.copyfile(event_log, path)
+        paths.append(path)
+    return paths
+
+
+def wait_until(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def service(tmp_path):
+    """ A WatchService of tmp_path/logs, polling, that keeps one application; stopped at the end of the test. """
+    (tmp_path / "logs").mkdir()
+    service = WatchService(str(tmp_path / "logs"), max_applications=1, poll_interval=0.1, use_inotify=False)
+    yield service
+    if service.pool is not None:
+        service.stop()
+
+
+def test_store_evicts_the_least_recently_used_application():
+    store = ApplicationStore(max_applications=2)
+    store.put(application("/logs/a", "a"))
+    store.put(application("/logs/b", "b"))
+    assert store.get("a").path == "/logs/a"  # a is now the most recently used
+    store.put(application("/logs/c", "c"))
+    assert [a.key for a in store.values()] == ["c", "a"]
+    assert store.get("b") is None
+    assert store.evicted_path("b") == "/logs/b"
+    assert store.num_evicted == 1
+
+    store.put(application("/logs/b", "b"))  # parsed again
+    assert store.evicted_path("b") is None
+    assert [a.key for a in store.values()] == ["b", "c"]
+
+
+def test_store_forgets_removed_logs():
+    store = ApplicationStore(max_applications=1)
+    store.put(application("/logs/a", "a"))
+    store.put(application("/logs/b", "b"))
+    store.remove("/logs/a")
+    store.remove("/logs/b")
+    assert store.evicted_path("a") is None
+    assert len(store) == 0
+
+
+def test_store_names_an_application_by_its_log_when_its_key_is_taken():
+    store = ApplicationStore(max_applications=1)
+    store.put(application("/logs/a", APP_ID))
+    store.put(application("/logs/b", APP_ID))  # evicts a, whose entry must stay
+    assert store.get("b").path == "/logs/b"
+    assert store.evicted_path(APP_ID) == "/logs/a"
+
+
+def test_attempts_of_an_application_are_kept_apart(event_log, service, tmp_path):
+    copy_logs(event_log, tmp_path / "logs", ["attempt_1", "attempt_2"], attempts=True)
+    service.start()
+    wait_until(lambda: service.counters["logs_parsed"] == 2)
+    for attempt in (1, 2):
+        assert service.get_application(f"{APP_ID}_{attempt}").path.endswith(f"attempt_{attempt}")
+
+
+def test_evicted_application_is_parsed_again_when_requested(event_log, service, tmp_path):
+    first, second = copy_logs(event_log, tmp_path / "logs", ["a", "b"])
+    service.start()
+    wait_until(lambda: service.counters["logs_parsed"] == 2)
+    # a was parsed first, then evicted by b, which has the app id of a: b is named by its log
+    assert [a.key for a in service.store.values()] == ["b"]
+    assert service.store.evicted_path(APP_ID) == first
+
+    assert service.get_application(APP_ID).path == first
+    assert [a.path for a in service.store.values()] == [first]
+    assert service.counters["logs_reloaded"] == 1
+    assert service.get_application("unknown") is None
+
+
+def test_scan_stops_at_a_full_queue(event_log, tmp_path):
+    directory = tmp_path / "logs"
+    directory.mkdir()
+    copy_logs(event_log, directory, ["a", "b", "c"])
+    service = WatchService(str(directory), max_queue=1, use_inotify=False)
+    service.watcher = get_watcher(use_inotify=False)
+
+    assert service.scan() is False
+    assert service.queue.qsize() == 1
+    assert service.queue.get()[0].endswith("a")
+    assert service.scan() is False
+    assert service.queue.get()[0].endswith("b")
+    assert service.scan() is True  # the last log had room
+    assert service.queue.get()[0].endswith("c")
+    assert service.scan() is True and service.queue.empty()  # nothing changed
+    assert service.counters["scans_deferred"] == 2
+    assert service.counters["logs_queued"] == 3
+
+
+def test_http_api(event_log, service, tmp_path):
+    copy_logs(event_log, tmp_path / "logs", ["a"])
+    service.start()
+    wait_until(lambda: service.counters["logs_parsed"] == 1)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ServiceRequestHandler)
+    server.service = service
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def get(path):
+        try:
+            with urllib.request.urlopen(url + path) as response:
+                return response.status, response.read().decode()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode()
+
+    try:
+        status, body = get("/applications")
+        assert status == 200 and [a["key"] for a in json.loads(body)] == [APP_ID]
+        status, body = get(f"/applications/{APP_ID}")
+        assert status == 200 and json.loads(body)["num_failed_tasks"] > 0
+        status, body = get(f"/applications/{APP_ID}/stages")
+        assert status == 200 and len(json.loads(body)) > 0
+        status, body = get(f"/applications/{APP_ID}/report")
+        assert status == 200 and body.startswith(f"Report for 'synthetic' execution {APP_ID}")
+        assert get("/applications/unknown")[0] == 404
+        assert get(f"/applications/{APP_ID}/unknown")[0] == 404
+        assert get("/unknown")[0] == 404
+
+        status, body = get("/metrics")
+        assert status == 200
+        assert "log_parser_queue_depth 0" in body
+        assert "log_parser_parse_seconds_count 1" in body
+    finally:
+        server.shutdown()
+        server.server_close()
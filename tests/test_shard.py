@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+import log_parser.parser
+import log_parser.shard
+from log_parser.parser import LogParser
+from log_parser.shard import shard_boundaries
+
+
+@pytest.fixture
+def small_shards(monkeypatch):
+    monkeypatch.setattr(log_parser.shard, "MIN_SHARD_SIZE", 4096)
+
+
+@pytest.fixture
+def replays(monkeypatch):
+    """ The number of merges of shards, and of those that replayed the task events, during the test. """
+    counts = {"merges": 0, "replays": 0}
+
+    def counted(name, function):
+        def wrapper(*args):
+            counts[name] += 1
+            return function(*args)
+        return wrapper
+
+    monkeypatch.setattr(log_parser.parser, "merge_shards", counted("merges", log_parser.shard.merge_shards))
+    monkeypatch.setattr(log_parser.shard, "_replay", counted("replays", log_parser.shard._replay))
+    return counts
+
+
+def sharded_report(path, jobs):
+    parser = LogParser(path)
+    parser.process_sharded(jobs)
+    return parser.generate_report()
+
+
+def test_shard_boundaries_split_at_line_ends(event_log, small_shards):
+    with open(event_log, "rb") as log_file:
+        data = log_file.read()
+    ranges = shard_boundaries(event_log, 5)
+    assert len(ranges) == 5
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+        assert data[end - 1:end] == b"\n"
+
+
+def test_sharded_report_equals_sequential_report(event_log, small_shards, replays, parse_report):
+    assert sharded_report(event_log, 3) == parse_report(event_log)
+    assert replays == {"merges": 1, "replays": 0}
+
+
+def test_tasks_started_again_are_replayed_in_log_order(event_log, small_shards, replays, tmp_path, parse_report):
+    # A task started again makes task ids not unique: the shards are merged by replaying their events in order
+    with open(event_log, "rb") as log_file:
+        lines = log_file.readlines()
+    task_lines = [line for line in lines if b'"Event":"SparkListenerTaskStart"' in line
+                  or b'"Event":"SparkListenerTaskEnd"' in line]
+    path = str(tmp_path / "restarted")
+    with open(path, "wb") as log_file:
+        log_file.writelines(lines[:-1] + task_lines[:4] + lines[-1:])
+    assert os.path.getsize(path) > 2 * 4096
+    assert sharded_report(path, 3) == parse_report(path)
+    assert replays == {"merges": 1, "replays": 1}
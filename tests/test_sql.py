@@ -0,0 +1,81 @@
+import io
+import json
+import re
+
+import pytest
+
+from log_parser.parser import LogParser
+from log_parser.sql import SQL_EVENT_PACKAGE
+from log_parser.sql import SQLExecution
+from log_parser.sql import write_sql_report
+
+
+def parse(path):
+    log_parser = LogParser(path)
+    log_parser.process()
+    return log_parser
+
+
+def plan_node(name, metrics=(), children=()):
+    return {"nodeName": name, "simpleString": name, "children": list(children), "metadata": {},
+            "metrics": [{"name": metric_name, "accumulatorId": accumulator_id, "metricType": metric_type}
+                        for metric_name, accumulator_id, metric_type in metrics]}
+
+
+def test_jobs_are_linked_to_their_sql_execution(event_log):
+    log_parser = parse(event_log)
+    assert len(log_parser.sql_executions) == len(log_parser.jobs)
+    for execution_id, execution in log_parser.sql_executions.items():
+        assert execution.job_ids == [execution_id]  # every synthetic job runs for an SQL execution of its own
+        assert log_parser.jobs[execution_id].sql_execution_id == execution_id
+        assert execution.get_wall_time() > 0
+
+
+def test_operator_times_are_in_ms():
+    execution = SQLExecution({"executionId": 0, "time": 0, "sparkPlanInfo": plan_node(
+        "WholeStageCodegen (1)", [("duration", 1, "timing")], [
+            plan_node("HashAggregate",
+                      [("number of output rows", 2, "sum"), ("time in aggregation build", 3, "timing")],
+                      [plan_node("Scan parquet", [("scan time", 4, "nsTiming")])])])})
+    assert execution.plan.names == ["WholeStageCodegen (1)", "HashAggregate", "Scan parquet"]
+    assert list(execution.plan.parents) == [-1, 0, 1]
+    execution.metric_values = {1: 50, 2: 1000, 3: 20, 4: 7000000}
+    assert execution.operator_times() == pytest.approx([50, 20, 7])
+    assert execution.operator_metrics()[1] == {"number of output rows": 1000, "time in aggregation build": 20}
+
+
+def test_adaptive_execution_update_replaces_the_plan(event_log, tmp_path):
+    update = {"Event": SQL_EVENT_PACKAGE + "SparkListenerSQLAdaptiveExecutionUpdate", "executionId": 0,
+              "physicalPlanDescription": "", "sparkPlanInfo": plan_node(
+                  "AdaptiveSparkPlan", children=[plan_node("SortMergeJoin", [("join time", 9000, "nsTiming")])])}
+    metrics = {"Event": SQL_EVENT_PACKAGE + "SparkListenerDriverAccumUpdates", "executionId": 0,
+               "accumUpdates": [[9000, 3000000]]}
+    with open(event_log) as log_file:
+        lines = log_file.readlines()
+    start = next(i for i, line in enumerate(lines) if "SparkListenerSQLExecutionStart" in line)
+    path = str(tmp_path / "adaptive")
+    with open(path, "w") as log_file:
+        log_file.writelines(lines[:start + 1] + [json.dumps(update) + "\n", json.dumps(metrics) + "\n"]
+                            + lines[start + 1:])
+
+    execution = parse(path).sql_executions[0]
+    assert execution.plan.names == ["AdaptiveSparkPlan", "SortMergeJoin"]
+    assert execution.operator_times() == pytest.approx([0, 3])
+
+
+def test_sql_report_ranks_operators_by_time(event_log):
+    log_parser = parse(event_log)
+    out = io.StringIO()
+    write_sql_report(out, log_parser, top=5)
+    report = out.getvalue()
+    assert report.startswith("In total, there are {} SQL executions\n".format(len(log_parser.sql_executions)))
+
+    heaviest = report.split("Heaviest operators (by their timing metrics):\n")[1].split("Time per operator name:\n")
+    times = [int(time) for time in re.findall(r"\): (\d+)ms\n", heaviest[0])]
+    assert len(times) == 5 and times == sorted(times, reverse=True)
+    all_times = [time for execution in log_parser.sql_executions.values() for time in execution.operator_times()]
+    assert times[0] == round(max(all_times))
+
+    totals = [int(time) for time in re.findall(r": (\d+)ms over \d+ operators\n", heaviest[1])]
+    assert totals == sorted(totals, reverse=True)
+    assert sum(totals) == pytest.approx(sum(all_times), abs=len(totals))  # each total is rounded
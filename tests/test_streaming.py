@@ -0,0 +1,48 @@
+import numpy
+import pytest
+
+from log_parser.aggregate import QuantileSketch
+from log_parser.parser import LogParser
+
+STATS = ("num_success_tasks", "num_failed_tasks", "tot_avg_task_runtime", "tot_std_task_runtime", "min_task_runtime",
+         "max_task_runtime")
+
+
+def parsed_data(path, streaming):
+    log_parser = LogParser(path, streaming=streaming)
+    log_parser.process()
+    return log_parser.parsed_data
+
+
+def test_streaming_task_statistics_equal_full_parse(event_log):
+    full, streaming = parsed_data(event_log, False), parsed_data(event_log, True)
+    assert full["num_failed_tasks"] > 0
+    for key in STATS:
+        assert streaming[key] == full[key], key
+
+
+def runtimes(seed, size):
+    return numpy.random.default_rng(seed).lognormal(mean=7, sigma=1.5, size=size).round() + 1
+
+
+@pytest.mark.parametrize("relative_accuracy", [0.01, 0.05])
+def test_quantile_sketch_is_within_its_relative_accuracy(relative_accuracy):
+    values = runtimes(0, 10000)
+    sketch = QuantileSketch(relative_accuracy)
+    sketch.add_many(values)
+    for q in (0, 0.01, 0.25, 0.5, 0.9, 0.99, 0.999, 1):
+        exact = numpy.percentile(values, 100 * q, method="lower")
+        assert abs(sketch.quantile(q) - exact) <= relative_accuracy * exact, q
+
+
+def test_merged_sketches_equal_one_sketch_of_all_numbers():
+    first, second = runtimes(1, 3000), runtimes(2, 5000)
+    merged, other, whole = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    merged.add_many(first)
+    for x in second.tolist():
+        other.add(x)
+    merged.merge(other)
+    whole.add_many(numpy.concatenate([first, second]))
+    assert (merged.count, merged.zero_count, merged.buckets) == (whole.count, whole.zero_count, whole.buckets)
+    for q in (0.5, 0.9, 0.99):
+        assert merged.quantile(q) == whole.quantile(q)
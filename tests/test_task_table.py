@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from log_parser.quality import OrphanEventError
+from log_parser.task_table import TaskTable
+
+
+def task_start(task_id, stage_id=0, executor_id="1", launch_time=None):
+    return {
+        "Stage ID": stage_id,
+        "Stage Attempt ID": 0,
+        "Task Info": {"Task ID": task_id, "Executor ID": executor_id, "Launch Time": launch_time or 1000 + task_id,
+                      "Locality": "PROCESS_LOCAL", "Speculative": False},
+    }
+
+
+def task_end(task_id, finish_time=None, reason="Success"):
+    return {
+        "Task Type": "ResultTask",
+        "Task End Reason": {"Reason": reason},
+        "Task Info": {"Task ID": task_id, "Failed": reason != "Success", "Finish Time": finish_time or 2000 + task_id,
+                      "Getting Result Time": 0, "Index": task_id},
+        "Task Metrics": {"Disk Bytes Spilled": 0, "Memory Bytes Spilled": 0, "Executor Deserialize Time": 1,
+                         "Executor Run Time": 10, "JVM GC Time": 2, "Result Serialization Time": 0,
+                         "Result Size": 100},
+    }
+
+
+def test_out_of_order_task_ids():
+    task_ids = list(range(2000))
+    random.Random(0).shuffle(task_ids)
+    table = TaskTable()
+    for task_id in task_ids:
+        table.start(task_start(task_id))
+    random.Random(1).shuffle(task_ids)
+    for task_id in task_ids[:1500]:
+        table.finish(task_end(task_id))
+
+    assert len(table) == 2000
+    assert not table.running.keys() & set(task_ids[:1500])
+    assert table.running.keys() == set(task_ids[1500:])
+    for task_id in task_ids:
+        task = table[task_id]
+        assert task.task_id == task_id
+        assert task.launch_time == 1000 + task_id
+    for task_id in task_ids[:1500]:
+        assert table[task_id].finish_time == 2000 + task_id
+    assert 2000 not in table and -1 not in table
+
+
+def test_finish_after_rows_added_out_of_order():
+    # Lookups go through the sorted index, then through the rows added after it was built
+    table = TaskTable()
+    for task_id in (10, 5, 20):
+        table.start(task_start(task_id))
+    for task_id in (10, 5, 20):
+        table.finish(task_end(task_id))
+    assert table[5].index == 5
+    table.start(task_start(7))
+    table.start(task_start(3))
+    table.finish(task_end(3))
+    table.finish(task_end(7))
+    assert [table[task_id].finish_time for task_id in (3, 5, 7, 10, 20)] == [2003, 2005, 2007, 2010, 2020]
+
+
+def test_task_started_again_replaces_it():
+    table = TaskTable()
+    table.start(task_start(1))
+    table.start(task_start(2))
+    table.finish(task_end(1, reason="ExecutorLostFailure"))
+    table.start(task_start(1, executor_id="2", launch_time=5000))
+    assert len(table) == 2
+    assert table[1].launch_time == 5000
+    assert table.strings[table.executor[table.find_row(1)]] == "2"
+    assert not table.finished[table.find_row(1)]
+
+
+def test_task_end_without_start():
+    table = TaskTable()
+    table.start(task_start(1))
+    with pytest.raises(OrphanEventError):
+        table.finish(task_end(0))
+    with pytest.raises(OrphanEventError):
+        table.finish(task_end(2))